@@ -4,20 +4,68 @@ import os
 import sys
 
 from alembic import context
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import engine_from_config, inspect, pool
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.append(PROJECT_ROOT)
 
-from src.db.models import Base  # noqa: E402
+from src.db.models import Base, Exercise, ExerciseAlias  # noqa: E402
 from src.db.session import DATABASE_URL  # noqa: E402
 
 config = context.config
-config.set_main_option("sqlalchemy.url", os.getenv("DATABASE_URL", DATABASE_URL))
+# Escape "%" for configparser, since shard URLs often carry percent-encoded parts.
+config.set_main_option("sqlalchemy.url", os.getenv("DATABASE_URL", DATABASE_URL).replace("%", "%%"))
 
 target_metadata = Base.metadata
 
+# SQLite has no sequences; ingest draws change_seq from this one-row table instead.
+CREATE_SQLITE_CHANGE_SEQ = [
+    "CREATE TABLE workout_change_seq (last_value BIGINT NOT NULL)",
+    "INSERT INTO workout_change_seq (last_value) VALUES (0)",
+]
+
+
+def bootstrap_sqlite(connection) -> None:
+    """Create a new SQLite database from the models and stamp it at head.
+
+    The revisions up to 20241001_0002 predate SQLite support and are Postgres-only,
+    so a SQLite database starts at head; later revisions upgrade it from there.
+    Data that revisions seed is loaded from those revisions here.
+    """
+    if context.get_revision_argument() != context.script.get_current_head():
+        raise RuntimeError("a new SQLite database can only be created at head")
+    target_metadata.create_all(connection)
+    for statement in CREATE_SQLITE_CHANGE_SEQ:
+        connection.exec_driver_sql(statement)
+
+    catalog = context.script.get_revision("20241117_0008").module
+    connection.execute(
+        Exercise.__table__.insert(),
+        [
+            {
+                "id": catalog.catalog_exercise_id(canonical_name),
+                "owner_user_id": None,
+                "canonical_name": canonical_name,
+                "display_name": display_name,
+                "muscle_group": muscle_group,
+            }
+            for canonical_name, display_name, muscle_group, _ in catalog.CATALOG
+        ],
+    )
+    connection.execute(
+        ExerciseAlias.__table__.insert(),
+        [
+            {"alias": alias, "exercise_id": catalog.catalog_exercise_id(canonical_name)}
+            for canonical_name, _, _, aliases in catalog.CATALOG
+            for alias in aliases
+        ],
+    )
+
+    context.get_context().stamp(context.script, "heads")
+    # SQLite DDL is not transactional, so Alembic leaves committing to each revision.
+    connection.commit()
+
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
@@ -40,10 +88,17 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
 
         with context.begin_transaction():
-            context.run_migrations()
+            if connection.dialect.name == "sqlite" and not inspect(connection).get_table_names():
+                bootstrap_sqlite(connection)
+            else:
+                context.run_migrations()
 
 
 if context.is_offline_mode():
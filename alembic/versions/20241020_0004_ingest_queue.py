@@ -0,0 +1,66 @@
+"""add durable ingest queue
+
+Revision ID: 20241020_0004
+Revises: 20241010_0003
+Create Date: 2024-10-20 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241020_0004"
+down_revision = "20241010_0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_queue",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            sa.Identity(always=True),
+            primary_key=True,
+        ),
+        sa.Column("ticket", sa.Uuid(), nullable=False),
+        sa.Column("user_id", sa.Uuid(), nullable=False),
+        sa.Column("workout_date", sa.Date(), nullable=False),
+        sa.Column("payload", sa.JSON().with_variant(sa.dialects.postgresql.JSONB(), "postgresql"), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.SmallInteger(), nullable=False, server_default="0"),
+        sa.Column("result", sa.JSON().with_variant(sa.dialects.postgresql.JSONB(), "postgresql")),
+        sa.Column("error", sa.Text()),
+        sa.Column(
+            "enqueued_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+        sa.Column("processed_at", sa.DateTime(timezone=True)),
+        sa.UniqueConstraint("ticket", name="uq_ingest_queue_ticket"),
+        sa.CheckConstraint(
+            "status IN ('pending','done','failed')", name="ck_ingest_queue_status"
+        ),
+    )
+    op.create_index(
+        "ix_ingest_queue_pending",
+        "ingest_queue",
+        ["id"],
+        postgresql_where=sa.text("status = 'pending'"),
+        sqlite_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        "ix_ingest_queue_user_day",
+        "ingest_queue",
+        ["user_id", "workout_date", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingest_queue_user_day", table_name="ingest_queue")
+    op.drop_index("ix_ingest_queue_pending", table_name="ingest_queue")
+    op.drop_table("ingest_queue")
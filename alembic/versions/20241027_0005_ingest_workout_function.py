@@ -0,0 +1,172 @@
+"""add ingest_workout_jsonb stored function
+
+Revision ID: 20241027_0005
+Revises: 20241020_0004
+Create Date: 2024-10-27 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241027_0005"
+down_revision = "20241020_0004"
+branch_labels = None
+depends_on = None
+
+
+INGEST_WORKOUT_JSONB = """
+CREATE OR REPLACE FUNCTION ingest_workout_jsonb(doc jsonb) RETURNS jsonb
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid := (doc->>'user_id')::uuid;
+    v_key text := doc->>'idempotency_key';
+    v_date date := (doc->>'workout_date')::date;
+    v_workout_id uuid;
+    v_existing_key text;
+    v_appended boolean := false;
+    v_exercise jsonb;
+    v_exercise_id uuid;
+    v_workout_exercise_id uuid;
+    v_set_count integer;
+    v_written_exercises integer := 0;
+    v_written_sets integer := 0;
+BEGIN
+    INSERT INTO app_user (id) VALUES (v_user_id) ON CONFLICT (id) DO NOTHING;
+
+    IF v_key IS NOT NULL THEN
+        SELECT id INTO v_workout_id
+        FROM workout
+        WHERE user_id = v_user_id AND idempotency_key = v_key;
+        IF FOUND THEN
+            RETURN jsonb_build_object(
+                'workout_id', v_workout_id::text,
+                'written_workout_exercises', 0,
+                'written_sets', 0,
+                'idempotent_replay', true,
+                'appended_to_existing', false
+            );
+        END IF;
+    END IF;
+
+    INSERT INTO workout (
+        id, user_id, workout_date, started_at, ended_at,
+        timezone, title, source, notes, idempotency_key
+    )
+    VALUES (
+        gen_random_uuid(),
+        v_user_id,
+        v_date,
+        (doc #>> '{workout,started_at}')::timestamptz,
+        (doc #>> '{workout,ended_at}')::timestamptz,
+        doc #>> '{workout,timezone}',
+        doc #>> '{workout,title}',
+        doc #>> '{workout,source}',
+        doc #>> '{workout,notes}',
+        v_key
+    )
+    ON CONFLICT (user_id, workout_date) DO NOTHING
+    RETURNING id INTO v_workout_id;
+
+    IF v_workout_id IS NULL THEN
+        SELECT id, idempotency_key INTO v_workout_id, v_existing_key
+        FROM workout
+        WHERE user_id = v_user_id AND workout_date = v_date
+        FOR UPDATE;
+        v_appended := true;
+        IF v_key IS NOT NULL AND v_existing_key IS NULL THEN
+            UPDATE workout SET idempotency_key = v_key WHERE id = v_workout_id;
+        END IF;
+    END IF;
+
+    FOR v_exercise IN SELECT value FROM jsonb_array_elements(doc->'exercises') LOOP
+        v_exercise_id := NULL;
+        IF v_exercise->>'exercise_id' IS NOT NULL THEN
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE id = (v_exercise->>'exercise_id')::uuid;
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    (v_exercise->>'exercise_id')::uuid,
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                RETURNING id INTO v_exercise_id;
+            END IF;
+        ELSE
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE owner_user_id = v_user_id
+              AND canonical_name = v_exercise->>'canonical_name';
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    gen_random_uuid(),
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                ON CONFLICT (owner_user_id, canonical_name) DO NOTHING
+                RETURNING id INTO v_exercise_id;
+                IF v_exercise_id IS NULL THEN
+                    SELECT id INTO v_exercise_id
+                    FROM exercise
+                    WHERE owner_user_id = v_user_id
+                      AND canonical_name = v_exercise->>'canonical_name';
+                END IF;
+            END IF;
+        END IF;
+
+        INSERT INTO workout_exercise (id, workout_id, exercise_id, notes)
+        VALUES (gen_random_uuid(), v_workout_id, v_exercise_id, v_exercise->>'notes')
+        RETURNING id INTO v_workout_exercise_id;
+        v_written_exercises := v_written_exercises + 1;
+
+        INSERT INTO workout_set (
+            id, workout_exercise_id, set_index, reps, weight_kg,
+            weight_original_value, weight_original_unit, rpe, rir,
+            is_warmup, tempo, rest_seconds, notes
+        )
+        SELECT
+            gen_random_uuid(),
+            v_workout_exercise_id,
+            (s.ordinality - 1)::smallint,
+            (s.value->>'reps')::smallint,
+            (s.value->>'weight_kg')::real,
+            (s.value->>'weight_original_value')::real,
+            s.value->>'weight_original_unit',
+            (s.value->>'rpe')::real,
+            (s.value->>'rir')::smallint,
+            (s.value->>'is_warmup')::boolean,
+            s.value->>'tempo',
+            (s.value->>'rest_seconds')::integer,
+            s.value->>'notes'
+        FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality);
+        GET DIAGNOSTICS v_set_count = ROW_COUNT;
+        v_written_sets := v_written_sets + v_set_count;
+    END LOOP;
+
+    RETURN jsonb_build_object(
+        'workout_id', v_workout_id::text,
+        'written_workout_exercises', v_written_exercises,
+        'written_sets', v_written_sets,
+        'idempotent_replay', false,
+        'appended_to_existing', v_appended
+    );
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    # The plpgsql ingest backend is Postgres-only; SQLite uses the ORM/core path.
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(INGEST_WORKOUT_JSONB)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS ingest_workout_jsonb(jsonb)")
@@ -0,0 +1,48 @@
+"""add idempotency response store
+
+Revision ID: 20241103_0006
+Revises: 20241027_0005
+Create Date: 2024-11-03 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241103_0006"
+down_revision = "20241027_0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "idempotency_response",
+        sa.Column(
+            "user_id",
+            sa.Uuid(),
+            sa.ForeignKey("app_user.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("idempotency_key", sa.Text(), primary_key=True),
+        sa.Column("response", sa.JSON().with_variant(sa.dialects.postgresql.JSONB(), "postgresql"), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_idempotency_response_expires_at",
+        "idempotency_response",
+        ["expires_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_idempotency_response_expires_at", table_name="idempotency_response")
+    op.drop_table("idempotency_response")
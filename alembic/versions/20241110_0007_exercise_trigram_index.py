@@ -0,0 +1,44 @@
+"""add trigram index on exercise canonical name
+
+Revision ID: 20241110_0007
+Revises: 20241103_0006
+Create Date: 2024-11-10 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241110_0007"
+down_revision = "20241103_0006"
+branch_labels = None
+depends_on = None
+
+
+# pg_trgm ships with contrib and is allow-listed on Cloud SQL. Exercise search relies
+# on it, so a server without it fails the upgrade here rather than at query time.
+REQUIRE_PG_TRGM = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        RAISE EXCEPTION 'the pg_trgm extension is not available on this server'
+            USING HINT = 'Install the PostgreSQL contrib package (postgresql-contrib) and re-run the upgrade.';
+    END IF;
+END
+$$;
+"""
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(REQUIRE_PG_TRGM)
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_exercise_canonical_name_trgm "
+            "ON exercise USING gin (canonical_name gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_exercise_canonical_name_trgm")
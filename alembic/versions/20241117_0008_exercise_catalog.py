@@ -0,0 +1,120 @@
+"""add global exercise catalog and aliases
+
+Revision ID: 20241117_0008
+Revises: 20241110_0007
+Create Date: 2024-11-17 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import uuid
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241117_0008"
+down_revision = "20241110_0007"
+branch_labels = None
+depends_on = None
+
+
+CATALOG_NAMESPACE = uuid.UUID("5f1d0c0e-8a43-4d5e-9a7e-2f6b1c9d3e01")
+
+# canonical name, display name, muscle group, aliases (already in alias_key form)
+CATALOG = [
+    ("bench press", "Bench Press", "chest", ["bp", "flat bench", "flat bench press", "barbell bench", "barbell bench press", "bench press barbell"]),
+    ("incline bench press", "Incline Bench Press", "chest", ["incline bench", "incline bp", "incline barbell bench press"]),
+    ("dip", "Dip", "chest", ["dips", "parallel bar dip"]),
+    ("squat", "Squat", "legs", ["back squat", "barbell squat", "barbell back squat"]),
+    ("romanian deadlift", "Romanian Deadlift", "hamstrings", ["rdl", "romanian dl"]),
+    ("deadlift", "Deadlift", "back", ["dl", "conventional deadlift", "barbell deadlift"]),
+    ("barbell row", "Barbell Row", "back", ["bent over row", "bb row", "bent over barbell row"]),
+    ("pull up", "Pull Up", "back", ["pullup", "pullups", "pull ups"]),
+    ("lat pulldown", "Lat Pulldown", "back", ["pulldown", "lat pull down"]),
+    ("overhead press", "Overhead Press", "shoulders", ["ohp", "military press", "shoulder press", "standing press"]),
+]
+
+
+def catalog_exercise_id(canonical_name: str) -> uuid.UUID:
+    return uuid.uuid5(CATALOG_NAMESPACE, canonical_name)
+
+
+def upgrade() -> None:
+    op.create_index(
+        "uq_exercise_global_canonical",
+        "exercise",
+        ["canonical_name"],
+        unique=True,
+        postgresql_where=sa.text("owner_user_id IS NULL"),
+        sqlite_where=sa.text("owner_user_id IS NULL"),
+    )
+    op.create_table(
+        "exercise_alias",
+        sa.Column("alias", sa.Text(), primary_key=True),
+        sa.Column(
+            "exercise_id",
+            sa.Uuid(),
+            sa.ForeignKey("exercise.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.create_index("ix_exercise_alias_exercise", "exercise_alias", ["exercise_id"])
+
+    exercise = sa.table(
+        "exercise",
+        sa.column("id", sa.Uuid()),
+        sa.column("owner_user_id", sa.Uuid()),
+        sa.column("canonical_name", sa.Text()),
+        sa.column("display_name", sa.Text()),
+        sa.column("muscle_group", sa.Text()),
+    )
+    exercise_alias = sa.table(
+        "exercise_alias",
+        sa.column("alias", sa.Text()),
+        sa.column("exercise_id", sa.Uuid()),
+    )
+    op.bulk_insert(
+        exercise,
+        [
+            {
+                "id": catalog_exercise_id(canonical_name),
+                "owner_user_id": None,
+                "canonical_name": canonical_name,
+                "display_name": display_name,
+                "muscle_group": muscle_group,
+            }
+            for canonical_name, display_name, muscle_group, _ in CATALOG
+        ],
+    )
+    op.bulk_insert(
+        exercise_alias,
+        [
+            {"alias": alias, "exercise_id": catalog_exercise_id(canonical_name)}
+            for canonical_name, _, _, aliases in CATALOG
+            for alias in aliases
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_exercise_alias_exercise", table_name="exercise_alias")
+    op.drop_table("exercise_alias")
+    exercise = sa.table(
+        "exercise",
+        sa.column("id", sa.Uuid()),
+        sa.column("owner_user_id", sa.Uuid()),
+    )
+    op.execute(
+        exercise.delete().where(
+            exercise.c.owner_user_id.is_(None),
+            exercise.c.id.in_([catalog_exercise_id(name) for name, _, _, _ in CATALOG]),
+        )
+    )
+    op.drop_index("uq_exercise_global_canonical", table_name="exercise")
@@ -0,0 +1,42 @@
+"""add workout archive storage
+
+Revision ID: 20241124_0009
+Revises: 20241117_0008
+Create Date: 2024-11-24 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241124_0009"
+down_revision = "20241117_0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("workout", sa.Column("archived_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        "workout_archive",
+        sa.Column(
+            "workout_id",
+            sa.Uuid(),
+            sa.ForeignKey("workout.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("exercises", sa.JSON().with_variant(sa.dialects.postgresql.JSONB(), "postgresql"), nullable=False),
+        sa.Column(
+            "archived_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("workout_archive")
+    op.drop_column("workout", "archived_at")
@@ -0,0 +1,82 @@
+"""add workout change sequence for incremental sync
+
+Revision ID: 20241201_0010
+Revises: 20241124_0009
+Create Date: 2024-12-01 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241201_0010"
+down_revision = "20241124_0009"
+branch_labels = None
+depends_on = None
+
+
+# Takes a per-user transaction lock before drawing the next value, so a user's
+# change_seq values become visible in the order they were assigned: a reader that
+# has seen sequence N can never later find a committed change below N.
+BUMP_WORKOUT_CHANGE_SEQ = """
+CREATE OR REPLACE FUNCTION bump_workout_change_seq(p_workout_id uuid) RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid;
+    v_change_seq bigint;
+BEGIN
+    SELECT user_id INTO v_user_id FROM workout WHERE id = p_workout_id;
+    PERFORM pg_advisory_xact_lock(hashtextextended('change_seq:' || v_user_id::text, 0));
+    UPDATE workout
+    SET change_seq = nextval('workout_change_seq')
+    WHERE id = p_workout_id
+    RETURNING change_seq INTO v_change_seq;
+    RETURN v_change_seq;
+END;
+$$;
+"""
+
+
+# SQLite has no sequences: a one-row table with the same name and ``last_value``
+# column stands in, and ingest bumps it in the same write transaction (SQLite
+# serializes writers, so values also become visible in the order assigned).
+CREATE_SQLITE_CHANGE_SEQ = [
+    "CREATE TABLE workout_change_seq (last_value BIGINT NOT NULL)",
+    "INSERT INTO workout_change_seq (last_value) VALUES (0)",
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        for statement in CREATE_SQLITE_CHANGE_SEQ:
+            op.execute(statement)
+        op.add_column(
+            "workout",
+            sa.Column("change_seq", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+        )
+        op.create_index("ix_workout_user_change_seq", "workout", ["user_id", "change_seq"])
+        return
+
+    op.execute("CREATE SEQUENCE workout_change_seq")
+    op.add_column(
+        "workout",
+        sa.Column(
+            "change_seq",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("nextval('workout_change_seq')"),
+        ),
+    )
+    op.create_index("ix_workout_user_change_seq", "workout", ["user_id", "change_seq"])
+    op.execute(BUMP_WORKOUT_CHANGE_SEQ)
+
+
+def downgrade() -> None:
+    postgresql = op.get_bind().dialect.name == "postgresql"
+    if postgresql:
+        op.execute("DROP FUNCTION IF EXISTS bump_workout_change_seq(uuid)")
+    op.drop_index("ix_workout_user_change_seq", table_name="workout")
+    op.drop_column("workout", "change_seq")
+    op.execute("DROP SEQUENCE workout_change_seq" if postgresql else "DROP TABLE workout_change_seq")
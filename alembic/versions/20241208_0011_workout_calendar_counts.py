@@ -0,0 +1,67 @@
+"""add per-workout exercise/set counts
+
+Revision ID: 20241208_0011
+Revises: 20241201_0010
+Create Date: 2024-12-08 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+# revision identifiers, used by Alembic.
+revision = "20241208_0011"
+down_revision = "20241201_0010"
+branch_labels = None
+depends_on = None
+
+
+# Replaces bump_workout_change_seq: the counts and the new change_seq are written in
+# the same UPDATE so each ingest adds one workout row version, not two. Existing
+# workouts get their counts, and ix_workout_user_date covers them, in 20250209_0020.
+RECORD_WORKOUT_WRITE = """
+CREATE OR REPLACE FUNCTION record_workout_write(
+    p_workout_id uuid, p_exercises integer, p_sets integer
+) RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid;
+    v_change_seq bigint;
+BEGIN
+    SELECT user_id INTO v_user_id FROM workout WHERE id = p_workout_id;
+    PERFORM pg_advisory_xact_lock(hashtextextended('change_seq:' || v_user_id::text, 0));
+    UPDATE workout
+    SET change_seq = nextval('workout_change_seq'),
+        exercise_count = exercise_count + p_exercises,
+        set_count = set_count + p_sets
+    WHERE id = p_workout_id
+    RETURNING change_seq INTO v_change_seq;
+    RETURN v_change_seq;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "workout",
+        sa.Column("exercise_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "workout",
+        sa.Column("set_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(RECORD_WORKOUT_WRITE)
+        op.execute("DROP FUNCTION bump_workout_change_seq(uuid)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision(down_revision).module.BUMP_WORKOUT_CHANGE_SEQ)
+        op.execute("DROP FUNCTION record_workout_write(uuid, integer, integer)")
+    op.drop_column("workout", "set_count")
+    op.drop_column("workout", "exercise_count")
@@ -0,0 +1,38 @@
+"""add checkpoint table for batched online backfills
+
+Revision ID: 20241215_0012
+Revises: 20241208_0011
+Create Date: 2024-12-15 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20241215_0012"
+down_revision = "20241208_0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "online_migration_progress",
+        sa.Column("name", sa.Text(), primary_key=True),
+        sa.Column("last_key", sa.Text(), nullable=True),
+        sa.Column("rows_done", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+        sa.Column("batches", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "started_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("online_migration_progress")
@@ -0,0 +1,72 @@
+"""add shard placement directory and moved-user fence
+
+Revision ID: 20241222_0013
+Revises: 20241215_0012
+Create Date: 2024-12-22 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+# revision identifiers, used by Alembic.
+revision = "20241222_0013"
+down_revision = "20241215_0012"
+branch_labels = None
+depends_on = None
+
+
+# Same as 0011, plus a check after the per-user lock: the rebalancer takes that lock
+# for its final copy, so a write that commits after the cut-over is refused here
+# instead of landing on a shard the user has left. The hint names the new shard.
+RECORD_WORKOUT_WRITE = """
+CREATE OR REPLACE FUNCTION record_workout_write(
+    p_workout_id uuid, p_exercises integer, p_sets integer
+) RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid;
+    v_moved_to text;
+    v_change_seq bigint;
+BEGIN
+    SELECT user_id INTO v_user_id FROM workout WHERE id = p_workout_id;
+    PERFORM pg_advisory_xact_lock(hashtextextended('change_seq:' || v_user_id::text, 0));
+    SELECT moved_to_shard INTO v_moved_to FROM app_user WHERE id = v_user_id;
+    IF v_moved_to IS NOT NULL THEN
+        RAISE EXCEPTION 'user % moved to shard %', v_user_id, v_moved_to
+            USING ERRCODE = 'object_not_in_prerequisite_state', HINT = 'shard:' || v_moved_to;
+    END IF;
+    UPDATE workout
+    SET change_seq = nextval('workout_change_seq'),
+        exercise_count = exercise_count + p_exercises,
+        set_count = set_count + p_sets
+    WHERE id = p_workout_id
+    RETURNING change_seq INTO v_change_seq;
+    RETURN v_change_seq;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    op.add_column("app_user", sa.Column("moved_to_shard", sa.Text(), nullable=True))
+    op.create_table(
+        "shard_placement",
+        sa.Column("user_id", sa.Uuid(), primary_key=True),
+        sa.Column("shard", sa.Text(), nullable=False),
+        sa.Column(
+            "placed_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(RECORD_WORKOUT_WRITE)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision("20241208_0011").module.RECORD_WORKOUT_WRITE)
+    op.drop_table("shard_placement")
+    op.drop_column("app_user", "moved_to_shard")
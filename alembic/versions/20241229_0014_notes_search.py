@@ -0,0 +1,59 @@
+"""add GIN expression indexes for notes search
+
+Revision ID: 20241229_0014
+Revises: 20241222_0013
+Create Date: 2024-12-29 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+from src.db.online_migrations import create_index_concurrently, drop_index_concurrently, online_block
+
+# revision identifiers, used by Alembic.
+revision = "20241229_0014"
+down_revision = "20241222_0013"
+branch_labels = None
+depends_on = None
+
+
+# Text search configuration of the indexed expressions; queries must use the same.
+SEARCH_CONFIG = "english"
+
+# Expression indexes rather than stored generated columns: adding a STORED column
+# rewrites the whole table under ACCESS EXCLUSIVE, blocking reads and writes of
+# workout_set for as long as the rewrite takes, while these build concurrently.
+# search_workouts must repeat each expression verbatim to use its index.
+# NULL notes give a NULL vector, which costs nothing in the index.
+NOTES_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', notes)"
+# Archived days keep their exercise and set notes inside the packed document.
+ARCHIVE_NOTES_VECTOR = (
+    f"to_tsvector('{SEARCH_CONFIG}', "
+    "jsonb_path_query_array(exercises, '$[*].notes') "
+    "|| jsonb_path_query_array(exercises, '$[*].sets[*].notes'))"
+)
+
+SEARCH_INDEXES = {
+    "ix_workout_notes_search": ("workout", NOTES_VECTOR),
+    "ix_workout_exercise_notes_search": ("workout_exercise", NOTES_VECTOR),
+    "ix_workout_set_notes_search": ("workout_set", NOTES_VECTOR),
+    "ix_workout_archive_notes_search": ("workout_archive", ARCHIVE_NOTES_VECTOR),
+}
+
+
+def upgrade() -> None:
+    # SQLite has no tsvector; search_workouts is Postgres-only.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with online_block() as connection:
+        for name, (table, expression) in SEARCH_INDEXES.items():
+            create_index_concurrently(connection, name, table, expression, using="gin")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with online_block() as connection:
+        for name in SEARCH_INDEXES:
+            drop_index_concurrently(connection, name)
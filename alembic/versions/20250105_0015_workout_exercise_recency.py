@@ -0,0 +1,251 @@
+"""denormalize user_id and workout_date onto workout_exercise for last-performance lookups
+
+Revision ID: 20250105_0015
+Revises: 20241229_0014
+Create Date: 2025-01-05 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+from src.db.online_migrations import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    online_block,
+    set_not_null,
+)
+
+# revision identifiers, used by Alembic.
+revision = "20250105_0015"
+down_revision = "20241229_0014"
+branch_labels = None
+depends_on = None
+
+
+INDEX_NAME = "ix_workout_exercise_last_performance"
+BACKFILL_NAME = "20250105_0015_workout_exercise_recency"
+
+# During a rolling deploy, instances still on the previous release insert rows
+# without the new columns, at random points of the backfill's key order. This
+# fills them in from the parent workout, so the backfill leaves no NULLs behind
+# and old writers keep working once the columns are NOT NULL.
+FILL_RECENCY = """
+CREATE OR REPLACE FUNCTION fill_workout_exercise_recency() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    SELECT user_id, workout_date INTO NEW.user_id, NEW.workout_date
+    FROM workout
+    WHERE id = NEW.workout_id;
+    RETURN NEW;
+END;
+$$;
+"""
+FILL_RECENCY_TRIGGER = """
+CREATE TRIGGER workout_exercise_fill_recency
+BEFORE INSERT ON workout_exercise
+FOR EACH ROW WHEN (NEW.user_id IS NULL OR NEW.workout_date IS NULL)
+EXECUTE FUNCTION fill_workout_exercise_recency()
+"""
+
+# Same as 0005, plus writing the two new columns from values it already holds.
+INGEST_WORKOUT_JSONB = """
+CREATE OR REPLACE FUNCTION ingest_workout_jsonb(doc jsonb) RETURNS jsonb
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid := (doc->>'user_id')::uuid;
+    v_key text := doc->>'idempotency_key';
+    v_date date := (doc->>'workout_date')::date;
+    v_workout_id uuid;
+    v_existing_key text;
+    v_appended boolean := false;
+    v_exercise jsonb;
+    v_exercise_id uuid;
+    v_workout_exercise_id uuid;
+    v_set_count integer;
+    v_written_exercises integer := 0;
+    v_written_sets integer := 0;
+BEGIN
+    INSERT INTO app_user (id) VALUES (v_user_id) ON CONFLICT (id) DO NOTHING;
+
+    IF v_key IS NOT NULL THEN
+        SELECT id INTO v_workout_id
+        FROM workout
+        WHERE user_id = v_user_id AND idempotency_key = v_key;
+        IF FOUND THEN
+            RETURN jsonb_build_object(
+                'workout_id', v_workout_id::text,
+                'written_workout_exercises', 0,
+                'written_sets', 0,
+                'idempotent_replay', true,
+                'appended_to_existing', false
+            );
+        END IF;
+    END IF;
+
+    INSERT INTO workout (
+        id, user_id, workout_date, started_at, ended_at,
+        timezone, title, source, notes, idempotency_key
+    )
+    VALUES (
+        gen_random_uuid(),
+        v_user_id,
+        v_date,
+        (doc #>> '{workout,started_at}')::timestamptz,
+        (doc #>> '{workout,ended_at}')::timestamptz,
+        doc #>> '{workout,timezone}',
+        doc #>> '{workout,title}',
+        doc #>> '{workout,source}',
+        doc #>> '{workout,notes}',
+        v_key
+    )
+    ON CONFLICT (user_id, workout_date) DO NOTHING
+    RETURNING id INTO v_workout_id;
+
+    IF v_workout_id IS NULL THEN
+        SELECT id, idempotency_key INTO v_workout_id, v_existing_key
+        FROM workout
+        WHERE user_id = v_user_id AND workout_date = v_date
+        FOR UPDATE;
+        v_appended := true;
+        IF v_key IS NOT NULL AND v_existing_key IS NULL THEN
+            UPDATE workout SET idempotency_key = v_key WHERE id = v_workout_id;
+        END IF;
+    END IF;
+
+    FOR v_exercise IN SELECT value FROM jsonb_array_elements(doc->'exercises') LOOP
+        v_exercise_id := NULL;
+        IF v_exercise->>'exercise_id' IS NOT NULL THEN
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE id = (v_exercise->>'exercise_id')::uuid;
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    (v_exercise->>'exercise_id')::uuid,
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                RETURNING id INTO v_exercise_id;
+            END IF;
+        ELSE
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE owner_user_id = v_user_id
+              AND canonical_name = v_exercise->>'canonical_name';
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    gen_random_uuid(),
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                ON CONFLICT (owner_user_id, canonical_name) DO NOTHING
+                RETURNING id INTO v_exercise_id;
+                IF v_exercise_id IS NULL THEN
+                    SELECT id INTO v_exercise_id
+                    FROM exercise
+                    WHERE owner_user_id = v_user_id
+                      AND canonical_name = v_exercise->>'canonical_name';
+                END IF;
+            END IF;
+        END IF;
+
+        INSERT INTO workout_exercise (id, workout_id, exercise_id, notes, user_id, workout_date)
+        VALUES (gen_random_uuid(), v_workout_id, v_exercise_id, v_exercise->>'notes', v_user_id, v_date)
+        RETURNING id INTO v_workout_exercise_id;
+        v_written_exercises := v_written_exercises + 1;
+
+        INSERT INTO workout_set (
+            id, workout_exercise_id, set_index, reps, weight_kg,
+            weight_original_value, weight_original_unit, rpe, rir,
+            is_warmup, tempo, rest_seconds, notes
+        )
+        SELECT
+            gen_random_uuid(),
+            v_workout_exercise_id,
+            (s.ordinality - 1)::smallint,
+            (s.value->>'reps')::smallint,
+            (s.value->>'weight_kg')::real,
+            (s.value->>'weight_original_value')::real,
+            s.value->>'weight_original_unit',
+            (s.value->>'rpe')::real,
+            (s.value->>'rir')::smallint,
+            (s.value->>'is_warmup')::boolean,
+            s.value->>'tempo',
+            (s.value->>'rest_seconds')::integer,
+            s.value->>'notes'
+        FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality);
+        GET DIAGNOSTICS v_set_count = ROW_COUNT;
+        v_written_sets := v_written_sets + v_set_count;
+    END LOOP;
+
+    RETURN jsonb_build_object(
+        'workout_id', v_workout_id::text,
+        'written_workout_exercises', v_written_exercises,
+        'written_sets', v_written_sets,
+        'idempotent_replay', false,
+        'appended_to_existing', v_appended
+    );
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    op.add_column("workout_exercise", sa.Column("user_id", sa.Uuid(), nullable=True))
+    op.add_column("workout_exercise", sa.Column("workout_date", sa.Date(), nullable=True))
+
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite databases are created fresh, so there is nothing to backfill.
+        with op.batch_alter_table("workout_exercise") as batch:
+            batch.alter_column("user_id", nullable=False)
+            batch.alter_column("workout_date", nullable=False)
+        op.create_index(INDEX_NAME, "workout_exercise", ["user_id", "exercise_id", sa.text("workout_date DESC")])
+        return
+
+    op.execute(INGEST_WORKOUT_JSONB)
+    op.execute(FILL_RECENCY)
+    op.execute(FILL_RECENCY_TRIGGER)
+
+    with online_block() as connection:
+        backfill_in_batches(
+            connection,
+            "workout_exercise",
+            # The batch statement already has a FROM list, so read the parent through a subquery.
+            set_sql=(
+                "(user_id, workout_date) = "
+                "(SELECT w.user_id, w.workout_date FROM workout w WHERE w.id = workout_exercise.workout_id)"
+            ),
+            where_sql="workout_exercise.user_id IS NULL",
+            name=BACKFILL_NAME,
+        )
+        create_index_concurrently(
+            connection, INDEX_NAME, "workout_exercise", "user_id, exercise_id, workout_date DESC"
+        )
+        set_not_null(connection, "workout_exercise", "user_id")
+        set_not_null(connection, "workout_exercise", "workout_date")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision("20241027_0005").module.INGEST_WORKOUT_JSONB)
+        op.execute("DROP TRIGGER IF EXISTS workout_exercise_fill_recency ON workout_exercise")
+        op.execute("DROP FUNCTION IF EXISTS fill_workout_exercise_recency()")
+        # A later upgrade must walk the table again rather than trust the old checkpoint.
+        op.execute(
+            sa.text("DELETE FROM online_migration_progress WHERE name = :name").bindparams(name=BACKFILL_NAME)
+        )
+        with online_block() as connection:
+            drop_index_concurrently(connection, INDEX_NAME)
+    else:
+        op.drop_index(INDEX_NAME, table_name="workout_exercise")
+    with op.batch_alter_table("workout_exercise") as batch:
+        batch.drop_column("workout_date")
+        batch.drop_column("user_id")
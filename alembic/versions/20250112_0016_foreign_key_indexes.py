@@ -0,0 +1,53 @@
+"""index workout_exercise foreign keys and the archiver's batch scan
+
+Revision ID: 20250112_0016
+Revises: 20250105_0015
+Create Date: 2025-01-12 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.db.online_migrations import create_index_concurrently, drop_index_concurrently, online_block
+
+# revision identifiers, used by Alembic.
+revision = "20250112_0016"
+down_revision = "20250105_0015"
+branch_labels = None
+depends_on = None
+
+
+# name -> (table, columns, partial index predicate)
+INDEXES = {
+    # Every per-workout read joins workout_exercise on workout_id, and deleting a
+    # workout cascades through it.
+    "ix_workout_exercise_workout": ("workout_exercise", "workout_id", None),
+    # Referential check when an exercise is deleted.
+    "ix_workout_exercise_exercise": ("workout_exercise", "exercise_id", None),
+    # The archiver's oldest-first batch; archived rows drop out of the index.
+    "ix_workout_unarchived_date": ("workout", "workout_date", "archived_at IS NULL"),
+}
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        for name, (table, columns, where_sql) in INDEXES.items():
+            op.create_index(name, table, [columns], sqlite_where=sa.text(where_sql) if where_sql else None)
+        return
+
+    with online_block() as connection:
+        for name, (table, columns, where_sql) in INDEXES.items():
+            create_index_concurrently(connection, name, table, columns, where_sql=where_sql)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        for name, (table, _, _) in INDEXES.items():
+            op.drop_index(name, table_name=table)
+        return
+
+    with online_block() as connection:
+        for name in INDEXES:
+            drop_index_concurrently(connection, name)
@@ -0,0 +1,276 @@
+"""add workout_exercise.packed_sets for the packed set storage layout
+
+Revision ID: 20250119_0017
+Revises: 20250112_0016
+Create Date: 2025-01-19 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+from src.db.online_migrations import create_index_concurrently, drop_index_concurrently, online_block
+
+# revision identifiers, used by Alembic.
+revision = "20250119_0017"
+down_revision = "20250112_0016"
+branch_labels = None
+depends_on = None
+
+
+INDEX_NAME = "ix_workout_exercise_packed_notes"
+# Must match the expression search_workouts filters on.
+PACKED_NOTES_VECTOR = "to_tsvector('english', jsonb_path_query_array(packed_sets, '$[*].notes'))"
+
+# Same as 0015, plus packed set storage. The document's "pack_sets" flag picks the
+# layout, as SET_STORAGE does for the ORM backend. Packed sets are the set objects
+# archive_workouts packs (PACKED_SET_FIELDS): the payload's set fields with nulls
+# stripped, plus workout_set_id, set_index and logged_at.
+INGEST_WORKOUT_JSONB = """
+CREATE OR REPLACE FUNCTION ingest_workout_jsonb(doc jsonb) RETURNS jsonb
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid := (doc->>'user_id')::uuid;
+    v_key text := doc->>'idempotency_key';
+    v_date date := (doc->>'workout_date')::date;
+    v_pack_sets boolean := COALESCE((doc->>'pack_sets')::boolean, false);
+    v_workout_id uuid;
+    v_existing_key text;
+    v_appended boolean := false;
+    v_exercise jsonb;
+    v_exercise_id uuid;
+    v_workout_exercise_id uuid;
+    v_set_count integer;
+    v_written_exercises integer := 0;
+    v_written_sets integer := 0;
+BEGIN
+    INSERT INTO app_user (id) VALUES (v_user_id) ON CONFLICT (id) DO NOTHING;
+
+    IF v_key IS NOT NULL THEN
+        SELECT id INTO v_workout_id
+        FROM workout
+        WHERE user_id = v_user_id AND idempotency_key = v_key;
+        IF FOUND THEN
+            RETURN jsonb_build_object(
+                'workout_id', v_workout_id::text,
+                'written_workout_exercises', 0,
+                'written_sets', 0,
+                'idempotent_replay', true,
+                'appended_to_existing', false
+            );
+        END IF;
+    END IF;
+
+    INSERT INTO workout (
+        id, user_id, workout_date, started_at, ended_at,
+        timezone, title, source, notes, idempotency_key
+    )
+    VALUES (
+        gen_random_uuid(),
+        v_user_id,
+        v_date,
+        (doc #>> '{workout,started_at}')::timestamptz,
+        (doc #>> '{workout,ended_at}')::timestamptz,
+        doc #>> '{workout,timezone}',
+        doc #>> '{workout,title}',
+        doc #>> '{workout,source}',
+        doc #>> '{workout,notes}',
+        v_key
+    )
+    ON CONFLICT (user_id, workout_date) DO NOTHING
+    RETURNING id INTO v_workout_id;
+
+    IF v_workout_id IS NULL THEN
+        SELECT id, idempotency_key INTO v_workout_id, v_existing_key
+        FROM workout
+        WHERE user_id = v_user_id AND workout_date = v_date
+        FOR UPDATE;
+        v_appended := true;
+        IF v_key IS NOT NULL AND v_existing_key IS NULL THEN
+            UPDATE workout SET idempotency_key = v_key WHERE id = v_workout_id;
+        END IF;
+    END IF;
+
+    FOR v_exercise IN SELECT value FROM jsonb_array_elements(doc->'exercises') LOOP
+        v_exercise_id := NULL;
+        IF v_exercise->>'exercise_id' IS NOT NULL THEN
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE id = (v_exercise->>'exercise_id')::uuid;
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    (v_exercise->>'exercise_id')::uuid,
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                RETURNING id INTO v_exercise_id;
+            END IF;
+        ELSE
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE owner_user_id = v_user_id
+              AND canonical_name = v_exercise->>'canonical_name';
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    gen_random_uuid(),
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                ON CONFLICT (owner_user_id, canonical_name) DO NOTHING
+                RETURNING id INTO v_exercise_id;
+                IF v_exercise_id IS NULL THEN
+                    SELECT id INTO v_exercise_id
+                    FROM exercise
+                    WHERE owner_user_id = v_user_id
+                      AND canonical_name = v_exercise->>'canonical_name';
+                END IF;
+            END IF;
+        END IF;
+
+        INSERT INTO workout_exercise (
+            id, workout_id, exercise_id, notes, user_id, workout_date, packed_sets
+        )
+        VALUES (
+            gen_random_uuid(), v_workout_id, v_exercise_id, v_exercise->>'notes', v_user_id, v_date,
+            CASE WHEN v_pack_sets THEN (
+                SELECT COALESCE(
+                    jsonb_agg(
+                        jsonb_strip_nulls(
+                            s.value || jsonb_build_object(
+                                'workout_set_id', gen_random_uuid(),
+                                'set_index', s.ordinality - 1,
+                                'logged_at', now()
+                            )
+                        )
+                        ORDER BY s.ordinality
+                    ),
+                    '[]'::jsonb
+                )
+                FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality)
+            ) END
+        )
+        RETURNING id INTO v_workout_exercise_id;
+        v_written_exercises := v_written_exercises + 1;
+
+        IF v_pack_sets THEN
+            v_set_count := jsonb_array_length(v_exercise->'sets');
+        ELSE
+            INSERT INTO workout_set (
+                id, workout_exercise_id, set_index, reps, weight_kg,
+                weight_original_value, weight_original_unit, rpe, rir,
+                is_warmup, tempo, rest_seconds, notes
+            )
+            SELECT
+                gen_random_uuid(),
+                v_workout_exercise_id,
+                (s.ordinality - 1)::smallint,
+                (s.value->>'reps')::smallint,
+                (s.value->>'weight_kg')::real,
+                (s.value->>'weight_original_value')::real,
+                s.value->>'weight_original_unit',
+                (s.value->>'rpe')::real,
+                (s.value->>'rir')::smallint,
+                (s.value->>'is_warmup')::boolean,
+                s.value->>'tempo',
+                (s.value->>'rest_seconds')::integer,
+                s.value->>'notes'
+            FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality);
+            GET DIAGNOSTICS v_set_count = ROW_COUNT;
+        END IF;
+        v_written_sets := v_written_sets + v_set_count;
+    END LOOP;
+
+    RETURN jsonb_build_object(
+        'workout_id', v_workout_id::text,
+        'written_workout_exercises', v_written_exercises,
+        'written_sets', v_written_sets,
+        'idempotent_replay', false,
+        'appended_to_existing', v_appended
+    );
+END;
+$$;
+"""
+
+# Downgrade: packed sets become workout_set rows again before the column goes.
+UNPACK_SETS_SQL = {
+    "postgresql": """
+        INSERT INTO workout_set (
+            id, workout_exercise_id, set_index, reps, weight_kg, weight_original_value,
+            weight_original_unit, rpe, rir, is_warmup, tempo, rest_seconds, notes, logged_at
+        )
+        SELECT
+            (s->>'workout_set_id')::uuid, we.id, (s->>'set_index')::smallint, (s->>'reps')::smallint,
+            (s->>'weight_kg')::float8, (s->>'weight_original_value')::float8, s->>'weight_original_unit',
+            (s->>'rpe')::float8, (s->>'rir')::smallint, (s->>'is_warmup')::boolean, s->>'tempo',
+            (s->>'rest_seconds')::integer, s->>'notes', (s->>'logged_at')::timestamptz
+        FROM workout_exercise we, jsonb_array_elements(we.packed_sets) AS s
+        WHERE we.packed_sets IS NOT NULL
+    """,
+    "sqlite": """
+        WITH packed AS (
+            SELECT we.id AS workout_exercise_id, s.value, json_extract(s.value, '$.logged_at') AS logged_at
+            FROM workout_exercise we, json_each(we.packed_sets) AS s
+            WHERE we.packed_sets IS NOT NULL
+        )
+        INSERT INTO workout_set (
+            id, workout_exercise_id, set_index, reps, weight_kg, weight_original_value,
+            weight_original_unit, rpe, rir, is_warmup, tempo, rest_seconds, notes, logged_at
+        )
+        SELECT
+            replace(json_extract(value, '$.workout_set_id'), '-', ''), workout_exercise_id,
+            json_extract(value, '$.set_index'), json_extract(value, '$.reps'),
+            json_extract(value, '$.weight_kg'), json_extract(value, '$.weight_original_value'),
+            json_extract(value, '$.weight_original_unit'), json_extract(value, '$.rpe'),
+            json_extract(value, '$.rir'), json_extract(value, '$.is_warmup'),
+            json_extract(value, '$.tempo'), json_extract(value, '$.rest_seconds'),
+            json_extract(value, '$.notes'),
+            -- The ORM's "YYYY-MM-DD HH:MM:SS.ffffff" UTC format; %f would keep milliseconds only.
+            strftime('%Y-%m-%d %H:%M:%S', logged_at) || '.' || substr(
+                CASE WHEN instr(logged_at, '.') THEN substr(logged_at, instr(logged_at, '.') + 1, 6) ELSE '' END
+                || '000000',
+                1,
+                6
+            )
+        FROM packed
+    """,
+}
+
+
+def upgrade() -> None:
+    # Nullable without a default: a catalog-only change, no table rewrite.
+    op.add_column(
+        "workout_exercise",
+        sa.Column("packed_sets", sa.JSON().with_variant(sa.dialects.postgresql.JSONB(), "postgresql")),
+    )
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute(INGEST_WORKOUT_JSONB)
+    with online_block() as connection:
+        create_index_concurrently(
+            connection,
+            INDEX_NAME,
+            "workout_exercise",
+            f"({PACKED_NOTES_VECTOR})",
+            where_sql="packed_sets IS NOT NULL",
+            using="gin",
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision("20250105_0015").module.INGEST_WORKOUT_JSONB)
+    op.execute(UNPACK_SETS_SQL[dialect])
+    if dialect == "postgresql":
+        with online_block() as connection:
+            drop_index_concurrently(connection, INDEX_NAME)
+    with op.batch_alter_table("workout_exercise") as batch:
+        batch.drop_column("packed_sets")
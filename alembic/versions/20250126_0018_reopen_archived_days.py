@@ -0,0 +1,75 @@
+"""clear workout.archived_at when a write appends to an archived day
+
+Revision ID: 20250126_0018
+Revises: 20250119_0017
+Create Date: 2025-01-26 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+from alembic.script import ScriptDirectory
+
+# revision identifiers, used by Alembic.
+revision = "20250126_0018"
+down_revision = "20250119_0017"
+branch_labels = None
+depends_on = None
+
+
+# Same as 0013, plus clearing archived_at: the archiver only batches unarchived days
+# (ix_workout_unarchived_date), so rows appended to an archived day would otherwise
+# stay in the hot tables for good. Readers find the archive document by its row,
+# not by archived_at.
+RECORD_WORKOUT_WRITE = """
+CREATE OR REPLACE FUNCTION record_workout_write(
+    p_workout_id uuid, p_exercises integer, p_sets integer
+) RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid;
+    v_moved_to text;
+    v_change_seq bigint;
+BEGIN
+    SELECT user_id INTO v_user_id FROM workout WHERE id = p_workout_id;
+    PERFORM pg_advisory_xact_lock(hashtextextended('change_seq:' || v_user_id::text, 0));
+    SELECT moved_to_shard INTO v_moved_to FROM app_user WHERE id = v_user_id;
+    IF v_moved_to IS NOT NULL THEN
+        RAISE EXCEPTION 'user % moved to shard %', v_user_id, v_moved_to
+            USING ERRCODE = 'object_not_in_prerequisite_state', HINT = 'shard:' || v_moved_to;
+    END IF;
+    UPDATE workout
+    SET change_seq = nextval('workout_change_seq'),
+        exercise_count = exercise_count + p_exercises,
+        set_count = set_count + p_sets,
+        archived_at = NULL
+    WHERE id = p_workout_id
+    RETURNING change_seq INTO v_change_seq;
+    RETURN v_change_seq;
+END;
+$$;
+"""
+
+# Archived days appended to before this revision: one pass over the archived
+# workouts, each checked through ix_workout_exercise_workout. Only those few rows
+# are updated.
+REOPEN_ARCHIVED_DAYS = """
+UPDATE workout AS w
+SET archived_at = NULL
+WHERE w.archived_at IS NOT NULL
+  AND EXISTS (SELECT 1 FROM workout_exercise we WHERE we.workout_id = w.id)
+"""
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(RECORD_WORKOUT_WRITE)
+    op.execute(REOPEN_ARCHIVED_DAYS)
+
+
+def downgrade() -> None:
+    # Reopened days keep archived_at NULL; the previous archiver batches them as
+    # unarchived days and merges them the same way.
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision("20241222_0013").module.RECORD_WORKOUT_WRITE)
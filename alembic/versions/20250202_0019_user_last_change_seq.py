@@ -0,0 +1,66 @@
+"""record each user's latest change_seq for replica read-your-writes checks
+
+Revision ID: 20250202_0019
+Revises: 20250126_0018
+Create Date: 2025-02-02 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+# revision identifiers, used by Alembic.
+revision = "20250202_0019"
+down_revision = "20250126_0018"
+branch_labels = None
+depends_on = None
+
+
+# Same as 0018, plus copying the new change_seq onto the user's app_user row. It
+# commits with the write itself, so a replica whose copy of the row has caught up
+# with the primary's has replayed all of that user's writes (see src.db.routing).
+RECORD_WORKOUT_WRITE = """
+CREATE OR REPLACE FUNCTION record_workout_write(
+    p_workout_id uuid, p_exercises integer, p_sets integer
+) RETURNS bigint
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid;
+    v_moved_to text;
+    v_change_seq bigint;
+BEGIN
+    SELECT user_id INTO v_user_id FROM workout WHERE id = p_workout_id;
+    PERFORM pg_advisory_xact_lock(hashtextextended('change_seq:' || v_user_id::text, 0));
+    SELECT moved_to_shard INTO v_moved_to FROM app_user WHERE id = v_user_id;
+    IF v_moved_to IS NOT NULL THEN
+        RAISE EXCEPTION 'user % moved to shard %', v_user_id, v_moved_to
+            USING ERRCODE = 'object_not_in_prerequisite_state', HINT = 'shard:' || v_moved_to;
+    END IF;
+    UPDATE workout
+    SET change_seq = nextval('workout_change_seq'),
+        exercise_count = exercise_count + p_exercises,
+        set_count = set_count + p_sets,
+        archived_at = NULL
+    WHERE id = p_workout_id
+    RETURNING change_seq INTO v_change_seq;
+    UPDATE app_user SET last_change_seq = v_change_seq WHERE id = v_user_id;
+    RETURN v_change_seq;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    # Nullable without a default, so adding it does not rewrite app_user.
+    op.add_column("app_user", sa.Column("last_change_seq", sa.BigInteger(), nullable=True))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(RECORD_WORKOUT_WRITE)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        op.execute(script.get_revision("20250126_0018").module.RECORD_WORKOUT_WRITE)
+    op.drop_column("app_user", "last_change_seq")
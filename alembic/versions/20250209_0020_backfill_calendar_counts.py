@@ -0,0 +1,142 @@
+"""backfill workout counts and cover them by ix_workout_user_date
+
+Revision ID: 20250209_0020
+Revises: 20250202_0019
+Create Date: 2025-02-09 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.db.online_migrations import (
+    MIGRATION_BATCH_PAUSE_SECONDS,
+    MIGRATION_BATCH_SIZE,
+    create_index_concurrently,
+    drop_index_concurrently,
+    execute_with_lock_retries,
+    online_block,
+)
+
+# revision identifiers, used by Alembic.
+revision = "20250209_0020"
+down_revision = "20250202_0019"
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_NAME = "20250209_0020_workout_counts"
+# ix_workout_user_date already exists, so the INCLUDE version is built under a
+# temporary name, swapped in and renamed; workout stays writable throughout.
+INDEX_NAME = "ix_workout_user_date"
+NEW_INDEX_NAME = "ix_workout_user_date_counts"
+
+# One bounded key range of workouts per transaction, committed on its own so row
+# locks are held for a single batch. The counts are absolute, so a batch run twice
+# writes the same values; the checkpoint only saves walking the table again.
+LOCK_COUNTS_BATCH = """
+SELECT id FROM workout WHERE id > CAST(:after AS uuid) ORDER BY id LIMIT :batch_size FOR UPDATE
+"""
+BACKFILL_COUNTS_BATCH = """
+UPDATE workout
+SET exercise_count = (
+        SELECT count(*) FROM workout_exercise we WHERE we.workout_id = workout.id
+    ) + COALESCE(
+        (SELECT jsonb_array_length(wa.exercises) FROM workout_archive wa WHERE wa.workout_id = workout.id),
+        0
+    ),
+    set_count = (
+        SELECT count(*)
+        FROM workout_exercise we
+        JOIN workout_set ws ON ws.workout_exercise_id = we.id
+        WHERE we.workout_id = workout.id
+    ) + COALESCE(
+        (
+            SELECT sum(jsonb_array_length(we.packed_sets))
+            FROM workout_exercise we
+            WHERE we.workout_id = workout.id AND we.packed_sets IS NOT NULL
+        ),
+        0
+    ) + COALESCE(
+        (
+            SELECT sum(jsonb_array_length(ex->'sets'))
+            FROM workout_archive wa, jsonb_array_elements(wa.exercises) ex
+            WHERE wa.workout_id = workout.id
+        ),
+        0
+    )
+WHERE workout.id = ANY(CAST(:ids AS uuid[]))
+"""
+CHECKPOINT = """
+SELECT last_key, completed_at IS NOT NULL AS completed
+FROM online_migration_progress WHERE name = :name
+"""
+SAVE_CHECKPOINT = """
+INSERT INTO online_migration_progress (name, last_key, rows_done, batches)
+VALUES (:name, :last_key, :rows, 1)
+ON CONFLICT (name) DO UPDATE SET
+    last_key = EXCLUDED.last_key,
+    rows_done = online_migration_progress.rows_done + EXCLUDED.rows_done,
+    batches = online_migration_progress.batches + 1,
+    updated_at = now()
+"""
+COMPLETE = """
+INSERT INTO online_migration_progress (name, completed_at)
+VALUES (:name, now())
+ON CONFLICT (name) DO UPDATE SET completed_at = now(), updated_at = now()
+"""
+
+
+def backfill_counts(connection) -> None:
+    checkpoint = connection.execute(sa.text(CHECKPOINT), {"name": BACKFILL_NAME}).first()
+    if checkpoint is not None and checkpoint.completed:
+        return
+    after = uuid.UUID(checkpoint.last_key) if checkpoint and checkpoint.last_key else uuid.UUID(int=0)
+    while True:
+        # The counts are read by a second statement, so under READ COMMITTED its
+        # snapshot is taken after the batch is locked: it sees every write that
+        # committed first, and a write still in flight waits for the lock and then
+        # adds its own exercises and sets on top in record_workout_write.
+        with connection.engine.begin() as batch:
+            ids = batch.execute(
+                sa.text(LOCK_COUNTS_BATCH), {"after": after, "batch_size": MIGRATION_BATCH_SIZE}
+            ).scalars().all()
+            if not ids:
+                batch.execute(sa.text(COMPLETE), {"name": BACKFILL_NAME})
+                return
+            batch.execute(sa.text(BACKFILL_COUNTS_BATCH), {"ids": ids})
+            batch.execute(
+                sa.text(SAVE_CHECKPOINT),
+                {"name": BACKFILL_NAME, "last_key": str(ids[-1]), "rows": len(ids)},
+            )
+        after = ids[-1]
+        if MIGRATION_BATCH_PAUSE_SECONDS:
+            time.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+
+def swap_index(connection, new_name: str, include: tuple[str, ...]) -> None:
+    create_index_concurrently(connection, new_name, "workout", "user_id, workout_date", include=include)
+    drop_index_concurrently(connection, INDEX_NAME)
+    execute_with_lock_retries(connection, f"ALTER INDEX {new_name} RENAME TO {INDEX_NAME}")
+
+
+def upgrade() -> None:
+    # SQLite has no INCLUDE, and its databases start at head with the counts maintained.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with online_block() as connection:
+        backfill_counts(connection)
+        swap_index(connection, NEW_INDEX_NAME, include=("exercise_count", "set_count"))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # A later upgrade must recount rather than trust the old checkpoint.
+    op.execute(sa.text("DELETE FROM online_migration_progress WHERE name = :name").bindparams(name=BACKFILL_NAME))
+    with online_block() as connection:
+        swap_index(connection, f"{INDEX_NAME}_plain", include=())
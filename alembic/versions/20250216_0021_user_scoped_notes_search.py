@@ -0,0 +1,368 @@
+"""lead the notes search indexes with user_id
+
+Revision ID: 20250216_0021
+Revises: 20250209_0020
+Create Date: 2025-02-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from alembic.script import ScriptDirectory
+
+from src.db.online_migrations import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    online_block,
+    set_not_null,
+)
+
+# revision identifiers, used by Alembic.
+revision = "20250216_0021"
+down_revision = "20250209_0020"
+branch_labels = None
+depends_on = None
+
+
+# The 0014 and 0017 indexes hold every user's notes, so a search either read all
+# users' matches out of them or walked the user's whole history through
+# ix_workout_exercise_last_performance, computing to_tsvector row by row. With
+# btree_gin the user_id goes into the same GIN index, and a search intersects the
+# user's entries with the query's lexemes inside the index. workout_set and
+# workout_archive get a copy of the owning user_id for that; it never changes.
+BACKFILLS = {
+    "workout_set": (
+        "20250216_0021_workout_set_user_id",
+        "user_id = "
+        "(SELECT we.user_id FROM workout_exercise we WHERE we.id = workout_set.workout_exercise_id)",
+    ),
+    "workout_archive": (
+        "20250216_0021_workout_archive_user_id",
+        "user_id = (SELECT w.user_id FROM workout w WHERE w.id = workout_archive.workout_id)",
+    ),
+}
+# workout_archive is keyed by workout_id.
+BACKFILL_KEYS = {"workout_set": "id", "workout_archive": "workout_id"}
+
+# search_workouts repeats each expression verbatim.
+NOTES_VECTOR = "to_tsvector('english', notes)"
+PACKED_NOTES_VECTOR = "to_tsvector('english', jsonb_path_query_array(packed_sets, '$[*].notes'))"
+ARCHIVE_NOTES_VECTOR = (
+    "to_tsvector('english', "
+    "jsonb_path_query_array(exercises, '$[*].notes') "
+    "|| jsonb_path_query_array(exercises, '$[*].sets[*].notes'))"
+)
+# name -> (table, expression, partial index predicate). Most rows have no notes; a
+# GIN index keeps an entry for their NULL vectors too, so those rows are left out.
+SEARCH_INDEXES = {
+    "ix_workout_user_notes_search": ("workout", NOTES_VECTOR, "notes IS NOT NULL"),
+    "ix_workout_exercise_user_notes_search": ("workout_exercise", NOTES_VECTOR, "notes IS NOT NULL"),
+    "ix_workout_exercise_user_packed_notes": (
+        "workout_exercise",
+        PACKED_NOTES_VECTOR,
+        "packed_sets IS NOT NULL",
+    ),
+    "ix_workout_set_user_notes_search": ("workout_set", NOTES_VECTOR, "notes IS NOT NULL"),
+    "ix_workout_archive_user_notes_search": ("workout_archive", ARCHIVE_NOTES_VECTOR, None),
+}
+REPLACED_INDEXES = (
+    "ix_workout_notes_search",
+    "ix_workout_exercise_notes_search",
+    "ix_workout_set_notes_search",
+    "ix_workout_archive_notes_search",
+    "ix_workout_exercise_packed_notes",
+)
+
+# btree_gin ships with contrib, like pg_trgm (20241110_0007), and is allow-listed on
+# Cloud SQL. Without it a GIN index cannot hold the uuid column.
+REQUIRE_BTREE_GIN = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gin') THEN
+        RAISE EXCEPTION 'the btree_gin extension is not available on this server'
+            USING HINT = 'Install the PostgreSQL contrib package (postgresql-contrib) and re-run the upgrade.';
+    END IF;
+END
+$$;
+"""
+
+# Writers still on the previous release insert sets and archive documents without
+# user_id, during the backfill and after it; these fill it in from the parent row,
+# as workout_exercise_fill_recency does for 0015.
+FILL_SET_USER = """
+CREATE OR REPLACE FUNCTION fill_workout_set_user() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    SELECT user_id INTO NEW.user_id FROM workout_exercise WHERE id = NEW.workout_exercise_id;
+    RETURN NEW;
+END;
+$$;
+"""
+FILL_SET_USER_TRIGGER = """
+CREATE TRIGGER workout_set_fill_user
+BEFORE INSERT ON workout_set
+FOR EACH ROW WHEN (NEW.user_id IS NULL)
+EXECUTE FUNCTION fill_workout_set_user()
+"""
+FILL_ARCHIVE_USER = """
+CREATE OR REPLACE FUNCTION fill_workout_archive_user() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    SELECT user_id INTO NEW.user_id FROM workout WHERE id = NEW.workout_id;
+    RETURN NEW;
+END;
+$$;
+"""
+FILL_ARCHIVE_USER_TRIGGER = """
+CREATE TRIGGER workout_archive_fill_user
+BEFORE INSERT ON workout_archive
+FOR EACH ROW WHEN (NEW.user_id IS NULL)
+EXECUTE FUNCTION fill_workout_archive_user()
+"""
+
+# Same as 0017, plus writing workout_set.user_id.
+INGEST_WORKOUT_JSONB = """
+CREATE OR REPLACE FUNCTION ingest_workout_jsonb(doc jsonb) RETURNS jsonb
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_user_id uuid := (doc->>'user_id')::uuid;
+    v_key text := doc->>'idempotency_key';
+    v_date date := (doc->>'workout_date')::date;
+    v_pack_sets boolean := COALESCE((doc->>'pack_sets')::boolean, false);
+    v_workout_id uuid;
+    v_existing_key text;
+    v_appended boolean := false;
+    v_exercise jsonb;
+    v_exercise_id uuid;
+    v_workout_exercise_id uuid;
+    v_set_count integer;
+    v_written_exercises integer := 0;
+    v_written_sets integer := 0;
+BEGIN
+    INSERT INTO app_user (id) VALUES (v_user_id) ON CONFLICT (id) DO NOTHING;
+
+    IF v_key IS NOT NULL THEN
+        SELECT id INTO v_workout_id
+        FROM workout
+        WHERE user_id = v_user_id AND idempotency_key = v_key;
+        IF FOUND THEN
+            RETURN jsonb_build_object(
+                'workout_id', v_workout_id::text,
+                'written_workout_exercises', 0,
+                'written_sets', 0,
+                'idempotent_replay', true,
+                'appended_to_existing', false
+            );
+        END IF;
+    END IF;
+
+    INSERT INTO workout (
+        id, user_id, workout_date, started_at, ended_at,
+        timezone, title, source, notes, idempotency_key
+    )
+    VALUES (
+        gen_random_uuid(),
+        v_user_id,
+        v_date,
+        (doc #>> '{workout,started_at}')::timestamptz,
+        (doc #>> '{workout,ended_at}')::timestamptz,
+        doc #>> '{workout,timezone}',
+        doc #>> '{workout,title}',
+        doc #>> '{workout,source}',
+        doc #>> '{workout,notes}',
+        v_key
+    )
+    ON CONFLICT (user_id, workout_date) DO NOTHING
+    RETURNING id INTO v_workout_id;
+
+    IF v_workout_id IS NULL THEN
+        SELECT id, idempotency_key INTO v_workout_id, v_existing_key
+        FROM workout
+        WHERE user_id = v_user_id AND workout_date = v_date
+        FOR UPDATE;
+        v_appended := true;
+        IF v_key IS NOT NULL AND v_existing_key IS NULL THEN
+            UPDATE workout SET idempotency_key = v_key WHERE id = v_workout_id;
+        END IF;
+    END IF;
+
+    FOR v_exercise IN SELECT value FROM jsonb_array_elements(doc->'exercises') LOOP
+        v_exercise_id := NULL;
+        IF v_exercise->>'exercise_id' IS NOT NULL THEN
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE id = (v_exercise->>'exercise_id')::uuid;
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    (v_exercise->>'exercise_id')::uuid,
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                RETURNING id INTO v_exercise_id;
+            END IF;
+        ELSE
+            SELECT id INTO v_exercise_id
+            FROM exercise
+            WHERE owner_user_id = v_user_id
+              AND canonical_name = v_exercise->>'canonical_name';
+            IF v_exercise_id IS NULL THEN
+                INSERT INTO exercise (id, owner_user_id, canonical_name, display_name)
+                VALUES (
+                    gen_random_uuid(),
+                    v_user_id,
+                    v_exercise->>'canonical_name',
+                    v_exercise->>'display_name'
+                )
+                ON CONFLICT (owner_user_id, canonical_name) DO NOTHING
+                RETURNING id INTO v_exercise_id;
+                IF v_exercise_id IS NULL THEN
+                    SELECT id INTO v_exercise_id
+                    FROM exercise
+                    WHERE owner_user_id = v_user_id
+                      AND canonical_name = v_exercise->>'canonical_name';
+                END IF;
+            END IF;
+        END IF;
+
+        INSERT INTO workout_exercise (
+            id, workout_id, exercise_id, notes, user_id, workout_date, packed_sets
+        )
+        VALUES (
+            gen_random_uuid(), v_workout_id, v_exercise_id, v_exercise->>'notes', v_user_id, v_date,
+            CASE WHEN v_pack_sets THEN (
+                SELECT COALESCE(
+                    jsonb_agg(
+                        jsonb_strip_nulls(
+                            s.value || jsonb_build_object(
+                                'workout_set_id', gen_random_uuid(),
+                                'set_index', s.ordinality - 1,
+                                'logged_at', now()
+                            )
+                        )
+                        ORDER BY s.ordinality
+                    ),
+                    '[]'::jsonb
+                )
+                FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality)
+            ) END
+        )
+        RETURNING id INTO v_workout_exercise_id;
+        v_written_exercises := v_written_exercises + 1;
+
+        IF v_pack_sets THEN
+            v_set_count := jsonb_array_length(v_exercise->'sets');
+        ELSE
+            INSERT INTO workout_set (
+                id, workout_exercise_id, user_id, set_index, reps, weight_kg,
+                weight_original_value, weight_original_unit, rpe, rir,
+                is_warmup, tempo, rest_seconds, notes
+            )
+            SELECT
+                gen_random_uuid(),
+                v_workout_exercise_id,
+                v_user_id,
+                (s.ordinality - 1)::smallint,
+                (s.value->>'reps')::smallint,
+                (s.value->>'weight_kg')::real,
+                (s.value->>'weight_original_value')::real,
+                s.value->>'weight_original_unit',
+                (s.value->>'rpe')::real,
+                (s.value->>'rir')::smallint,
+                (s.value->>'is_warmup')::boolean,
+                s.value->>'tempo',
+                (s.value->>'rest_seconds')::integer,
+                s.value->>'notes'
+            FROM jsonb_array_elements(v_exercise->'sets') WITH ORDINALITY AS s(value, ordinality);
+            GET DIAGNOSTICS v_set_count = ROW_COUNT;
+        END IF;
+        v_written_sets := v_written_sets + v_set_count;
+    END LOOP;
+
+    RETURN jsonb_build_object(
+        'workout_id', v_workout_id::text,
+        'written_workout_exercises', v_written_exercises,
+        'written_sets', v_written_sets,
+        'idempotent_replay', false,
+        'appended_to_existing', v_appended
+    );
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    op.add_column("workout_set", sa.Column("user_id", sa.Uuid(), nullable=True))
+    op.add_column("workout_archive", sa.Column("user_id", sa.Uuid(), nullable=True))
+
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite has no full-text search; only the columns are needed.
+        for table, (_, set_sql) in BACKFILLS.items():
+            op.execute(f"UPDATE {table} SET {set_sql}")
+            with op.batch_alter_table(table) as batch:
+                batch.alter_column("user_id", nullable=False)
+        return
+
+    op.execute(REQUIRE_BTREE_GIN)
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.execute(INGEST_WORKOUT_JSONB)
+    op.execute(FILL_SET_USER)
+    op.execute(FILL_SET_USER_TRIGGER)
+    op.execute(FILL_ARCHIVE_USER)
+    op.execute(FILL_ARCHIVE_USER_TRIGGER)
+
+    with online_block() as connection:
+        for table, (name, set_sql) in BACKFILLS.items():
+            backfill_in_batches(
+                connection,
+                table,
+                set_sql=set_sql,
+                where_sql=f"{table}.user_id IS NULL",
+                name=name,
+                key=BACKFILL_KEYS[table],
+            )
+            set_not_null(connection, table, "user_id")
+        for name, (table, expression, where_sql) in SEARCH_INDEXES.items():
+            create_index_concurrently(
+                connection, name, table, f"user_id, {expression}", where_sql=where_sql, using="gin"
+            )
+        # Searches switch to the new indexes as soon as they are valid.
+        for name in REPLACED_INDEXES:
+            drop_index_concurrently(connection, name)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        script = ScriptDirectory.from_config(op.get_context().config)
+        notes_search = script.get_revision("20241229_0014").module
+        packed_sets = script.get_revision("20250119_0017").module
+        op.execute(packed_sets.INGEST_WORKOUT_JSONB)
+        op.execute("DROP TRIGGER IF EXISTS workout_set_fill_user ON workout_set")
+        op.execute("DROP FUNCTION IF EXISTS fill_workout_set_user()")
+        op.execute("DROP TRIGGER IF EXISTS workout_archive_fill_user ON workout_archive")
+        op.execute("DROP FUNCTION IF EXISTS fill_workout_archive_user()")
+        # A later upgrade must walk the tables again rather than trust the old checkpoints.
+        op.execute(
+            sa.text("DELETE FROM online_migration_progress WHERE name IN :names").bindparams(
+                sa.bindparam("names", [name for name, _ in BACKFILLS.values()], expanding=True)
+            )
+        )
+        with online_block() as connection:
+            for name, (table, expression) in notes_search.SEARCH_INDEXES.items():
+                create_index_concurrently(connection, name, table, expression, using="gin")
+            create_index_concurrently(
+                connection,
+                packed_sets.INDEX_NAME,
+                "workout_exercise",
+                f"({packed_sets.PACKED_NOTES_VECTOR})",
+                where_sql="packed_sets IS NOT NULL",
+                using="gin",
+            )
+            for name in SEARCH_INDEXES:
+                drop_index_concurrently(connection, name)
+    for table in BACKFILLS:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("user_id")
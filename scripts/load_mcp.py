@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Concurrent load generator for the MCP server over streamable HTTP.
+
+Opens N MCP sessions against a running ``server.py`` (API key auth), performs the
+``initialize`` handshake on each and then drives a mix of ``add_workout_entry`` and
+``get_workout_for_day`` calls built from the ``examples/*.json`` templates.
+
+Two modes are supported:
+
+* closed loop (default): every session issues its next call as soon as the previous
+  one returns, so offered load follows server latency.
+* open loop (``--rate``): calls are scheduled at a fixed arrival rate regardless of
+  completions, and each call's latency is measured from its scheduled start, so
+  time spent waiting behind a slow server or a busy client is not hidden. Passing
+  several comma-separated rates steps through them, which makes the saturation
+  point visible as the rate where latency and drops take off.
+
+Example:
+    API_KEY=aman_test_key python scripts/load_mcp.py --sessions 16 --duration 30
+    python scripts/load_mcp.py --api-key aman_test_key --rate 20,40,80,160 --duration 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROTOCOL_VERSION = "2025-03-26"
+
+
+@dataclass
+class Sample:
+    finished_at: float
+    tool: str
+    latency: float
+    ok: bool
+
+
+@dataclass
+class Stats:
+    samples: list[Sample] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+    dropped: int = 0
+
+    def record(self, tool: str, started: float, ok: bool, error: str | None = None) -> None:
+        now = time.perf_counter()
+        self.samples.append(Sample(now, tool, now - started, ok))
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    latencies = sorted(s.latency for s in samples)
+    failed = sum(1 for s in samples if not s.ok)
+    return {
+        "calls": len(samples),
+        "throughput_rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": failed / len(samples) if samples else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] * 1000) if latencies else 0.0,
+    }
+
+
+def format_summary(label: str, summary: dict) -> str:
+    return (
+        f"{label:>20} calls={summary['calls']:<6} rps={summary['throughput_rps']:8.1f} "
+        f"err={summary['error_rate'] * 100:5.1f}% p50={summary['p50_ms']:7.1f}ms "
+        f"p95={summary['p95_ms']:7.1f}ms p99={summary['p99_ms']:7.1f}ms"
+    )
+
+
+class PayloadFactory:
+    """Builds randomized tool arguments from the example payload templates."""
+
+    def __init__(self, templates: list[dict], users: int, days: int, end_date: date, seed: int | None):
+        self.templates = templates
+        self.random = random.Random(seed)
+        self.users = [uuid.UUID(int=self.random.getrandbits(128), version=4) for _ in range(users)]
+        self.dates = [end_date - timedelta(days=offset) for offset in range(days)]
+
+    def add_workout_entry(self) -> dict:
+        payload = copy.deepcopy(self.random.choice(self.templates))
+        day = self.random.choice(self.dates)
+        started_at = datetime.fromisoformat(payload["workout"]["started_at"].replace("Z", "+00:00"))
+        shifted = started_at.replace(year=day.year, month=day.month, day=day.day)
+        delta = shifted - started_at
+        payload["user_id"] = str(self.random.choice(self.users))
+        payload["idempotency_key"] = f"load-{uuid.uuid4()}"
+        payload["workout"]["started_at"] = shifted.isoformat()
+        if payload["workout"].get("ended_at"):
+            ended_at = datetime.fromisoformat(payload["workout"]["ended_at"].replace("Z", "+00:00"))
+            payload["workout"]["ended_at"] = (ended_at + delta).isoformat()
+        return {"payload": payload}
+
+    def get_workout_for_day(self) -> dict:
+        return {
+            "payload": {
+                "user_id": str(self.random.choice(self.users)),
+                "workout_date": self.random.choice(self.dates).isoformat(),
+            }
+        }
+
+
+def load_templates(pattern: str) -> list[dict]:
+    paths = sorted(PROJECT_ROOT.glob(pattern))
+    if not paths:
+        raise SystemExit(f"No payload templates matched {pattern!r}")
+    return [json.loads(path.read_text(encoding="utf-8")) for path in paths]
+
+
+def parse_jsonrpc_body(response: httpx.Response) -> dict:
+    content_type = response.headers.get("content-type", "")
+    if content_type.startswith("text/event-stream"):
+        for line in response.text.splitlines():
+            if line.startswith("data:"):
+                message = json.loads(line[5:].strip())
+                if "result" in message or "error" in message:
+                    return message
+        raise ValueError("event stream ended without a JSON-RPC response")
+    return response.json()
+
+
+class McpSession:
+    def __init__(self, client: httpx.AsyncClient, url: str, api_key: str):
+        self.client = client
+        self.url = url
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json, text/event-stream",
+            "Content-Type": "application/json",
+        }
+        self._ids = itertools.count(1)
+
+    async def _post(self, message: dict) -> httpx.Response:
+        response = await self.client.post(self.url, json=message, headers=self.headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f"http_{response.status_code}")
+        return response
+
+    async def initialize(self) -> None:
+        response = await self._post(
+            {
+                "jsonrpc": "2.0",
+                "id": next(self._ids),
+                "method": "initialize",
+                "params": {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "clientInfo": {"name": "load_mcp", "version": "0.0.1"},
+                    "capabilities": {},
+                },
+            }
+        )
+        message = parse_jsonrpc_body(response)
+        if "error" in message:
+            raise RuntimeError(f"initialize failed: {message['error']}")
+        session_id = response.headers.get("mcp-session-id")
+        if session_id:
+            self.headers["mcp-session-id"] = session_id
+        self.headers["mcp-protocol-version"] = message["result"].get("protocolVersion", PROTOCOL_VERSION)
+        await self._post({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def call_tool(self, name: str, arguments: dict) -> None:
+        response = await self._post(
+            {
+                "jsonrpc": "2.0",
+                "id": next(self._ids),
+                "method": "tools/call",
+                "params": {"name": name, "arguments": arguments},
+            }
+        )
+        message = parse_jsonrpc_body(response)
+        if "error" in message:
+            raise RuntimeError("jsonrpc_error")
+        if message.get("result", {}).get("isError"):
+            raise RuntimeError("tool_error")
+
+    async def close(self) -> None:
+        if "mcp-session-id" in self.headers:
+            try:
+                await self.client.delete(self.url, headers=self.headers)
+            except httpx.HTTPError:
+                pass
+
+
+class LoadRunner:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.factory = PayloadFactory(
+            load_templates(args.templates),
+            users=args.users,
+            days=args.days,
+            end_date=date.fromisoformat(args.end_date) if args.end_date else date.today(),
+            seed=args.seed,
+        )
+        self.stats = Stats()
+
+    def _next_call(self) -> tuple[str, dict]:
+        if self.factory.random.random() < self.args.write_ratio:
+            return "add_workout_entry", self.factory.add_workout_entry()
+        return "get_workout_for_day", self.factory.get_workout_for_day()
+
+    async def _invoke(self, session: McpSession, scheduled_at: float | None = None) -> None:
+        tool, arguments = self._next_call()
+        # Open-loop calls are timed from their slot in the schedule, not from when the
+        # event loop got round to sending them, so queueing delay counts as latency.
+        started = time.perf_counter() if scheduled_at is None else scheduled_at
+        try:
+            await session.call_tool(tool, arguments)
+        except (RuntimeError, ValueError) as exc:
+            self.stats.record(tool, started, ok=False, error=str(exc))
+        except httpx.HTTPError as exc:
+            self.stats.record(tool, started, ok=False, error=type(exc).__name__)
+        else:
+            self.stats.record(tool, started, ok=True)
+
+    async def _open_sessions(self, client: httpx.AsyncClient) -> list[McpSession]:
+        sessions = [McpSession(client, self.args.url, self.args.api_key) for _ in range(self.args.sessions)]
+        await asyncio.gather(*(session.initialize() for session in sessions))
+        return sessions
+
+    async def _reporter(self, started: float) -> None:
+        cursor = 0
+        while True:
+            await asyncio.sleep(self.args.interval)
+            window = self.stats.samples[cursor:]
+            cursor += len(window)
+            elapsed = time.perf_counter() - started
+            label = f"t+{elapsed:6.1f}s"
+            print(format_summary(label, summarize(window, self.args.interval)), flush=True)
+
+    async def _closed_loop(self, sessions: list[McpSession], deadline: float) -> None:
+        async def worker(session: McpSession) -> None:
+            while time.perf_counter() < deadline:
+                await self._invoke(session)
+
+        await asyncio.gather(*(worker(session) for session in sessions))
+
+    async def _open_loop(self, sessions: list[McpSession], rate: float, deadline: float) -> None:
+        interval = 1.0 / rate
+        in_flight: set[asyncio.Task] = set()
+        session_cycle = itertools.cycle(sessions)
+        next_at = time.perf_counter()
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= self.args.max_in_flight:
+                self.stats.dropped += 1
+            else:
+                task = asyncio.create_task(self._invoke(next(session_cycle), scheduled_at=next_at))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_at += interval
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.args.max_in_flight, max_keepalive_connections=self.args.sessions)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            sessions = await self._open_sessions(client)
+            phases = []
+            rates = self.args.rate or [None]
+            try:
+                for rate in rates:
+                    mark = len(self.stats.samples)
+                    dropped_before = self.stats.dropped
+                    started = time.perf_counter()
+                    deadline = started + self.args.duration
+                    label = f"rate={rate:g}/s" if rate else f"sessions={len(sessions)}"
+                    print(f"--- phase {label} for {self.args.duration:g}s", flush=True)
+                    reporter = asyncio.create_task(self._reporter(started))
+                    try:
+                        if rate:
+                            await self._open_loop(sessions, rate, deadline)
+                        else:
+                            await self._closed_loop(sessions, deadline)
+                    finally:
+                        reporter.cancel()
+                    elapsed = time.perf_counter() - started
+                    summary = summarize(self.stats.samples[mark:], elapsed)
+                    summary["offered_rps"] = rate
+                    summary["dropped"] = self.stats.dropped - dropped_before
+                    print(format_summary(label, summary) + f" dropped={summary['dropped']}", flush=True)
+                    phases.append(summary)
+            finally:
+                await asyncio.gather(*(session.close() for session in sessions))
+
+        by_tool = {}
+        for tool in ("add_workout_entry", "get_workout_for_day"):
+            samples = [s for s in self.stats.samples if s.tool == tool]
+            if samples:
+                by_tool[tool] = summarize(samples, self.args.duration * len(phases))
+        return {"phases": phases, "by_tool": by_tool, "errors": self.stats.errors}
+
+
+def positive_rates(value: str) -> list[float]:
+    try:
+        rates = [float(rate) for rate in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate list: {value!r}") from None
+    if not all(rate > 0 for rate in rates):
+        raise argparse.ArgumentTypeError(f"rates must be positive: {value!r}")
+    return rates
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("MCP_URL", "http://localhost:8000/mcp"))
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent MCP sessions to open")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per phase")
+    parser.add_argument(
+        "--rate",
+        type=positive_rates,
+        help="open-loop arrival rate in calls/s; comma-separate several rates to step through them",
+    )
+    parser.add_argument("--max-in-flight", type=int, default=256, help="open-loop cap before calls are dropped")
+    parser.add_argument("--write-ratio", type=float, default=0.5, help="fraction of add_workout_entry calls")
+    parser.add_argument("--users", type=int, default=100, help="size of the randomized user pool")
+    parser.add_argument("--days", type=int, default=60, help="number of distinct workout dates to spread over")
+    parser.add_argument("--end-date", help="latest workout date (YYYY-MM-DD), defaults to today")
+    parser.add_argument("--templates", default="examples/*.json", help="glob relative to the repo root")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between progress reports")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="seed for reproducible users and dates")
+    parser.add_argument("--json-out", help="write the final report to this path as JSON")
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or API_KEY)")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(LoadRunner(args).run())
+    for tool, summary in report["by_tool"].items():
+        print(format_summary(tool, summary))
+    if report["errors"]:
+        print("errors:", json.dumps(report["errors"], sort_keys=True))
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Move users between shards while the service keeps running.
+
+Shards come from SHARD_DATABASE_URLS and the current ring from SHARD_RING, as for
+the server. Either move one user, or give the ring you are switching to and every
+user it places on another shard is moved there. Deploy the new SHARD_RING once
+the moves finish, then run ``--prune`` to drop placement overrides that now match it.
+
+Examples:
+    python scripts/rebalance_shards.py --user-id 7b1c... --to s2
+    SHARD_RING=s0,s1 python scripts/rebalance_shards.py --ring s0,s1,s2 --dry-run
+    SHARD_RING=s0,s1,s2 python scripts/rebalance_shards.py --prune
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.db.sharding import SHARD_PLACEMENT_REFRESH_SECONDS, HashRing, build_shard_router  # noqa: E402
+from src.service.shard_rebalance import (  # noqa: E402
+    move_user,
+    plan_rebalance,
+    prune_placements,
+    purge_moved_user,
+)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--user-id", type=uuid.UUID, help="Move this user (requires --to)")
+    action.add_argument("--ring", help="Comma-separated shards of the target ring")
+    action.add_argument("--prune", action="store_true", help="Drop placements that match SHARD_RING")
+    parser.add_argument("--to", help="Destination shard for --user-id")
+    parser.add_argument(
+        "--grace-seconds",
+        type=float,
+        default=2 * SHARD_PLACEMENT_REFRESH_SECONDS,
+        help="Wait before deleting moved rows from the source, so every process reloads placements",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned moves")
+    args = parser.parse_args(argv)
+    if args.user_id and not args.to:
+        parser.error("--user-id requires --to")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    router = build_shard_router()
+    router.load_placements()
+
+    if args.prune:
+        print(json.dumps({"pruned_placements": prune_placements(router)}))
+        return 0
+
+    if args.user_id:
+        moves = [(args.user_id, router.shard_for(args.user_id), args.to)]
+    else:
+        moves = plan_rebalance(router, HashRing([name.strip() for name in args.ring.split(",") if name.strip()]))
+
+    # Sources are purged after one shared grace period rather than one per user.
+    moved, failed = [], 0
+    for user_id, source, target in moves:
+        entry = {"user_id": str(user_id), "from": source, "to": target}
+        if not args.dry_run:
+            try:
+                result = move_user(router, user_id, target, grace_seconds=None)
+            except ValueError as exc:
+                failed += 1
+                entry["error"] = str(exc)
+            else:
+                if result is not None:
+                    moved.append((user_id, source))
+                    entry.update(
+                        workouts=result.workouts,
+                        delta_workouts=result.delta_workouts,
+                        seconds=round(result.seconds, 2),
+                    )
+        print(json.dumps(entry), flush=True)
+
+    if moved:
+        time.sleep(args.grace_seconds)
+        purged = sum(purge_moved_user(router, user_id, source) for user_id, source in moved)
+        print(json.dumps({"purged_sources": purged}))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,23 @@
-from src.mcp_server import mcp
+import os
+
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_SHUTDOWN_SECONDS = float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "8"))
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+    if WEB_CONCURRENCY > 1:
+        # Requests from one client may land on any worker, so MCP session state
+        # cannot live in process memory.
+        os.environ.setdefault("MCP_STATELESS_HTTP", "true")
+
+    from src.mcp_server import HOST, PORT
+
+    uvicorn.run(
+        "src.asgi:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+    )
@@ -0,0 +1,49 @@
+"""ASGI entrypoint used when serving with multiple worker processes.
+
+Each worker imports this module, so per-process background tasks (queue workers,
+idempotency janitors, exercise catalog and shard placement reloaders) are started
+from the application lifespan rather than at import time, and stopped there once
+uvicorn has drained in-flight requests.
+"""
+
+from __future__ import annotations
+
+import os
+from contextlib import asynccontextmanager
+
+import anyio
+
+from src.mcp_server import (
+    mcp,
+    start_catalog_reloader,
+    start_idempotency_janitors,
+    start_ingest_workers,
+    start_placement_reloader,
+)
+
+SHUTDOWN_TIMEOUT = float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "8"))
+
+app = mcp.streamable_http_app()
+_session_manager_lifespan = app.router.lifespan_context
+
+
+@asynccontextmanager
+async def lifespan(application):
+    ingest_workers = start_ingest_workers()
+    janitors = start_idempotency_janitors()
+    catalog_reloader = await anyio.to_thread.run_sync(start_catalog_reloader)
+    placement_reloader = await anyio.to_thread.run_sync(start_placement_reloader)
+    try:
+        async with _session_manager_lifespan(application):
+            yield
+    finally:
+        for pool in ingest_workers:
+            await anyio.to_thread.run_sync(pool.stop, SHUTDOWN_TIMEOUT)
+        for janitor in janitors:
+            await anyio.to_thread.run_sync(janitor.stop, SHUTDOWN_TIMEOUT)
+        await anyio.to_thread.run_sync(catalog_reloader.stop, SHUTDOWN_TIMEOUT)
+        if placement_reloader is not None:
+            await anyio.to_thread.run_sync(placement_reloader.stop, SHUTDOWN_TIMEOUT)
+
+
+app.router.lifespan_context = lifespan
@@ -1,24 +1,33 @@
 from __future__ import annotations
 
 import uuid
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     CheckConstraint,
     Date,
     DateTime,
     ForeignKey,
+    Identity,
     Index,
+    JSON,
     Integer,
+    Sequence,
     SmallInteger,
     String,
     Text,
+    TypeDecorator,
     UniqueConstraint,
+    Uuid,
     desc,
     func,
+    text,
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -26,15 +35,71 @@ class Base(DeclarativeBase):
     pass
 
 
+class UTCDateTime(TypeDecorator):
+    """``timestamptz`` on Postgres. SQLite has no time zones, so values are stored as
+    naive UTC there and come back as UTC-aware datetimes, as they do from Postgres."""
+
+    impl = DateTime
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and dialect.name == "sqlite" and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and dialect.name == "sqlite" and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+
+# JSONB on Postgres, SQLite's JSON text elsewhere.
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
 class AppUser(Base):
     __tablename__ = "app_user"
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        Uuid, primary_key=True, default=uuid.uuid4
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, server_default=func.now()
+        UTCDateTime(), nullable=False, server_default=func.now()
     )
+    # Set on the old shard once the user's rows have moved; writes routed here are refused.
+    moved_to_shard: Mapped[str | None] = mapped_column(Text)
+    # change_seq of the user's latest write, set by record_workout_write on Postgres;
+    # replica routing compares it between primary and replica (see src.db.routing).
+    last_change_seq: Mapped[int | None] = mapped_column(BigInteger)
+
+
+# Global, so values are unique and increasing across users; per-user ordering is what
+# the change feed relies on (see src.service.change_feed).
+WORKOUT_CHANGE_SEQ = Sequence("workout_change_seq")
+
+
+class next_change_seq(FunctionElement):
+    """Server default of workout.change_seq: the sequence's next value.
+
+    SQLite has no sequences; there ingest assigns change_seq from the one-row
+    workout_change_seq table, and the column default is 0.
+    """
+
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(next_change_seq)
+def _compile_next_change_seq(element, compiler, **kw):
+    return compiler.process(WORKOUT_CHANGE_SEQ.next_value(), **kw)
+
+
+@compiles(next_change_seq, "sqlite")
+def _compile_next_change_seq_sqlite(element, compiler, **kw):
+    return "0"
 
 
 class Workout(Base):
@@ -43,17 +108,33 @@ class Workout(Base):
         UniqueConstraint("user_id", "idempotency_key", name="uq_workout_user_idempotency"),
         UniqueConstraint("user_id", "workout_date", name="uq_workout_user_day"),
         Index("ix_workout_user_started_at_desc", "user_id", desc("started_at")),
-        Index("ix_workout_user_date", "user_id", "workout_date"),
+        # Covers the calendar query so it is answered by an index-only scan.
+        Index(
+            "ix_workout_user_date",
+            "user_id",
+            "workout_date",
+            postgresql_include=["exercise_count", "set_count"],
+        ),
+        Index("ix_workout_user_change_seq", "user_id", "change_seq"),
+        # Oldest unarchived days first, for the archiver's batches.
+        Index(
+            "ix_workout_unarchived_date",
+            "workout_date",
+            postgresql_where=text("archived_at IS NULL"),
+            sqlite_where=text("archived_at IS NULL"),
+        ),
+        # ix_workout_user_notes_search (GIN) is created by migration 20250216_0021 on
+        # Postgres only.
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        Uuid, primary_key=True, default=uuid.uuid4
     )
     user_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("app_user.id", ondelete="CASCADE"), nullable=False
+        Uuid, ForeignKey("app_user.id", ondelete="CASCADE"), nullable=False
     )
-    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    ended_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    started_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    ended_at: Mapped[datetime | None] = mapped_column(UTCDateTime())
     workout_date: Mapped[date] = mapped_column(Date, nullable=False)
     timezone: Mapped[str | None] = mapped_column(Text)
     title: Mapped[str | None] = mapped_column(Text)
@@ -61,7 +142,20 @@ class Workout(Base):
     notes: Mapped[str | None] = mapped_column(Text)
     idempotency_key: Mapped[str | None] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, server_default=func.now()
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+    # Set once the workout's exercises and sets have been packed into workout_archive;
+    # cleared again by a later write, until the archiver folds the new rows in.
+    archived_at: Mapped[datetime | None] = mapped_column(UTCDateTime())
+    # Maintained by ingest; include archived exercises and sets.
+    exercise_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    set_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    # Reassigned by every write that touches the workout, its exercises or its sets.
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger,
+        WORKOUT_CHANGE_SEQ,
+        nullable=False,
+        server_default=next_change_seq(),
     )
 
     user: Mapped[AppUser] = relationship("AppUser")
@@ -77,40 +171,72 @@ class Exercise(Base):
             "owner_user_id", "canonical_name", name="uq_exercise_owner_canonical"
         ),
         Index("ix_exercise_owner_canonical", "owner_user_id", "canonical_name"),
+        Index(
+            "uq_exercise_global_canonical",
+            "canonical_name",
+            unique=True,
+            postgresql_where=text("owner_user_id IS NULL"),
+            sqlite_where=text("owner_user_id IS NULL"),
+        ),
+        # ix_exercise_canonical_name_trgm (GIN, gin_trgm_ops) is created on Postgres by
+        # migration 20241110_0007, which requires the pg_trgm extension.
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        Uuid, primary_key=True, default=uuid.uuid4
     )
     owner_user_id: Mapped[uuid.UUID | None] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("app_user.id", ondelete="CASCADE")
+        Uuid, ForeignKey("app_user.id", ondelete="CASCADE")
     )
     canonical_name: Mapped[str] = mapped_column(Text, nullable=False)
     display_name: Mapped[str] = mapped_column(Text, nullable=False)
     muscle_group: Mapped[str | None] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, server_default=func.now()
+        UTCDateTime(), nullable=False, server_default=func.now()
     )
 
     owner: Mapped[AppUser | None] = relationship("AppUser")
     workout_exercises: Mapped[list["WorkoutExercise"]] = relationship(
         "WorkoutExercise", back_populates="exercise"
     )
+    aliases: Mapped[list["ExerciseAlias"]] = relationship(
+        "ExerciseAlias", back_populates="exercise", cascade="all, delete-orphan"
+    )
 
 
 class WorkoutExercise(Base):
     __tablename__ = "workout_exercise"
+    __table_args__ = (
+        # "Last N sessions of an exercise" reads the newest index entries and stops.
+        Index(
+            "ix_workout_exercise_last_performance",
+            "user_id",
+            "exercise_id",
+            desc("workout_date"),
+        ),
+        # Foreign keys: per-workout reads and cascades, and exercise deletes.
+        Index("ix_workout_exercise_workout", "workout_id"),
+        Index("ix_workout_exercise_exercise", "exercise_id"),
+        # The notes search GIN indexes (user_id plus the notes, or the packed sets'
+        # notes) are created by migration 20250216_0021 on Postgres only.
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        Uuid, primary_key=True, default=uuid.uuid4
     )
     workout_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("workout.id", ondelete="CASCADE"), nullable=False
+        Uuid, ForeignKey("workout.id", ondelete="CASCADE"), nullable=False
     )
     exercise_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("exercise.id"), nullable=False
+        Uuid, ForeignKey("exercise.id"), nullable=False
     )
     notes: Mapped[str | None] = mapped_column(Text)
+    # Copies of workout.user_id / workout.workout_date, which never change for a row.
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    workout_date: Mapped[date] = mapped_column(Date, nullable=False)
+    # The exercise's sets as one document of archive-shaped set objects when written
+    # with SET_STORAGE=packed; NULL when its sets are workout_set rows.
+    packed_sets: Mapped[list | None] = mapped_column(JSONDocument)
 
     workout: Mapped[Workout] = relationship("Workout", back_populates="exercises")
     exercise: Mapped[Exercise] = relationship("Exercise", back_populates="workout_exercises")
@@ -132,16 +258,20 @@ class WorkoutSet(Base):
         CheckConstraint("rpe >= 0 AND rpe <= 10", name="ck_workout_set_rpe_range"),
         CheckConstraint("rir >= 0", name="ck_workout_set_rir_nonnegative"),
         CheckConstraint("rest_seconds >= 0", name="ck_workout_set_rest_nonnegative"),
+        # ix_workout_set_user_notes_search (GIN) is created by migration 20250216_0021
+        # on Postgres only.
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        Uuid, primary_key=True, default=uuid.uuid4
     )
     workout_exercise_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True),
+        Uuid,
         ForeignKey("workout_exercise.id", ondelete="CASCADE"),
         nullable=False,
     )
+    # Copy of workout_exercise.user_id, which leads the notes search index.
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
     set_index: Mapped[int] = mapped_column(SmallInteger, nullable=False)
     reps: Mapped[int] = mapped_column(SmallInteger, nullable=False)
     weight_kg: Mapped[float | None] = mapped_column()
@@ -154,9 +284,132 @@ class WorkoutSet(Base):
     rest_seconds: Mapped[int | None] = mapped_column(Integer)
     notes: Mapped[str | None] = mapped_column(Text)
     logged_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, server_default=func.now()
+        UTCDateTime(), nullable=False, server_default=func.now()
     )
 
     workout_exercise: Mapped[WorkoutExercise] = relationship(
         "WorkoutExercise", back_populates="sets"
     )
+
+
+class IngestQueueItem(Base):
+    __tablename__ = "ingest_queue"
+    __table_args__ = (
+        UniqueConstraint("ticket", name="uq_ingest_queue_ticket"),
+        Index(
+            "ix_ingest_queue_pending",
+            "id",
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+        Index("ix_ingest_queue_user_day", "user_id", "workout_date", "id"),
+        CheckConstraint(
+            "status IN ('pending','done','failed')", name="ck_ingest_queue_status"
+        ),
+    )
+
+    # INTEGER on SQLite so the key is the rowid and autoincrements.
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer(), "sqlite"), Identity(always=True), primary_key=True
+    )
+    ticket: Mapped[uuid.UUID] = mapped_column(
+        Uuid, nullable=False, default=uuid.uuid4
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    workout_date: Mapped[date] = mapped_column(Date, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONDocument, nullable=False)
+    status: Mapped[str] = mapped_column(Text, nullable=False, server_default="pending")
+    attempts: Mapped[int] = mapped_column(SmallInteger, nullable=False, server_default="0")
+    result: Mapped[dict | None] = mapped_column(JSONDocument)
+    error: Mapped[str | None] = mapped_column(Text)
+    enqueued_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+    processed_at: Mapped[datetime | None] = mapped_column(UTCDateTime())
+
+
+class IdempotencyResponse(Base):
+    __tablename__ = "idempotency_response"
+    __table_args__ = (
+        Index("ix_idempotency_response_expires_at", "expires_at"),
+    )
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid,
+        ForeignKey("app_user.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    idempotency_key: Mapped[str] = mapped_column(Text, primary_key=True)
+    response: Mapped[dict] = mapped_column(JSONDocument, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+
+
+class ExerciseAlias(Base):
+    """Alternative name for a global catalog exercise, stored in alias_key() form."""
+
+    __tablename__ = "exercise_alias"
+    __table_args__ = (Index("ix_exercise_alias_exercise", "exercise_id"),)
+
+    alias: Mapped[str] = mapped_column(Text, primary_key=True)
+    exercise_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, ForeignKey("exercise.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+
+    exercise: Mapped[Exercise] = relationship("Exercise", back_populates="aliases")
+
+
+class WorkoutArchive(Base):
+    """Cold storage for an old workout's exercises and sets as one packed JSONB document.
+
+    ``exercises`` has the same nested shape as the full ``get_workout_for_day`` output;
+    Postgres TOAST-compresses it, and the hot tables no longer carry its rows.
+    """
+
+    __tablename__ = "workout_archive"
+
+    workout_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, ForeignKey("workout.id", ondelete="CASCADE"), primary_key=True
+    )
+    # Copy of workout.user_id, which leads ix_workout_archive_user_notes_search
+    # (GIN, created by migration 20250216_0021 on Postgres only).
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    exercises: Mapped[list] = mapped_column(JSONDocument, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+
+
+class OnlineMigrationProgress(Base):
+    """Checkpoint of a batched backfill run by src.db.online_migrations."""
+
+    __tablename__ = "online_migration_progress"
+
+    name: Mapped[str] = mapped_column(Text, primary_key=True)
+    last_key: Mapped[str | None] = mapped_column(Text)
+    rows_done: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    batches: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    started_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(UTCDateTime())
+
+
+class ShardPlacement(Base):
+    """Users placed on a shard other than the one the hash ring picks (directory only)."""
+
+    __tablename__ = "shard_placement"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    shard: Mapped[str] = mapped_column(Text, nullable=False)
+    placed_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), nullable=False, server_default=func.now()
+    )
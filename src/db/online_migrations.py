@@ -0,0 +1,321 @@
+"""Helpers for schema changes on large, busy tables inside Alembic revisions.
+
+Alembic runs a revision in one transaction, so a plain backfill or index build holds
+its locks until the whole upgrade commits. These helpers run outside that
+transaction (see ``online_block``) and keep every lock short:
+
+- ``backfill_in_batches`` walks the table in primary-key order, committing one small
+  batch at a time with a checkpoint in ``online_migration_progress``, so an
+  interrupted upgrade resumes where it stopped;
+- ``create_index_concurrently`` builds indexes without blocking writes;
+- ``add_constraint_not_valid`` / ``validate_constraint`` split a constraint into a
+  brief catalog change and a scan that only takes SHARE UPDATE EXCLUSIVE;
+- ``set_not_null`` reuses a validated CHECK so ``SET NOT NULL`` skips its full scan.
+
+A typical revision::
+
+    def upgrade() -> None:
+        op.add_column("workout", sa.Column("workout_date", sa.Date(), nullable=True))
+        with online_block() as connection:
+            backfill_in_batches(
+                connection,
+                "workout",
+                set_sql="workout_date = started_at::date",
+                where_sql="workout_date IS NULL",
+                name="20241001_0002_workout_date",
+            )
+            create_index_concurrently(connection, "ix_workout_user_date", "workout", "user_id, workout_date")
+            set_not_null(connection, "workout", "workout_date")
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_MAX_BATCH_SIZE = int(os.getenv("MIGRATION_MAX_BATCH_SIZE", "50000"))
+# Batch size adapts so each batch takes about this long, keeping row locks short.
+MIGRATION_BATCH_TARGET_SECONDS = float(os.getenv("MIGRATION_BATCH_TARGET_SECONDS", "0.2"))
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.getenv("MIGRATION_BATCH_PAUSE_SECONDS", "0.05"))
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "2s")
+MIGRATION_LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "10"))
+MIGRATION_PROGRESS_INTERVAL = float(os.getenv("MIGRATION_PROGRESS_INTERVAL", "10"))
+
+logger = logging.getLogger("alembic.online_migrations")
+
+_LOCK_NOT_AVAILABLE = "55P03"
+_ESTIMATED_ROWS = text("SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)")
+_INVALID_INDEX = text(
+    """
+    SELECT NOT i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.oid = to_regclass(:name)
+    """
+)
+_CHECKPOINT = text(
+    "SELECT last_key, rows_done, completed_at IS NOT NULL AS completed "
+    "FROM online_migration_progress WHERE name = :name"
+)
+_COMPLETE = text(
+    """
+    INSERT INTO online_migration_progress (name, completed_at)
+    VALUES (:name, now())
+    ON CONFLICT (name) DO UPDATE SET completed_at = now(), updated_at = now()
+    """
+)
+
+
+@dataclass
+class BackfillProgress:
+    name: str
+    rows_done: int
+    batches: int
+    last_key: str | None
+    elapsed_seconds: float
+    estimated_rows: int
+    completed: bool = False
+
+    def __str__(self) -> str:
+        rate = self.rows_done / self.elapsed_seconds if self.elapsed_seconds else 0.0
+        state = "done" if self.completed else f"at key {self.last_key}"
+        return (
+            f"{self.name}: {self.rows_done} rows in {self.batches} batches "
+            f"({rate:.0f} rows/s, ~{self.estimated_rows} in table), {state}"
+        )
+
+
+def log_progress(progress: BackfillProgress) -> None:
+    logger.info("%s", progress)
+
+
+@contextmanager
+def online_block() -> Iterator[Connection]:
+    """Leave the Alembic migration transaction; each statement inside commits on its own."""
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        yield op.get_bind()
+
+
+@contextmanager
+def lock_timeout(connection: Connection, timeout: str = MIGRATION_LOCK_TIMEOUT) -> Iterator[None]:
+    """Give up on a lock after ``timeout`` instead of queueing every writer behind us."""
+    connection.execute(text("SELECT set_config('lock_timeout', :timeout, false)"), {"timeout": timeout})
+    try:
+        yield
+    finally:
+        connection.execute(text("RESET lock_timeout"))
+
+
+def _is_lock_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "sqlstate", None) == _LOCK_NOT_AVAILABLE
+
+
+def execute_with_lock_retries(
+    connection: Connection,
+    statement: str,
+    retries: int = MIGRATION_LOCK_RETRIES,
+    timeout: str = MIGRATION_LOCK_TIMEOUT,
+) -> None:
+    """Run DDL that needs a strong lock, backing off whenever the lock is not granted.
+
+    A waiting ACCESS EXCLUSIVE request blocks every later reader and writer of the
+    table, so it is better to fail fast and retry than to wait behind a long query.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with lock_timeout(connection, timeout):
+                connection.execute(text(statement))
+            return
+        except OperationalError as exc:
+            if not _is_lock_timeout(exc) or attempt == retries:
+                raise
+            delay = min(0.1 * 2**attempt, 5.0)
+            logger.info("lock not available for %r, retrying in %.1fs", statement, delay)
+            time.sleep(delay)
+
+
+def _batch_statement(table: str, key: str, key_type: str, set_sql: str, where_sql: str, first: bool):
+    after = "" if first else f"WHERE {key} > CAST(:after AS {key_type})"
+    # One statement per batch: the rows, the checkpoint and the cursor commit together.
+    return text(
+        f"""
+        WITH batch AS (
+            SELECT {key} AS batch_key FROM {table} {after} ORDER BY {key} LIMIT :batch_size
+        ),
+        updated AS (
+            UPDATE {table} SET {set_sql}
+            FROM batch
+            WHERE {table}.{key} = batch.batch_key AND ({where_sql})
+            RETURNING 1
+        ),
+        last AS (
+            SELECT batch_key::text AS last_key FROM batch ORDER BY batch_key DESC LIMIT 1
+        ),
+        checkpoint AS (
+            INSERT INTO online_migration_progress (name, last_key, rows_done, batches)
+            SELECT :name, last_key, (SELECT count(*) FROM updated), 1 FROM last
+            ON CONFLICT (name) DO UPDATE SET
+                last_key = EXCLUDED.last_key,
+                rows_done = online_migration_progress.rows_done + EXCLUDED.rows_done,
+                batches = online_migration_progress.batches + 1,
+                updated_at = now()
+        )
+        SELECT (SELECT last_key FROM last) AS last_key, (SELECT count(*) FROM updated) AS updated
+        """
+    )
+
+
+def backfill_in_batches(
+    connection: Connection,
+    table: str,
+    set_sql: str,
+    where_sql: str = "true",
+    name: str | None = None,
+    key: str = "id",
+    key_type: str = "uuid",
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    max_batch_size: int = MIGRATION_MAX_BATCH_SIZE,
+    target_batch_seconds: float = MIGRATION_BATCH_TARGET_SECONDS,
+    pause_seconds: float = MIGRATION_BATCH_PAUSE_SECONDS,
+    max_batches: int | None = None,
+    progress: Callable[[BackfillProgress], None] = log_progress,
+    progress_interval: float = MIGRATION_PROGRESS_INTERVAL,
+) -> BackfillProgress:
+    """Apply ``SET set_sql`` to rows matching ``where_sql``, one key range at a time.
+
+    ``connection`` must be in autocommit mode (``online_block``) so each batch commits
+    and releases its row locks. ``where_sql`` should exclude rows already done, which
+    keeps reruns idempotent; the key checkpoint stored under ``name`` lets a rerun
+    skip the range already walked. ``max_batches`` stops early (for tests and for
+    spreading a backfill over several deploys).
+    """
+    name = name or f"backfill:{table}"
+    checkpoint = connection.execute(_CHECKPOINT, {"name": name}).first()
+    if checkpoint is not None and checkpoint.completed:
+        result = BackfillProgress(name, checkpoint.rows_done, 0, checkpoint.last_key, 0.0, 0, True)
+        progress(result)
+        return result
+
+    last_key = checkpoint.last_key if checkpoint else None
+    rows_done = checkpoint.rows_done if checkpoint else 0
+    estimated_rows = connection.execute(_ESTIMATED_ROWS, {"table": table}).scalar_one()
+    statements = {
+        first: _batch_statement(table, key, key_type, set_sql, where_sql, first)
+        for first in (True, False)
+    }
+
+    batches = 0
+    started = last_report = time.monotonic()
+    while max_batches is None or batches < max_batches:
+        batch_started = time.monotonic()
+        row = connection.execute(
+            statements[last_key is None],
+            {"after": last_key, "batch_size": batch_size, "name": name},
+        ).one()
+        if row.last_key is None:
+            connection.execute(_COMPLETE, {"name": name})
+            result = BackfillProgress(
+                name, rows_done, batches, last_key, time.monotonic() - started, estimated_rows, True
+            )
+            progress(result)
+            return result
+
+        last_key = row.last_key
+        rows_done += row.updated
+        batches += 1
+
+        took = time.monotonic() - batch_started
+        if took < target_batch_seconds / 2:
+            batch_size = min(batch_size * 2, max_batch_size)
+        elif took > target_batch_seconds * 2:
+            batch_size = max(batch_size // 2, 100)
+
+        now = time.monotonic()
+        if now - last_report >= progress_interval:
+            progress(BackfillProgress(name, rows_done, batches, last_key, now - started, estimated_rows))
+            last_report = now
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    result = BackfillProgress(name, rows_done, batches, last_key, time.monotonic() - started, estimated_rows)
+    progress(result)
+    return result
+
+
+def create_index_concurrently(
+    connection: Connection,
+    name: str,
+    table: str,
+    columns_sql: str,
+    unique: bool = False,
+    where_sql: str | None = None,
+    include: tuple[str, ...] = (),
+    using: str | None = None,
+) -> None:
+    """Build an index without blocking writes, replacing an invalid leftover first.
+
+    A failed or cancelled concurrent build leaves an INVALID index behind that
+    ``IF NOT EXISTS`` would silently keep.
+    """
+    if connection.execute(_INVALID_INDEX, {"name": name}).scalar():
+        logger.info("dropping invalid index %s left by an earlier attempt", name)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    statement = (
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON {table}{f' USING {using}' if using else ''} ({columns_sql})"
+    )
+    if include:
+        statement += f" INCLUDE ({', '.join(include)})"
+    if where_sql:
+        statement += f" WHERE {where_sql}"
+    logger.info("building index %s", name)
+    connection.execute(text(statement))
+
+
+def drop_index_concurrently(connection: Connection, name: str) -> None:
+    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def add_constraint_not_valid(connection: Connection, table: str, name: str, definition_sql: str) -> None:
+    """Add a CHECK or FOREIGN KEY that only applies to new writes until validated."""
+    execute_with_lock_retries(
+        connection, f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition_sql} NOT VALID"
+    )
+
+
+def validate_constraint(connection: Connection, table: str, name: str) -> None:
+    """Check existing rows; holds SHARE UPDATE EXCLUSIVE, so writes continue meanwhile."""
+    logger.info("validating constraint %s on %s", name, table)
+    connection.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+
+
+def add_unique_constraint(connection: Connection, table: str, name: str, columns: tuple[str, ...]) -> None:
+    """Build the unique index concurrently, then attach it as a constraint in a brief lock."""
+    create_index_concurrently(connection, name, table, ", ".join(columns), unique=True)
+    execute_with_lock_retries(
+        connection, f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"
+    )
+
+
+def set_not_null(connection: Connection, table: str, column: str) -> None:
+    """Make ``column`` NOT NULL without the full-table scan under ACCESS EXCLUSIVE.
+
+    Postgres skips the scan when a validated ``CHECK (column IS NOT NULL)`` exists, so
+    the check is added NOT VALID, validated online, used, then dropped.
+    """
+    check = f"{table}_{column}_not_null"
+    add_constraint_not_valid(connection, table, check, f"CHECK ({column} IS NOT NULL)")
+    validate_constraint(connection, table, check)
+    execute_with_lock_retries(connection, f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+    execute_with_lock_retries(connection, f"ALTER TABLE {table} DROP CONSTRAINT {check}")
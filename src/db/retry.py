@@ -0,0 +1,78 @@
+"""Bounded retry of transactions that failed only because of a concurrent writer.
+
+Each retried attempt must run in a fresh transaction: the failed one has been rolled
+back, so nothing it wrote is visible and re-running the whole unit of work is safe.
+Errors that leave the outcome unknown (a connection lost mid-commit) are not retried.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import sqlite3
+import time
+from typing import Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.02"))
+
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+UNIQUE_VIOLATION = "23505"
+# Get-or-create races: the loser's retry finds the row the winner committed.
+RETRYABLE_CONSTRAINTS = frozenset(
+    {
+        "app_user_pkey",
+        "uq_exercise_owner_canonical",
+        "uq_exercise_global_canonical",
+        "uq_workout_user_day",
+    }
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def sqlstate(exc: DBAPIError) -> str | None:
+    return getattr(exc.orig, "sqlstate", None)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if not isinstance(exc, DBAPIError) or exc.connection_invalidated:
+        return False
+    code = sqlstate(exc)
+    if code in (SERIALIZATION_FAILURE, DEADLOCK_DETECTED):
+        return True
+    if code == UNIQUE_VIOLATION:
+        diag = getattr(exc.orig, "diag", None)
+        return getattr(diag, "constraint_name", None) in RETRYABLE_CONSTRAINTS
+    # SQLite gives up on the database lock after busy_timeout.
+    return isinstance(exc.orig, sqlite3.OperationalError) and "locked" in str(exc.orig)
+
+
+def run_with_retries(
+    work: Callable[[], T],
+    attempts: int = DB_RETRY_ATTEMPTS,
+    base_delay: float = DB_RETRY_BASE_DELAY,
+    on_retry: Callable[[DBAPIError], None] | None = None,
+) -> T:
+    """Call ``work`` up to ``attempts`` times while it fails with a retryable error.
+
+    Waits a random ("full jitter") delay of up to ``base_delay * 2**n`` between
+    attempts so colliding writers do not collide again in lockstep.
+    """
+    for attempt in range(max(attempts, 1)):
+        try:
+            return work()
+        except DBAPIError as exc:
+            if attempt + 1 >= attempts or not is_retryable(exc):
+                raise
+            if on_retry is not None:
+                on_retry(exc)
+            logger.info("retrying after %s (attempt %d of %d)", sqlstate(exc) or exc.orig, attempt + 2, attempts)
+            time.sleep(random.uniform(0, base_delay * 2**attempt))
+    raise AssertionError("unreachable")
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.db.models import AppUser
+from src.db.session import engine, read_engine
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "1"))
+# How long the replica's WAL receiver may go without hearing from the primary. An idle
+# primary still sends a keepalive every wal_sender_timeout / 2 (30s by default).
+REPLICA_MAX_RECEIVER_SILENCE_SECONDS = float(os.getenv("REPLICA_MAX_RECEIVER_SILENCE_SECONDS", "60"))
+# How long a user's last change_seq, as read from the primary, is trusted before it
+# is read again; 0 reads it for every routed read. Writes committed by this process
+# are recorded as they commit, so only other processes' writes wait for the refresh.
+REPLICA_WRITE_SEQ_TTL_SECONDS = float(os.getenv("REPLICA_WRITE_SEQ_TTL_SECONDS", "1"))
+REPLICA_WRITE_SEQ_CACHE_SIZE = int(os.getenv("REPLICA_WRITE_SEQ_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+
+# One row on any server; the receiver columns are NULL when no WAL receiver is running.
+REPLICA_STATUS_SQL = text(
+    """
+    SELECT pg_is_in_recovery() AS in_recovery,
+           receiver.status AS receiver_status,
+           EXTRACT(EPOCH FROM now() - receiver.last_msg_receipt_time) AS receiver_silence,
+           pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AS replayed_all_received,
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+    FROM (SELECT 1) AS one
+    LEFT JOIN pg_stat_wal_receiver AS receiver ON true
+    """
+)
+_LAST_CHANGE_SEQ = select(AppUser.last_change_seq).where(AppUser.id == bindparam("user_id"))
+
+
+def replica_lag_from_status(
+    status, max_receiver_silence: float = REPLICA_MAX_RECEIVER_SILENCE_SECONDS
+) -> float | None:
+    """Replay lag in seconds from a REPLICA_STATUS_SQL row, or None if the replica is cut off.
+
+    A standby whose WAL receiver is not streaming, or has not heard from the primary
+    within ``max_receiver_silence``, has no bound on how stale it is. Otherwise the lag
+    is zero once everything received is replayed, so an idle primary does not look
+    like a lagging replica.
+    """
+    if not status.in_recovery:
+        return 0.0
+    if status.receiver_status != "streaming" or status.receiver_silence is None:
+        return None
+    if float(status.receiver_silence) > max_receiver_silence:
+        return None
+    if status.replayed_all_received or status.replay_age is None:
+        return 0.0
+    return float(status.replay_age)
+
+
+class ReadRouter:
+    """Chooses the engine for read-only work.
+
+    Reads go to the replica unless it is unconfigured, unreachable, cut off from the
+    primary, lagging past ``max_lag_seconds``, or has not yet replayed the user's
+    latest write. Replica health is sampled at most once per ``health_interval``
+    seconds.
+
+    Read-your-writes: every write records its change_seq on the user's app_user row
+    in the same transaction, and the replica is used only once its copy of that value
+    has reached the user's last write. Writes committed by this process are passed to
+    ``note_write`` and hold at once; the last change_seq of other processes' writes
+    (other workers, instances, the ingest queue) is read from the primary and kept
+    for ``write_seq_ttl`` seconds, so such a write can go unseen for that long.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replica: Engine | None = None,
+        max_lag_seconds: float = REPLICA_MAX_LAG_SECONDS,
+        health_interval: float = REPLICA_HEALTH_INTERVAL,
+        max_receiver_silence: float = REPLICA_MAX_RECEIVER_SILENCE_SECONDS,
+        write_seq_ttl: float = REPLICA_WRITE_SEQ_TTL_SECONDS,
+        write_seq_cache_size: int = REPLICA_WRITE_SEQ_CACHE_SIZE,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.health_interval = health_interval
+        self.max_receiver_silence = max_receiver_silence
+        self._health_lock = threading.Lock()
+        self._healthy = False
+        self._checked_at: float | None = None
+        self.write_seq_ttl = write_seq_ttl
+        self.write_seq_cache_size = write_seq_cache_size
+        # user_id -> (expires_at, last change_seq, replica has replayed it)
+        self._write_seqs: OrderedDict[uuid.UUID, tuple[float, int | None, bool]] = OrderedDict()
+        self._write_seqs_lock = threading.Lock()
+
+    def engine_for(self, user_id: uuid.UUID | str) -> Engine:
+        if self.replica is None or not self.replica_available():
+            return self.primary
+        return self.replica if self.replica_has_writes_of(user_id) else self.primary
+
+    def replica_has_writes_of(self, user_id: uuid.UUID | str) -> bool:
+        """True once the replica has replayed the user's latest committed write."""
+        user_id = uuid.UUID(str(user_id))
+        entry = self._cached_write_seq(user_id)
+        if entry is None:
+            written = self.last_change_seq(self.primary, user_id)
+            entry = self._remember_write_seq(user_id, written, replayed=written is None)
+        expires_at, written, replayed_all = entry
+        if replayed_all or written is None:
+            return True
+        try:
+            replayed = self.last_change_seq(self.replica, user_id)
+        except SQLAlchemyError:
+            logger.warning("replica read-your-writes check failed, reading from primary", exc_info=True)
+            self.mark_replica_failed()
+            return False
+        if replayed is None or replayed < written:
+            return False
+        # Keeps the entry's expiry, so the primary is still asked again in time.
+        self._remember_write_seq(user_id, written, replayed=True, expires_at=expires_at)
+        return True
+
+    def note_write(self, user_id: uuid.UUID | str, change_seq: int) -> None:
+        """Record a write this process has committed; call only once the commit succeeded."""
+        self._remember_write_seq(uuid.UUID(str(user_id)), change_seq, replayed=False)
+
+    def _cached_write_seq(self, user_id: uuid.UUID) -> tuple[float, int | None, bool] | None:
+        with self._write_seqs_lock:
+            entry = self._write_seqs.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._write_seqs[user_id]
+                return None
+            self._write_seqs.move_to_end(user_id)
+            return entry
+
+    def _remember_write_seq(
+        self, user_id: uuid.UUID, change_seq: int | None, replayed: bool, expires_at: float | None = None
+    ) -> tuple[float, int | None, bool]:
+        """Cache the user's last change_seq; returns the entry now in effect."""
+        now = time.monotonic()
+        entry = (now + self.write_seq_ttl if expires_at is None else expires_at, change_seq, replayed)
+        if self.write_seq_cache_size <= 0 or self.write_seq_ttl <= 0:
+            return entry
+        with self._write_seqs_lock:
+            current = self._write_seqs.get(user_id)
+            # A primary read that began before a noted commit returns an older value.
+            if (
+                current is not None
+                and current[0] >= now
+                and current[1] is not None
+                and (change_seq is None or change_seq < current[1])
+            ):
+                return current
+            self._write_seqs[user_id] = entry
+            self._write_seqs.move_to_end(user_id)
+            while len(self._write_seqs) > self.write_seq_cache_size:
+                self._write_seqs.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def last_change_seq(target: Engine, user_id: uuid.UUID) -> int | None:
+        with target.connect() as connection:
+            return connection.execute(_LAST_CHANGE_SEQ, {"user_id": user_id}).scalar_one_or_none()
+
+    def replica_available(self) -> bool:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.health_interval:
+            return self._healthy
+        # Only one thread samples; the others use the previous result meanwhile.
+        if not self._health_lock.acquire(blocking=False):
+            return self._healthy
+        try:
+            lag = self.replica_lag()
+            self._healthy = lag is not None and lag <= self.max_lag_seconds
+            if lag is not None and not self._healthy:
+                logger.warning("replica lag %.1fs exceeds %.1fs, reading from primary", lag, self.max_lag_seconds)
+            self._checked_at = time.monotonic()
+            return self._healthy
+        finally:
+            self._health_lock.release()
+
+    def replica_lag(self) -> float | None:
+        """Return the replica's replay lag in seconds, or None if it is unreachable or cut off."""
+        try:
+            status = self.replica_status()
+        except SQLAlchemyError:
+            logger.warning("replica health check failed, reading from primary", exc_info=True)
+            return None
+        lag = replica_lag_from_status(status, self.max_receiver_silence)
+        if lag is None:
+            if status.receiver_silence is None:
+                logger.warning("replica WAL receiver is not running, reading from primary")
+            else:
+                logger.warning(
+                    "replica WAL receiver is %s and silent for %.0fs, reading from primary",
+                    status.receiver_status,
+                    float(status.receiver_silence),
+                )
+        return lag
+
+    def replica_status(self):
+        with self.replica.connect() as connection:
+            return connection.execute(REPLICA_STATUS_SQL).one()
+
+    def mark_replica_failed(self) -> None:
+        """Stop routing to the replica until the next health sample."""
+        self._healthy = False
+        self._checked_at = time.monotonic()
+
+
+read_router = ReadRouter(engine, read_engine)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, TypeVar
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.db.models import ShardPlacement
+from src.db.session import create_database_engine, engine
+
+# "name=url" pairs separated by commas. Unset means one shard, the DATABASE_URL engine.
+SHARD_DATABASE_URLS = os.getenv("SHARD_DATABASE_URLS", "")
+# Shards that own a slice of the hash ring; defaults to all of them. A shard that is
+# configured but not yet on the ring only receives users moved onto it explicitly.
+SHARD_RING = os.getenv("SHARD_RING", "")
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "128"))
+SHARD_PLACEMENT_REFRESH_SECONDS = float(os.getenv("SHARD_PLACEMENT_REFRESH_SECONDS", "5"))
+
+DEFAULT_SHARD = "default"
+# Raised by ingest on a shard the user has moved away from; the hint names the new shard.
+MOVED_SQLSTATE = "55000"
+MOVED_HINT_PREFIX = "shard:"
+
+# The per-user lock record_workout_write takes. Enqueues take it too, so the
+# rebalancer's cut-over, which holds it while it fences the user, never misses a write.
+USER_WRITE_LOCK = text(
+    "SELECT pg_advisory_xact_lock(hashtextextended('change_seq:' || CAST(:user_id AS text), 0))"
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ShardMoved(Exception):
+    """The user's rows now live on ``shard``; retry there."""
+
+    def __init__(self, user_id: uuid.UUID, shard: str):
+        super().__init__(f"user {user_id} moved to shard {shard}")
+        self.user_id = user_id
+        self.shard = shard
+
+
+def moved_shard(exc: DBAPIError) -> str | None:
+    """Destination shard if ``exc`` is the moved-user fence raised by record_workout_write."""
+    orig = exc.orig
+    if getattr(orig, "sqlstate", None) != MOVED_SQLSTATE:
+        return None
+    hint = getattr(getattr(orig, "diag", None), "message_hint", None) or ""
+    return hint[len(MOVED_HINT_PREFIX):] if hint.startswith(MOVED_HINT_PREFIX) else None
+
+
+def parse_shard_urls(value: str) -> Dict[str, str]:
+    shards: Dict[str, str] = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, url = entry.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid shard entry {entry!r}; expected name=url")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+def _ring_hash(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring; adding a shard moves about 1/N of the users onto it.
+
+    Each shard is placed at ``virtual_nodes`` points so slices stay even. Points
+    depend only on shard names, so renaming a URL moves nobody.
+    """
+
+    def __init__(self, shards, virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        points = sorted(
+            (_ring_hash(f"{shard}#{index}".encode()), shard)
+            for shard in shards
+            for index in range(virtual_nodes)
+        )
+        if not points:
+            raise ValueError("A hash ring needs at least one shard")
+        self.shards = tuple(sorted(set(shards)))
+        self._hashes = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, user_id: uuid.UUID) -> str:
+        index = bisect.bisect(self._hashes, _ring_hash(user_id.bytes)) % len(self._hashes)
+        return self._owners[index]
+
+
+_PLACEMENTS = select(ShardPlacement.user_id, ShardPlacement.shard)
+_PLACEMENTS_FINGERPRINT = select(func.count(), func.max(ShardPlacement.placed_at))
+
+
+class ShardRouter:
+    """Maps a user to the engine of the shard holding their rows.
+
+    The ring decides by default; ``shard_placement`` rows in the directory database
+    (the first shard) override it for users moved by the rebalancer. Overrides are
+    cached in memory and refreshed by ``PlacementReloader``.
+    """
+
+    def __init__(self, engines: Mapping[str, Engine], ring: HashRing, directory: Engine | None = None):
+        unknown = set(ring.shards) - set(engines)
+        if unknown:
+            raise ValueError(f"Ring shards without a database URL: {sorted(unknown)}")
+        self.engines = dict(engines)
+        self.ring = ring
+        self.directory = directory if directory is not None else next(iter(self.engines.values()))
+        self._placements: Mapping[uuid.UUID, str] = MappingProxyType({})
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    @property
+    def single(self) -> bool:
+        return len(self.engines) == 1
+
+    def shard_for(self, user_id: uuid.UUID) -> str:
+        return self._placements.get(user_id) or self.ring.shard_for(user_id)
+
+    def engine_for(self, user_id: uuid.UUID) -> Engine:
+        return self.engines[self.shard_for(user_id)]
+
+    def note_moved(self, user_id: uuid.UUID, shard: str) -> None:
+        """Route ``user_id`` to ``shard`` from now on in this process."""
+        if shard not in self.engines:
+            raise ValueError(f"Unknown shard {shard!r}")
+        with self._lock:
+            placements = dict(self._placements)
+            placements[user_id] = shard
+            self._placements = MappingProxyType(placements)
+
+    def load_placements(self) -> bool:
+        """Reload overrides from the directory if they changed; returns True on reload."""
+        with Session(self.directory) as session, session.begin():
+            fingerprint = tuple(session.execute(_PLACEMENTS_FINGERPRINT).one())
+            if fingerprint == self._fingerprint:
+                return False
+            rows = session.execute(_PLACEMENTS).all()
+        with self._lock:
+            self._placements = MappingProxyType({row.user_id: row.shard for row in rows})
+            self._fingerprint = fingerprint
+        return True
+
+    def run(self, user_id: uuid.UUID, work: Callable[[Session], T]) -> T:
+        """Run ``work`` with a session on the user's shard, following one move if needed."""
+        for attempt in range(2):
+            try:
+                with Session(self.engine_for(user_id)) as session:
+                    return work(session)
+            except ShardMoved as exc:
+                if attempt:
+                    raise
+                logger.info("%s; retrying there", exc)
+                self.note_moved(user_id, exc.shard)
+        raise AssertionError("unreachable")
+
+
+class PlacementReloader:
+    """Background thread that keeps a router's placement overrides current."""
+
+    def __init__(self, router: ShardRouter, interval_seconds: float = SHARD_PLACEMENT_REFRESH_SECONDS):
+        self.router = router
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shard-placements", daemon=True)
+
+    def start(self) -> None:
+        self.reload()
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def reload(self) -> None:
+        try:
+            if self.router.load_placements():
+                logger.info("loaded %d shard placements", len(self.router._placements))
+        except SQLAlchemyError:
+            logger.exception("shard placement reload failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.reload()
+
+
+def build_shard_router(
+    urls: str = SHARD_DATABASE_URLS,
+    ring_shards: str = SHARD_RING,
+    virtual_nodes: int = SHARD_VIRTUAL_NODES,
+) -> ShardRouter:
+    shard_urls = parse_shard_urls(urls)
+    if not shard_urls:
+        return ShardRouter({DEFAULT_SHARD: engine}, HashRing([DEFAULT_SHARD], virtual_nodes))
+    engines = {name: create_database_engine(url) for name, url in shard_urls.items()}
+    members = [name.strip() for name in ring_shards.split(",") if name.strip()] or list(engines)
+    return ShardRouter(engines, HashRing(members, virtual_nodes))
+
+
+shard_router = build_shard_router()
@@ -14,6 +14,11 @@ def normalize_canonical_name(name: str) -> str:
     return collapsed
 
 
+def alias_key(name: str) -> str:
+    """Lookup key for catalog aliases: lowercase words with punctuation dropped."""
+    return " ".join(re.findall(r"[^\W_]+", name.lower()))
+
+
 def weight_to_kg(weight: WeightInput | None) -> float | None:
     if weight is None:
         return None
@@ -21,3 +26,21 @@ def weight_to_kg(weight: WeightInput | None) -> float | None:
     if weight["unit"] == "kg":
         return value
     return value * 0.45359237
+
+
+def trigrams(name: str) -> set[str]:
+    """Trigram set of ``name`` using pg_trgm's rules (per word, padded "  word ")."""
+    grams: set[str] = set()
+    for word in re.findall(r"[^\W_]+", name.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(left: str, right: str) -> float:
+    """Same value as pg_trgm's ``similarity(left, right)``."""
+    left_grams, right_grams = trigrams(left), trigrams(right)
+    if not left_grams or not right_grams:
+        return 0.0
+    shared = len(left_grams & right_grams)
+    return shared / (len(left_grams) + len(right_grams) - shared)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import uuid
 from datetime import date, datetime, timezone
-from typing import Annotated, List, Optional
+from typing import Annotated, List, Literal, Optional, get_args
 
 from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 
@@ -164,8 +164,158 @@ def workout_payload_schema() -> dict:
     return WorkoutIngestPayload.model_json_schema()
 
 
+SetField = Literal[
+    "workout_set_id",
+    "set_index",
+    "reps",
+    "weight_kg",
+    "weight_original_value",
+    "weight_original_unit",
+    "rpe",
+    "rir",
+    "is_warmup",
+    "tempo",
+    "rest_seconds",
+    "notes",
+    "logged_at",
+]
+
+SET_PROJECTIONS: dict[str, tuple[str, ...]] = {
+    "full": get_args(SetField),
+    "compact": ("set_index", "reps", "weight_kg", "rpe", "rir", "is_warmup"),
+    "minimal": ("reps", "weight_kg"),
+}
+
+
 class WorkoutByDateRequest(BaseModel):
     user_id: uuid.UUID
     workout_date: date
+    projection: Literal["full", "compact", "minimal"] = Field(
+        default="full", description="Named set of per-set fields to return."
+    )
+    fields: Optional[List[SetField]] = Field(
+        default=None, description="Explicit per-set fields to return; overrides projection."
+    )
+    summary: bool = Field(
+        default=False,
+        description="Return per-exercise aggregates (sets, top set, total reps, tonnage) instead of sets.",
+    )
+
+    model_config = {"extra": "forbid"}
+
+    def set_fields(self) -> tuple[str, ...]:
+        if self.fields:
+            return tuple(dict.fromkeys(self.fields))
+        return SET_PROJECTIONS[self.projection]
+
+
+LAST_PERFORMANCE_MAX_SESSIONS = 20
+
+
+class LastPerformanceRequest(BaseModel):
+    user_id: uuid.UUID
+    exercise_id: Optional[uuid.UUID] = None
+    exercise: Optional[Annotated[str, Field(min_length=1, max_length=200)]] = Field(
+        default=None, description="Exercise name or catalog alias; used when exercise_id is not given."
+    )
+    n: Annotated[int, Field(ge=1, le=LAST_PERFORMANCE_MAX_SESSIONS)] = Field(
+        default=3, description="Number of most recent sessions to return."
+    )
+    projection: Literal["full", "compact", "minimal"] = Field(
+        default="compact", description="Named set of per-set fields to return."
+    )
+    fields: Optional[List[SetField]] = Field(
+        default=None, description="Explicit per-set fields to return; overrides projection."
+    )
+
+    model_config = {"extra": "forbid"}
+
+    @model_validator(mode="after")
+    def validate_exercise(self) -> "LastPerformanceRequest":
+        if (self.exercise_id is None) == (self.exercise is None):
+            raise ValueError("Provide exactly one of exercise_id or exercise")
+        return self
+
+    def set_fields(self) -> tuple[str, ...]:
+        if self.fields:
+            return tuple(dict.fromkeys(self.fields))
+        return SET_PROJECTIONS[self.projection]
+
+
+class IngestStatusRequest(BaseModel):
+    user_id: uuid.UUID
+    ticket: uuid.UUID
+
+    model_config = {"extra": "forbid"}
+
+
+class WorkoutExportRequest(BaseModel):
+    user_id: uuid.UUID
+    from_date: Optional[date] = Field(default=None, alias="from")
+    to_date: Optional[date] = Field(default=None, alias="to")
+
+    model_config = {"extra": "forbid", "populate_by_name": True}
+
+    @model_validator(mode="after")
+    def validate_range(self) -> "WorkoutExportRequest":
+        if self.from_date and self.to_date and self.to_date < self.from_date:
+            raise ValueError("to must be on or after from")
+        return self
+
+
+CALENDAR_MAX_DAYS = 3660
+
+
+class WorkoutCalendarRequest(BaseModel):
+    user_id: uuid.UUID
+    from_date: date = Field(alias="from")
+    to_date: date = Field(alias="to")
+    encoding: Literal["days", "bitmap", "runs"] = Field(
+        default="days",
+        description=(
+            "days: one entry per workout day with counts; bitmap: base64 bitset, one bit "
+            "per date from `from`; runs: alternating rest/training run lengths."
+        ),
+    )
+
+    model_config = {"extra": "forbid", "populate_by_name": True}
+
+    @model_validator(mode="after")
+    def validate_range(self) -> "WorkoutCalendarRequest":
+        if self.to_date < self.from_date:
+            raise ValueError("to must be on or after from")
+        if (self.to_date - self.from_date).days >= CALENDAR_MAX_DAYS:
+            raise ValueError(f"range must be shorter than {CALENDAR_MAX_DAYS} days")
+        return self
+
+
+class ExerciseSearchRequest(BaseModel):
+    user_id: uuid.UUID
+    query: Annotated[str, Field(min_length=1, max_length=200)]
+    limit: Annotated[int, Field(ge=1, le=50)] = 10
+    min_similarity: Annotated[float, Field(ge=0, le=1)] = Field(
+        default=0.3, description="Minimum trigram similarity (0-1) for a match."
+    )
+
+    model_config = {"extra": "forbid"}
+
+
+class WorkoutSearchRequest(BaseModel):
+    user_id: uuid.UUID
+    query: Annotated[str, Field(min_length=1, max_length=200)] = Field(
+        description='Words to find in workout, exercise and set notes; supports "quoted phrases", or and -word.'
+    )
+    limit: Annotated[int, Field(ge=1, le=50)] = 10
+
+    model_config = {"extra": "forbid"}
+
+
+class ChangesSinceRequest(BaseModel):
+    user_id: uuid.UUID
+    cursor: Annotated[int, Field(ge=0)] = Field(
+        default=0,
+        description="change_seq returned by the previous call; 0 fetches the full history.",
+    )
+    limit: Annotated[int, Field(ge=1, le=500)] = 100
 
     model_config = {"extra": "forbid"}
@@ -1,23 +1,26 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import os
 import logging
+import math
 import secrets
 from pathlib import Path
 import time
 from urllib.parse import urlencode, urlparse
 from typing import Any
 
-from pydantic import AnyHttpUrl
+from pydantic import AnyHttpUrl, ValidationError
 
 import anyio
 import httpx
 from google.auth.transport.requests import Request as GoogleAuthRequest
 from google.oauth2 import id_token
 from starlette.requests import Request as StarletteRequest
-from starlette.responses import RedirectResponse, Response
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
 
 from mcp.server.auth.provider import AccessToken, TokenVerifier
 from mcp.server.auth.settings import AuthSettings
@@ -27,9 +30,33 @@ from mcp.server.auth.json_response import PydanticJSONResponse
 from mcp.shared.auth import OAuthClientInformationFull, OAuthClientMetadata, OAuthMetadata, ProtectedResourceMetadata
 from mcp.server.fastmcp import FastMCP
 
-from src.db.session import engine
-from src.domain.payloads import WorkoutByDateRequest, WorkoutIngestPayload
+from src.db.retry import run_with_retries
+from src.db.routing import read_router
+from src.db.session import SessionLocal, engine
+from src.db.sharding import PlacementReloader, shard_router
+from src.domain.payloads import (
+    ChangesSinceRequest,
+    ExerciseSearchRequest,
+    IngestStatusRequest,
+    LastPerformanceRequest,
+    WorkoutByDateRequest,
+    WorkoutCalendarRequest,
+    WorkoutExportRequest,
+    WorkoutIngestPayload,
+    WorkoutSearchRequest,
+)
+from src.service.admission import AdmissionController, AdmissionRejected
+from src.service.change_feed import get_changes_since
+from src.service.exercise_catalog import CatalogReloader
+from src.service.exercise_search import search_exercises
+from src.service.export_workouts import accepts_gzip, gzip_chunks, iter_ndjson_chunks, iter_workouts
+from src.service.idempotency import IdempotencyJanitor
+from src.service.ingest_queue import IngestWorkerPool, enqueue_workout, get_ingest_status, requeue_item
 from src.service.ingest_workout import get_workout_for_day, ingest_workout
+from src.service.last_performance import get_last_performance
+from src.service.profiling import ToolProfiler
+from src.service.workout_calendar import get_workout_calendar
+from src.service.workout_search import search_workouts
 
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
@@ -41,6 +68,16 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 API_KEY = os.getenv("API_KEY")
 API_KEYS_FILE = os.getenv("API_KEYS_FILE", "api_keys.txt")
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "20"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "0.5"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+MCP_STATELESS_HTTP = os.getenv("MCP_STATELESS_HTTP", "false").lower() in {"1", "true", "yes"}
+# Principals (API key digest "api-key:<sha256 prefix>" or Google email) allowed to use
+# the /admin routes and to request profiles with the X-Profile header.
+ADMIN_PRINCIPALS = {p.strip() for p in os.getenv("ADMIN_PRINCIPALS", "").split(",") if p.strip()}
 
 if not AUTH_SERVER_URL:
     parsed_resource = urlparse(RESOURCE_SERVER_URL)
@@ -83,6 +120,7 @@ class GoogleTokenVerifier(TokenVerifier):
             client_id="api-key",
             scopes=[],
             expires_at=int(time.time()) + 31536000,
+            subject=f"api-key:{hashlib.sha256(token.encode()).hexdigest()[:16]}",
         )
 
     def _verify_id_token(self, token: str) -> AccessToken | None:
@@ -118,6 +156,7 @@ class GoogleTokenVerifier(TokenVerifier):
             client_id=str(claims.get("aud", "")),
             scopes=[],
             expires_at=expires_at_int,
+            subject=email,
         )
 
     async def verify_token(self, token: str) -> AccessToken | None:
@@ -173,19 +212,25 @@ class GoogleTokenVerifier(TokenVerifier):
             client_id=str(aud or ""),
             scopes=scopes,
             expires_at=expires_at,
+            subject=email,
         )
 
 
+token_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID, load_api_keys(API_KEYS_FILE, API_KEY))
+admission = AdmissionController()
+profiler = ToolProfiler()
+
 mcp = FastMCP(
     "workout-tracker-mcp",
     instructions="Persist workout entries to the Workout Tracker system of record.",
     host=HOST,
     port=PORT,
+    stateless_http=MCP_STATELESS_HTTP,
     auth=AuthSettings(
         issuer_url=AnyHttpUrl(AUTH_SERVER_URL),
         resource_server_url=RESOURCE_SERVER_URL,
     ),
-    token_verifier=GoogleTokenVerifier(GOOGLE_CLIENT_ID, load_api_keys(API_KEYS_FILE, API_KEY)),
+    token_verifier=token_verifier,
 )
 
 
@@ -287,22 +332,312 @@ async def oauth_register(request: StarletteRequest) -> Response:
     return PydanticJSONResponse(content=client_info)
 
 
+async def authenticate_request(request: StarletteRequest) -> AccessToken | None:
+    """Verify the bearer token on a custom route, which FastMCP auth does not cover."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    access_token = await token_verifier.verify_token(token.strip())
+    if access_token is None:
+        return None
+    if access_token.expires_at and access_token.expires_at < int(time.time()):
+        return None
+    return access_token
+
+
+def unauthorized_response() -> Response:
+    return JSONResponse(
+        {"error": "invalid_token", "error_description": "Authentication required"},
+        status_code=401,
+        headers={"WWW-Authenticate": f'Bearer resource_metadata="{metadata_url}"'},
+    )
+
+
+def too_many_requests_response(exc: AdmissionRejected) -> Response:
+    return JSONResponse(
+        {"error": "too_many_requests", "error_description": exc.reason},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """A streaming response that frees its principal's admission slot when sending ends.
+
+    The release runs however sending ends, including a client that disconnects
+    before the body is first iterated, where a ``finally`` inside the body
+    generator would never run.
+    """
+
+    def __init__(self, principal: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.principal = principal
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release(self.principal)
+
+
+@mcp.custom_route("/export/workouts", methods=["GET"])
+async def export_workouts(request: StarletteRequest) -> Response:
+    access_token = await authenticate_request(request)
+    if access_token is None:
+        return unauthorized_response()
+    try:
+        export_request = WorkoutExportRequest.model_validate(dict(request.query_params))
+    except ValidationError as exc:
+        return JSONResponse({"error": "invalid_request", "detail": str(exc)}, status_code=400)
+
+    # The stream holds a connection until it ends, so it keeps its slot until then.
+    principal = principal_for(access_token)
+    try:
+        admission.acquire(principal)
+    except AdmissionRejected as exc:
+        return too_many_requests_response(exc)
+
+    def ndjson_stream():
+        with Session(read_engine_for(export_request.user_id)) as session:
+            yield from iter_ndjson_chunks(iter_workouts(session, export_request))
+
+    headers = {"Cache-Control": "no-store"}
+    body = ndjson_stream()
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_chunks(body)
+    return AdmittedStreamingResponse(
+        principal, body, media_type="application/x-ndjson", headers=headers
+    )
+
+
+async def authenticate_admin(request: StarletteRequest) -> Response | None:
+    """None for an admin caller, otherwise the 401 or 403 response to send."""
+    access_token = await authenticate_request(request)
+    if access_token is None:
+        return unauthorized_response()
+    if principal_for(access_token) not in ADMIN_PRINCIPALS:
+        return JSONResponse({"error": "forbidden", "error_description": "Admin only"}, status_code=403)
+    return None
+
+
+@mcp.custom_route("/admin/profiles", methods=["GET"])
+async def list_profiles(request: StarletteRequest) -> Response:
+    denied = await authenticate_admin(request)
+    if denied is not None:
+        return denied
+    profiles = await anyio.to_thread.run_sync(profiler.store.list)
+    return JSONResponse({"profiles": profiles}, headers={"Cache-Control": "no-store"})
+
+
+@mcp.custom_route("/admin/profiles/{name}", methods=["GET"])
+async def download_profile(request: StarletteRequest) -> Response:
+    denied = await authenticate_admin(request)
+    if denied is not None:
+        return denied
+    path = profiler.store.path_for(request.path_params["name"])
+    if path is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    media_type = "text/plain" if path.suffix == ".collapsed" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
+def principal_for(access_token: AccessToken | None) -> str:
+    """Admission-control key: the API key digest or Google account email."""
+    if access_token is None:
+        return "anonymous"
+    return access_token.subject or access_token.client_id
+
+
+def current_request() -> StarletteRequest | None:
+    # The HTTP request carrying this tool call; the auth context variable is not
+    # reliable once a stateful session task serves several requests.
+    try:
+        return mcp.get_context().request_context.request
+    except ValueError:
+        return None
+
+
+def request_principal(request: StarletteRequest | None) -> str:
+    return principal_for(getattr(getattr(request, "user", None), "access_token", None))
+
+
+def requested_profile_mode(request: StarletteRequest | None, principal: str) -> str | None:
+    """The X-Profile header value ("sample", "cprofile" or "1"), honoured for admins only."""
+    requested = request.headers.get("x-profile") if request is not None else None
+    if requested and principal in ADMIN_PRINCIPALS:
+        return requested.lower()
+    return None
+
+
+def admission_controlled(tool):
+    """Admit a blocking, DB-bound tool call for the caller, then run it in a worker thread.
+
+    Calls over the caller's rate or concurrency limit, or over the process-wide
+    in-flight cap, fail immediately with a retry-after hint. A call an admin asked
+    to profile, or one picked by PROFILE_SAMPLE_RATE, runs under the profiler.
+    """
+    tool_name = tool.__name__.removesuffix("_tool")
+
+    @functools.wraps(tool)
+    async def admitted(*args, **kwargs):
+        request = current_request()
+        principal = request_principal(request)
+        call = functools.partial(tool, *args, **kwargs)
+        profile_mode = profiler.choose_mode(requested_profile_mode(request, principal))
+        if profile_mode:
+            call = functools.partial(profiler.run, profile_mode, tool_name, call)
+        try:
+            with admission.admit(principal):
+                return await anyio.to_thread.run_sync(call)
+        except AdmissionRejected as exc:
+            raise ValueError(f"Too many requests: {exc}") from exc
+
+    return admitted
+
+
 def handle_add_workout_entry(
     payload: WorkoutIngestPayload | dict, session: Session
 ) -> dict:
     return ingest_workout(session, payload)
 
 
+def handle_enqueue_workout_entry(
+    payload: WorkoutIngestPayload | dict, session: Session
+) -> dict:
+    return enqueue_workout(session, payload)
+
+
 def handle_get_workout_for_day(payload: WorkoutByDateRequest | dict, session: Session) -> dict:
     return get_workout_for_day(session, payload)
 
 
+def handle_get_last_performance(payload: LastPerformanceRequest | dict, session: Session) -> dict:
+    return get_last_performance(session, payload)
+
+
+def handle_get_workout_calendar(payload: WorkoutCalendarRequest | dict, session: Session) -> dict:
+    return get_workout_calendar(session, payload)
+
+
+def handle_search_exercises(payload: ExerciseSearchRequest | dict, session: Session) -> dict:
+    return search_exercises(session, payload)
+
+
+def handle_search_workouts(payload: WorkoutSearchRequest | dict, session: Session) -> dict:
+    return search_workouts(session, payload)
+
+
+def handle_get_changes_since(payload: ChangesSinceRequest | dict, session: Session) -> dict:
+    return get_changes_since(session, payload)
+
+
+def handle_get_ingest_status(payload: IngestStatusRequest | dict, session: Session) -> dict:
+    return get_ingest_status(session, payload)
+
+
+def read_engine_for(user_id):
+    # Read replicas front a single primary; once sharded, reads go to the user's shard.
+    if shard_router.single:
+        return read_router.engine_for(user_id)
+    return shard_router.engine_for(user_id)
+
+
+def run_write(user_id, handler, payload) -> dict:
+    """Run a handler on the user's shard, following the user if the rebalancer moved them.
+
+    A transaction that lost a race to a concurrent writer (deadlock, serialization
+    failure, duplicate get-or-create) is retried up to DB_RETRY_ATTEMPTS times.
+    """
+    return run_with_retries(lambda: shard_router.run(user_id, lambda session: handler(payload, session)))
+
+
+def run_read(user_id, handler, payload) -> dict:
+    """Run a read-only handler on the routed engine, retrying on the primary if the replica drops."""
+    if not shard_router.single:
+        return run_write(user_id, handler, payload)
+    target = read_router.engine_for(user_id)
+    try:
+        with Session(target) as session:
+            return handler(payload, session)
+    except OperationalError:
+        if target is engine:
+            raise
+        logger.warning("replica read failed, retrying on primary", exc_info=True)
+        read_router.mark_replica_failed()
+        with Session(engine) as session:
+            return handler(payload, session)
+
+
+def shard_session_factories() -> list:
+    if shard_router.single:
+        return [SessionLocal]
+    return [sessionmaker(bind=shard_engine, future=True) for shard_engine in shard_router.engines.values()]
+
+
+def reroute_queued_item(item, shard: str) -> None:
+    """Follow a queued item's user to the shard they moved to."""
+    shard_router.note_moved(item.user_id, shard)
+    requeue_item(shard_router.engines[shard], item)
+
+
+def start_ingest_workers() -> list[IngestWorkerPool]:
+    """Start the background queue workers, one pool per shard, in async ingest mode."""
+    if INGEST_MODE != "async":
+        return []
+    pools = []
+    for session_factory in shard_session_factories():
+        pool = IngestWorkerPool(
+            session_factory,
+            workers=INGEST_WORKERS,
+            batch_size=INGEST_BATCH_SIZE,
+            poll_interval=INGEST_POLL_INTERVAL,
+            max_attempts=INGEST_MAX_ATTEMPTS,
+            reroute=None if shard_router.single else reroute_queued_item,
+        )
+        pool.start()
+        pools.append(pool)
+    return pools
+
+
+def start_idempotency_janitors() -> list[IdempotencyJanitor]:
+    """Start the periodic purge of expired stored idempotency responses on every shard."""
+    janitors = []
+    for session_factory in shard_session_factories():
+        janitor = IdempotencyJanitor(session_factory, interval_seconds=IDEMPOTENCY_PURGE_INTERVAL)
+        janitor.start()
+        janitors.append(janitor)
+    return janitors
+
+
+def start_placement_reloader() -> PlacementReloader | None:
+    """Keep shard placement overrides current when more than one shard is configured."""
+    if shard_router.single:
+        return None
+    reloader = PlacementReloader(shard_router)
+    reloader.start()
+    return reloader
+
+
+def start_catalog_reloader() -> CatalogReloader:
+    """Load the exercise alias catalog into memory and keep it in sync with the database."""
+    reloader = CatalogReloader(SessionLocal)
+    reloader.start()
+    return reloader
+
+
 @mcp.tool(name="add_workout_entry")
+@admission_controlled
 def add_workout_entry(payload: WorkoutIngestPayload) -> dict:
-    """Validate and persist a workout entry payload."""
+    """Validate and persist a workout entry payload.
+
+    In async ingest mode the payload is queued and a ticket is returned; poll
+    ``get_ingest_status`` with it for the final result.
+    """
     try:
-        with Session(engine) as session:
-            return handle_add_workout_entry(payload, session)
+        if INGEST_MODE == "async":
+            return run_write(payload.user_id, handle_enqueue_workout_entry, payload)
+        return run_write(payload.user_id, handle_add_workout_entry, payload)
     except ValueError as exc:
         detail = str(exc) or repr(exc)
         raise ValueError(f"Invalid workout payload: {detail}") from exc
@@ -315,11 +650,15 @@ def add_workout_entry(payload: WorkoutIngestPayload) -> dict:
 
 
 @mcp.tool(name="get_workout_for_day")
+@admission_controlled
 def get_workout_for_day_tool(payload: WorkoutByDateRequest) -> dict:
-    """Fetch the workout (with exercises and sets) for a given user and calendar date."""
+    """Fetch the workout (with exercises and sets) for a given user and calendar date.
+
+    Use ``projection`` ("full", "compact", "minimal") or ``fields`` to limit the per-set
+    fields returned, or ``summary`` for per-exercise aggregates instead of sets.
+    """
     try:
-        with Session(engine) as session:
-            return handle_get_workout_for_day(payload, session)
+        return run_read(payload.user_id, handle_get_workout_for_day, payload)
     except ValueError as exc:
         detail = str(exc) or repr(exc)
         raise ValueError(f"Invalid request: {detail}") from exc
@@ -329,3 +668,127 @@ def get_workout_for_day_tool(payload: WorkoutByDateRequest) -> dict:
     except Exception as exc:
         detail = str(exc) or repr(exc)
         raise ValueError(f"Unexpected error while fetching workout: {detail}") from exc
+
+
+@mcp.tool(name="get_last_performance")
+@admission_controlled
+def get_last_performance_tool(payload: LastPerformanceRequest) -> dict:
+    """Return the user's last ``n`` sessions of one exercise, newest first, with their sets.
+
+    Name the exercise by ``exercise_id`` or by ``exercise`` (canonical name or catalog
+    alias). ``projection`` or ``fields`` limit the per-set fields, as in get_workout_for_day.
+    ``exercise`` is null when nothing matches; search_exercises finds the stored names.
+    """
+    try:
+        return run_read(payload.user_id, handle_get_last_performance, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while fetching last performance: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while fetching last performance: {detail}") from exc
+
+
+@mcp.tool(name="get_workout_calendar")
+@admission_controlled
+def get_workout_calendar_tool(payload: WorkoutCalendarRequest) -> dict:
+    """List the dates between ``from`` and ``to`` (inclusive) on which the user trained.
+
+    ``encoding`` "days" returns each date with its exercise and set counts. For long
+    ranges use "bitmap" (base64, one bit per date) or "runs" (alternating rest and
+    training run lengths) to keep the response small.
+    """
+    try:
+        return run_read(payload.user_id, handle_get_workout_calendar, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while fetching calendar: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while fetching calendar: {detail}") from exc
+
+
+@mcp.tool(name="search_exercises")
+@admission_controlled
+def search_exercises_tool(payload: ExerciseSearchRequest) -> dict:
+    """Find a user's exercises (and global catalog exercises) whose names resemble ``query``.
+
+    Matches are ranked by trigram similarity, so misspellings and reordered or extra
+    words ("barbell bench press" for "bench press") still match.
+    """
+    try:
+        return run_read(payload.user_id, handle_search_exercises, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while searching exercises: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while searching exercises: {detail}") from exc
+
+
+@mcp.tool(name="search_workouts")
+@admission_controlled
+def search_workouts_tool(payload: WorkoutSearchRequest) -> dict:
+    """Find the user's workouts whose notes mention ``query``, best matches first.
+
+    Searches workout, exercise and set notes (including archived days). Each result
+    has the workout date and title plus snippets with matched words wrapped in <b>…</b>.
+    """
+    try:
+        return run_read(payload.user_id, handle_search_workouts, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while searching workouts: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while searching workouts: {detail}") from exc
+
+
+@mcp.tool(name="get_changes_since")
+@admission_controlled
+def get_changes_since_tool(payload: ChangesSinceRequest) -> dict:
+    """Return the user's workouts created or changed since ``cursor``, oldest change first.
+
+    Start with ``cursor`` 0 and pass back the returned ``cursor`` on the next call; keep
+    paging while ``has_more`` is true. Each changed workout is returned in full.
+    """
+    try:
+        return run_read(payload.user_id, handle_get_changes_since, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while fetching changes: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while fetching changes: {detail}") from exc
+
+
+@mcp.tool(name="get_ingest_status")
+@admission_controlled
+def get_ingest_status_tool(payload: IngestStatusRequest) -> dict:
+    """Return the processing status and result for a queued workout entry ticket."""
+    try:
+        return run_write(payload.user_id, handle_get_ingest_status, payload)
+    except ValueError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Invalid request: {detail}") from exc
+    except SQLAlchemyError as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Database error while fetching ingest status: {detail}") from exc
+    except Exception as exc:
+        detail = str(exc) or repr(exc)
+        raise ValueError(f"Unexpected error while fetching ingest status: {detail}") from exc
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from src.db.session import pool_options
+
+# Off unless enabled: with ADMISSION_CONTROL unset every limit defaults to 0, and each
+# ADMISSION_* variable below can still switch on a single limit on its own.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "false").lower() in {"1", "true", "yes"}
+ADMISSION_RATE_PER_SECOND = float(
+    os.getenv("ADMISSION_RATE_PER_SECOND", "5" if ADMISSION_CONTROL else "0")
+)
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "20"))
+# When enabled, defaults to the connections one process can hold: SQLAlchemy's 5 + 10
+# overflow, or this worker's share of DB_MAX_CONNECTIONS.
+ADMISSION_MAX_IN_FLIGHT = int(
+    os.getenv(
+        "ADMISSION_MAX_IN_FLIGHT",
+        str(sum(pool_options().values()) or 15) if ADMISSION_CONTROL else "0",
+    )
+)
+ADMISSION_PRINCIPAL_MAX_IN_FLIGHT = int(
+    os.getenv("ADMISSION_PRINCIPAL_MAX_IN_FLIGHT", "4" if ADMISSION_CONTROL else "0")
+)
+ADMISSION_BUSY_RETRY_AFTER = float(os.getenv("ADMISSION_BUSY_RETRY_AFTER", "1"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}; retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _PrincipalState:
+    __slots__ = ("tokens", "updated_at", "in_flight")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.in_flight = 0
+
+
+class AdmissionController:
+    """Token bucket and in-flight limits per principal, plus a process-wide in-flight cap.
+
+    Requests over a limit are rejected at once with a retry-after hint rather than
+    queued. Idle principals are kept in least-recently-used order and dropped once
+    idle long enough for their bucket to refill, so forgetting them changes nothing.
+    Principals with calls in flight are held apart until their last call ends, so
+    each call does O(1) amortized work. A rate or cap of 0 disables that limit;
+    the burst is at least 1.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float = ADMISSION_RATE_PER_SECOND,
+        burst: float = ADMISSION_BURST,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        principal_max_in_flight: int = ADMISSION_PRINCIPAL_MAX_IN_FLIGHT,
+        busy_retry_after: float = ADMISSION_BUSY_RETRY_AFTER,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate_per_second = rate_per_second
+        self.burst = max(burst, 1.0)
+        self.max_in_flight = max_in_flight
+        self.principal_max_in_flight = principal_max_in_flight
+        self.busy_retry_after = busy_retry_after
+        self.idle_seconds = self.burst / rate_per_second if rate_per_second > 0 else 0.0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._principals: OrderedDict[str, _PrincipalState] = OrderedDict()
+        self._busy: dict[str, _PrincipalState] = {}
+        self.in_flight = 0
+
+    def __len__(self) -> int:
+        return len(self._principals) + len(self._busy)
+
+    def _evict_idle(self, now: float) -> None:
+        while self._principals:
+            state = next(iter(self._principals.values()))
+            if now - state.updated_at < self.idle_seconds:
+                return
+            self._principals.popitem(last=False)
+
+    def _refill(self, state: _PrincipalState, now: float) -> None:
+        elapsed = now - state.updated_at
+        state.tokens = min(self.burst, state.tokens + elapsed * self.rate_per_second)
+        state.updated_at = now
+
+    def _state(self, principal: str, now: float) -> _PrincipalState:
+        state = self._busy.get(principal)
+        if state is not None:
+            self._refill(state, now)
+            return state
+        state = self._principals.get(principal)
+        if state is None:
+            state = self._principals[principal] = _PrincipalState(self.burst, now)
+            return state
+        self._refill(state, now)
+        self._principals.move_to_end(principal)
+        return state
+
+    def acquire(self, principal: str) -> None:
+        now = self._clock()
+        with self._lock:
+            self._evict_idle(now)
+            state = self._state(principal, now)
+            if self.principal_max_in_flight and state.in_flight >= self.principal_max_in_flight:
+                raise AdmissionRejected("too many concurrent requests", self.busy_retry_after)
+            if self.rate_per_second > 0 and state.tokens < 1:
+                raise AdmissionRejected(
+                    "rate limit exceeded", (1 - state.tokens) / self.rate_per_second
+                )
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                raise AdmissionRejected("server busy", self.busy_retry_after)
+            if self.rate_per_second > 0:
+                state.tokens -= 1
+            if not state.in_flight:
+                self._busy[principal] = self._principals.pop(principal)
+            state.in_flight += 1
+            self.in_flight += 1
+
+    def release(self, principal: str) -> None:
+        now = self._clock()
+        with self._lock:
+            state = self._busy[principal]
+            state.in_flight -= 1
+            self.in_flight -= 1
+            if not state.in_flight:
+                # Back at the young end of the LRU, with its bucket refilled to now.
+                del self._busy[principal]
+                self._refill(state, now)
+                self._principals[principal] = state
+
+    @contextmanager
+    def admit(self, principal: str) -> Iterator[None]:
+        self.acquire(principal)
+        try:
+            yield
+        finally:
+            self.release(principal)
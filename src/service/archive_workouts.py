@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.db.models import Exercise, Workout, WorkoutArchive, WorkoutExercise, WorkoutSet
+from src.db.session import begin_write, is_sqlite
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# The keys of a packed set document, in order. The archiver packs workout_set rows
+# into it and packed set storage writes it at ingest; each key is the workout_set
+# column of the same name, except workout_set_id, which is its id.
+PACKED_SET_FIELDS = (
+    "workout_set_id",
+    "set_index",
+    "reps",
+    "weight_kg",
+    "weight_original_value",
+    "weight_original_unit",
+    "rpe",
+    "rir",
+    "is_warmup",
+    "tempo",
+    "rest_seconds",
+    "notes",
+    "logged_at",
+)
+# Assigned when the set is stored; the rest come from the ingest payload.
+PACKED_SET_STORED_FIELDS = ("workout_set_id", "set_index", "logged_at")
+
+# Set field name -> workout_set column, for reads that select sets by field name.
+SET_COLUMNS = {
+    name: WorkoutSet.__table__.c["id" if name == "workout_set_id" else name]
+    for name in PACKED_SET_FIELDS
+}
+_PACKED_SET_OBJECT_ARGS = ", ".join(
+    f"'{name}', ws.{column.name}" for name, column in SET_COLUMNS.items()
+)
+
+# Packs a batch of old workouts into workout_archive and removes their hot rows in one
+# statement; null set fields are left out to keep documents small, and exercises
+# stored with packed sets carry their document over unchanged. Workouts being
+# written concurrently are skipped and picked up next run. A write to an archived
+# day clears archived_at (record_workout_write), so the day is batched again and its
+# new rows are appended to the existing document by the ON CONFLICT below.
+ARCHIVE_BATCH_SQL = text(
+    f"""
+    WITH batch AS (
+        SELECT id, user_id
+        FROM workout
+        WHERE workout_date < :before AND archived_at IS NULL
+        ORDER BY workout_date
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    batch_exercise AS (
+        SELECT we.id, we.workout_id, we.exercise_id, we.notes, we.packed_sets
+        FROM workout_exercise we
+        JOIN batch ON batch.id = we.workout_id
+    ),
+    packed_sets AS (
+        SELECT
+            ws.workout_exercise_id,
+            jsonb_agg(
+                jsonb_strip_nulls(
+                    jsonb_build_object({_PACKED_SET_OBJECT_ARGS})
+                )
+                ORDER BY ws.set_index
+            ) AS sets
+        FROM workout_set ws
+        JOIN batch_exercise be ON be.id = ws.workout_exercise_id
+        GROUP BY ws.workout_exercise_id
+    ),
+    packed_exercises AS (
+        SELECT
+            be.workout_id,
+            jsonb_agg(
+                jsonb_build_object(
+                    'workout_exercise_id', be.id,
+                    'exercise_id', be.exercise_id,
+                    'display_name', ex.display_name,
+                    'canonical_name', ex.canonical_name,
+                    'notes', be.notes,
+                    'sets', COALESCE(ps.sets, be.packed_sets, '[]'::jsonb)
+                )
+            ) AS exercises
+        FROM batch_exercise be
+        JOIN exercise ex ON ex.id = be.exercise_id
+        LEFT JOIN packed_sets ps ON ps.workout_exercise_id = be.id
+        GROUP BY be.workout_id
+    ),
+    packed AS (
+        INSERT INTO workout_archive (workout_id, user_id, exercises)
+        SELECT batch.id, batch.user_id, COALESCE(pe.exercises, '[]'::jsonb)
+        FROM batch
+        LEFT JOIN packed_exercises pe ON pe.workout_id = batch.id
+        ON CONFLICT (workout_id) DO UPDATE
+            SET exercises = workout_archive.exercises || EXCLUDED.exercises
+        RETURNING workout_id
+    ),
+    cleared AS (
+        DELETE FROM workout_exercise
+        WHERE id IN (SELECT id FROM batch_exercise)
+    )
+    UPDATE workout
+    SET archived_at = now()
+    WHERE id IN (SELECT workout_id FROM packed)
+    """
+)
+
+
+def json_value(value):
+    """A set column value as it appears in JSON output and packed documents."""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _archive_batch_sqlite(session: Session, before: date, batch_size: int) -> int:
+    """ARCHIVE_BATCH_SQL for SQLite, which has no data-modifying CTEs or jsonb_agg.
+
+    The documents are packed in Python to the same shape; the caller's write
+    transaction holds the database lock, so no rows need skipping.
+    """
+    owners = dict(
+        session.execute(
+            select(Workout.id, Workout.user_id)
+            .where(Workout.workout_date < before, Workout.archived_at.is_(None))
+            .order_by(Workout.workout_date)
+            .limit(batch_size)
+        ).all()
+    )
+    if not owners:
+        return 0
+    workout_ids = list(owners)
+
+    sets: Dict[uuid.UUID, List[Dict]] = {}
+    packed_sets = select(
+        WorkoutSet.workout_exercise_id,
+        *(column.label(name) for name, column in SET_COLUMNS.items()),
+    )
+    for row in session.execute(
+        packed_sets.join(WorkoutExercise, WorkoutExercise.id == WorkoutSet.workout_exercise_id)
+        .where(WorkoutExercise.workout_id.in_(workout_ids))
+        .order_by(WorkoutSet.workout_exercise_id, WorkoutSet.set_index)
+    ):
+        values = row._mapping
+        sets.setdefault(row.workout_exercise_id, []).append(
+            {
+                name: json_value(values[name])
+                for name in SET_COLUMNS
+                if values[name] is not None
+            }
+        )
+    documents: Dict[uuid.UUID, List[Dict]] = {workout_id: [] for workout_id in workout_ids}
+    for row in session.execute(
+        select(
+            WorkoutExercise.id,
+            WorkoutExercise.workout_id,
+            WorkoutExercise.exercise_id,
+            WorkoutExercise.notes,
+            WorkoutExercise.packed_sets,
+            Exercise.display_name,
+            Exercise.canonical_name,
+        )
+        .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+        .where(WorkoutExercise.workout_id.in_(workout_ids))
+    ):
+        documents[row.workout_id].append(
+            {
+                "workout_exercise_id": str(row.id),
+                "exercise_id": str(row.exercise_id),
+                "display_name": row.display_name,
+                "canonical_name": row.canonical_name,
+                "notes": row.notes,
+                "sets": sets.get(row.id) or row.packed_sets or [],
+            }
+        )
+
+    for workout_id, packed in session.execute(
+        select(WorkoutArchive.workout_id, WorkoutArchive.exercises).where(
+            WorkoutArchive.workout_id.in_(workout_ids)
+        )
+    ):
+        documents[workout_id] = packed + documents[workout_id]
+    insert = sqlite_insert(WorkoutArchive)
+    session.execute(
+        insert.on_conflict_do_update(
+            index_elements=[WorkoutArchive.workout_id], set_={"exercises": insert.excluded.exercises}
+        ),
+        [
+            {"workout_id": workout_id, "user_id": owners[workout_id], "exercises": packed}
+            for workout_id, packed in documents.items()
+        ],
+    )
+    # Sets go with their exercises through ON DELETE CASCADE.
+    session.execute(
+        delete(WorkoutExercise).where(WorkoutExercise.workout_id.in_(workout_ids)),
+        execution_options={"synchronize_session": False},
+    )
+    session.execute(
+        update(Workout).where(Workout.id.in_(workout_ids)).values(archived_at=func.now()),
+        execution_options={"synchronize_session": False},
+    )
+    return len(workout_ids)
+
+
+def archive_horizon(after_days: int = ARCHIVE_AFTER_DAYS, today: date | None = None) -> date:
+    return (today or date.today()) - timedelta(days=after_days)
+
+
+def archive_workouts(
+    session: Session, before: date, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> int:
+    """Archive workouts dated before ``before`` in short batches; returns the number moved."""
+    archived = 0
+    while True:
+        with begin_write(session):
+            if is_sqlite(session):
+                moved = _archive_batch_sqlite(session, before, batch_size)
+            else:
+                moved = session.execute(
+                    ARCHIVE_BATCH_SQL, {"before": before, "batch_size": batch_size}
+                ).rowcount
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+def summarize_sets(sets: List[Dict]) -> Dict:
+    """Per-exercise aggregates for packed sets, matching the SQL summary on hot rows.
+
+    An exercise without sets gets zero counts and an empty top set.
+    """
+    weighted = [s for s in sets if s.get("weight_kg") is not None]
+    ranked = sorted(
+        sets,
+        key=lambda s: (s.get("weight_kg") is None, -(s.get("weight_kg") or 0), -s["reps"]),
+    )
+    return {
+        "sets": len(sets),
+        "total_reps": sum(s["reps"] for s in sets),
+        "top_set": {
+            "weight_kg": max((s["weight_kg"] for s in weighted), default=None),
+            "reps": ranked[0]["reps"] if ranked else None,
+        },
+        "tonnage_kg": sum(s["reps"] * s["weight_kg"] for s in weighted),
+    }
+
+
+def _archived_value(name: str, value):
+    # JSONB renders timestamps without trailing zeros in the fraction ("...21.56005"),
+    # so re-format them the way hot reads do.
+    if name == "logged_at" and value is not None:
+        return datetime.fromisoformat(value).isoformat()
+    return value
+
+
+def shape_packed_sets(sets: List[Dict], fields: tuple[str, ...], summary: bool = False) -> Dict:
+    """The ``sets`` (or ``summary``) entry for packed set documents, as hot reads shape it.
+
+    Used for archived exercises and for hot exercises stored with SET_STORAGE=packed.
+    """
+    if summary:
+        return {"summary": summarize_sets(sets)}
+    return {
+        "sets": [
+            {name: _archived_value(name, set_data.get(name)) for name in fields}
+            for set_data in sets
+        ]
+    }
+
+
+def shape_archived_exercise(
+    exercise: Dict, fields: tuple[str, ...], summary: bool = False
+) -> Dict:
+    """Project a packed exercise the same way get_workout_for_day shapes hot rows."""
+    return {
+        "workout_exercise_id": exercise["workout_exercise_id"],
+        "exercise_id": exercise["exercise_id"],
+        "display_name": exercise["display_name"],
+        "canonical_name": exercise["canonical_name"],
+        "notes": exercise["notes"],
+        **shape_packed_sets(exercise["sets"], fields, summary),
+    }
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db.models import Workout, WorkoutExercise, WorkoutSet
+from src.domain.payloads import ChangesSinceRequest
+from src.service.export_workouts import (
+    assemble_workouts,
+    load_archived_exercises,
+    workout_rows_statement,
+)
+
+
+def _changed_workouts_statement(request: ChangesSinceRequest):
+    # One extra workout tells us whether another page exists.
+    changed = (
+        select(Workout.id)
+        .where(Workout.user_id == request.user_id, Workout.change_seq > request.cursor)
+        .order_by(Workout.change_seq)
+        .limit(request.limit + 1)
+    )
+    return (
+        workout_rows_statement()
+        .where(Workout.id.in_(changed.scalar_subquery()))
+        .order_by(Workout.change_seq, WorkoutExercise.id, WorkoutSet.set_index)
+    )
+
+
+def get_changes_since(session: Session, payload: Dict | ChangesSinceRequest) -> Dict:
+    """Return the user's workouts changed after ``cursor`` and the cursor to resume from.
+
+    Each changed workout is returned whole (archived exercises included), ordered by
+    ``change_seq``. The lookup walks ``ix_workout_user_change_seq`` from the cursor, so
+    the cost tracks the number of changes rather than the size of the history.
+    """
+    if isinstance(payload, ChangesSinceRequest):
+        request = payload
+    else:
+        request = ChangesSinceRequest.model_validate(payload)
+
+    with session.begin():
+        rows = session.execute(_changed_workouts_statement(request)).all()
+        archives = load_archived_exercises(session, {row.workout_id for row in rows})
+        changes = list(assemble_workouts(rows, archives))
+
+    has_more = len(changes) > request.limit
+    changes = changes[: request.limit]
+    return {
+        "changes": changes,
+        "cursor": changes[-1]["change_seq"] if changes else request.cursor,
+        "has_more": has_more,
+    }
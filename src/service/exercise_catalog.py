@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.db.models import Exercise, ExerciseAlias
+from src.db.session import is_sqlite
+from src.domain.normalize import alias_key
+
+EXERCISE_CATALOG_REFRESH_SECONDS = float(os.getenv("EXERCISE_CATALOG_REFRESH_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogExercise(NamedTuple):
+    exercise_id: uuid.UUID
+    canonical_name: str
+    display_name: str
+    muscle_group: str | None
+
+
+_CATALOG_ENTRY = func.concat_ws(
+    ":",
+    Exercise.id,
+    Exercise.canonical_name,
+    Exercise.display_name,
+    Exercise.muscle_group,
+    ExerciseAlias.alias,
+)
+# Changes whenever a catalog exercise or alias is added, removed or renamed.
+_CATALOG_FINGERPRINT = (
+    select(
+        func.md5(
+            func.coalesce(
+                func.string_agg(_CATALOG_ENTRY, aggregate_order_by(literal(","), _CATALOG_ENTRY)),
+                "",
+            )
+        )
+    )
+    .select_from(Exercise)
+    .outerjoin(ExerciseAlias, ExerciseAlias.exercise_id == Exercise.id)
+    .where(Exercise.owner_user_id.is_(None))
+)
+_CATALOG_ROWS = (
+    select(
+        Exercise.id,
+        Exercise.canonical_name,
+        Exercise.display_name,
+        Exercise.muscle_group,
+        ExerciseAlias.alias,
+    )
+    .outerjoin(ExerciseAlias, ExerciseAlias.exercise_id == Exercise.id)
+    .where(Exercise.owner_user_id.is_(None))
+)
+
+
+def _catalog_fingerprint(session: Session) -> str:
+    if not is_sqlite(session):
+        return session.execute(_CATALOG_FINGERPRINT).scalar_one()
+    # SQLite has no md5 or ordered string_agg; hash the same entries client-side.
+    entries = sorted(
+        ":".join(str(value) for value in row if value is not None)
+        for row in session.execute(_CATALOG_ROWS)
+    )
+    return hashlib.md5(",".join(entries).encode()).hexdigest()
+
+
+class AliasResolver:
+    """In-memory map from normalized exercise names and aliases to catalog exercises.
+
+    Lookups never touch the database. ``load`` builds a complete new map and swaps
+    it in with a single assignment, so readers see either the old or the new catalog.
+    """
+
+    def __init__(self):
+        self._aliases: Mapping[str, CatalogExercise] = MappingProxyType({})
+        self.fingerprint: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def resolve(self, name: str) -> CatalogExercise | None:
+        return self._aliases.get(alias_key(name))
+
+    def load(self, session: Session) -> bool:
+        """Reload from the catalog tables if they changed; returns True on reload."""
+        with session.begin():
+            fingerprint = _catalog_fingerprint(session)
+            if fingerprint == self.fingerprint:
+                return False
+            rows = session.execute(_CATALOG_ROWS).all()
+
+        entries = {
+            row.id: CatalogExercise(row.id, row.canonical_name, row.display_name, row.muscle_group)
+            for row in rows
+        }
+        aliases = {alias_key(entry.canonical_name): entry for entry in entries.values()}
+        for row in rows:
+            # Canonical names win over aliases if the two ever collide.
+            if row.alias is not None:
+                aliases.setdefault(alias_key(row.alias), entries[row.id])
+        self._aliases = MappingProxyType(aliases)
+        self.fingerprint = fingerprint
+        return True
+
+    def clear(self) -> None:
+        self._aliases = MappingProxyType({})
+        self.fingerprint = None
+
+
+catalog = AliasResolver()
+
+
+class CatalogReloader:
+    """Background thread that loads the catalog and reloads it when it changes."""
+
+    def __init__(
+        self,
+        session_factory,
+        resolver: AliasResolver = catalog,
+        interval_seconds: float = EXERCISE_CATALOG_REFRESH_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.resolver = resolver
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="exercise-catalog", daemon=True)
+
+    def start(self) -> None:
+        self.reload()
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def reload(self) -> None:
+        try:
+            with self.session_factory() as session:
+                if self.resolver.load(session):
+                    logger.info("loaded %d exercise catalog names", len(self.resolver))
+        except SQLAlchemyError:
+            logger.exception("exercise catalog reload failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.reload()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import uuid
+from typing import Dict, List
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from src.db.models import Exercise
+from src.db.session import is_sqlite
+from src.domain.normalize import normalize_canonical_name, trigram_similarity
+from src.domain.payloads import ExerciseSearchRequest
+
+EXERCISE_MATCH_MODES = ("exact", "fuzzy")
+EXERCISE_MATCH_MODE = os.getenv("EXERCISE_MATCH_MODE", "exact")
+EXERCISE_MATCH_THRESHOLD = float(os.getenv("EXERCISE_MATCH_THRESHOLD", "0.6"))
+
+
+def _scope_filter(user_id: uuid.UUID, include_global: bool):
+    if include_global:
+        # A global exercise is hidden by the user's own exercise of the same name,
+        # which is the one ingest and get_last_performance resolve that name to.
+        owned = aliased(Exercise)
+        shadowed = (
+            select(owned.id)
+            .where(owned.owner_user_id == user_id, owned.canonical_name == Exercise.canonical_name)
+            .exists()
+        )
+        return or_(Exercise.owner_user_id == user_id, and_(Exercise.owner_user_id.is_(None), ~shadowed))
+    return Exercise.owner_user_id == user_id
+
+
+def find_similar_exercises(
+    session: Session,
+    user_id: uuid.UUID,
+    name: str,
+    limit: int = 10,
+    min_similarity: float = 0.3,
+    include_global: bool = True,
+) -> List[Dict]:
+    """Rank the user's (and optionally global) exercises by trigram similarity to ``name``.
+
+    On Postgres the ``%`` operator is answered from the pg_trgm GIN index on
+    ``exercise.canonical_name``. SQLite has no pg_trgm, so there candidates are
+    scored in Python with the same similarity function.
+    """
+    name = normalize_canonical_name(name)
+    columns = (
+        Exercise.id,
+        Exercise.owner_user_id,
+        Exercise.canonical_name,
+        Exercise.display_name,
+        Exercise.muscle_group,
+    )
+    if is_sqlite(session):
+        rows = session.execute(select(*columns).where(_scope_filter(user_id, include_global))).all()
+        scored = [(row, trigram_similarity(row.canonical_name, name)) for row in rows]
+        scored = [(row, score) for row, score in scored if score >= min_similarity]
+        scored.sort(key=lambda item: (-item[1], item[0].canonical_name != name, item[0].canonical_name))
+        scored = scored[:limit]
+    else:
+        similarity = func.similarity(Exercise.canonical_name, name)
+        # ``%`` compares against this setting; is_local scopes it to the transaction.
+        session.execute(
+            select(func.set_config("pg_trgm.similarity_threshold", str(min_similarity), True))
+        )
+        rows = session.execute(
+            select(*columns, similarity.label("similarity"))
+            .where(_scope_filter(user_id, include_global), Exercise.canonical_name.op("%")(name))
+            .order_by(similarity.desc(), Exercise.canonical_name != name, Exercise.canonical_name)
+            .limit(limit)
+        ).all()
+        scored = [(row, float(row.similarity)) for row in rows]
+
+    return [
+        {
+            "exercise_id": str(row.id),
+            "canonical_name": row.canonical_name,
+            "display_name": row.display_name,
+            "muscle_group": row.muscle_group,
+            "scope": "global" if row.owner_user_id is None else "user",
+            "similarity": round(score, 3),
+        }
+        for row, score in scored
+    ]
+
+
+def best_exercise_match(
+    session: Session, user_id: uuid.UUID, name: str, threshold: float | None = None
+) -> uuid.UUID | None:
+    """Return the user's closest existing exercise at or above ``threshold``, if any."""
+    matches = find_similar_exercises(
+        session,
+        user_id,
+        name,
+        limit=1,
+        min_similarity=EXERCISE_MATCH_THRESHOLD if threshold is None else threshold,
+        include_global=False,
+    )
+    return uuid.UUID(matches[0]["exercise_id"]) if matches else None
+
+
+def search_exercises(session: Session, payload: Dict | ExerciseSearchRequest) -> Dict:
+    if isinstance(payload, ExerciseSearchRequest):
+        request = payload
+    else:
+        request = ExerciseSearchRequest.model_validate(payload)
+
+    with session.begin():
+        exercises = find_similar_exercises(
+            session,
+            request.user_id,
+            request.query,
+            limit=request.limit,
+            min_similarity=request.min_similarity,
+        )
+    return {"query": request.query, "exercises": exercises}
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.db.models import Exercise, Workout, WorkoutArchive, WorkoutExercise, WorkoutSet
+from src.domain.payloads import SET_PROJECTIONS, WorkoutExportRequest
+from src.service.archive_workouts import shape_archived_exercise, shape_packed_sets
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def workout_rows_statement():
+    """One row per set (or per empty exercise/workout) with the workout columns repeated.
+
+    Callers add the filter and an ordering that keeps each workout's rows together,
+    then feed the result to ``assemble_workouts`` along with the workouts' archive
+    documents from ``load_archived_exercises``. The documents are not joined in here,
+    as that would repeat a whole workout's archive on every one of its set rows.
+    """
+    return (
+        select(
+            Workout.id.label("workout_id"),
+            Workout.user_id,
+            Workout.workout_date,
+            Workout.change_seq,
+            Workout.started_at,
+            Workout.ended_at,
+            Workout.timezone,
+            Workout.title,
+            Workout.source,
+            Workout.notes.label("workout_notes"),
+            WorkoutExercise.id.label("workout_exercise_id"),
+            WorkoutExercise.exercise_id,
+            WorkoutExercise.notes.label("exercise_notes"),
+            WorkoutExercise.packed_sets,
+            Exercise.display_name,
+            Exercise.canonical_name,
+            WorkoutSet.id.label("workout_set_id"),
+            WorkoutSet.set_index,
+            WorkoutSet.reps,
+            WorkoutSet.weight_kg,
+            WorkoutSet.weight_original_value,
+            WorkoutSet.weight_original_unit,
+            WorkoutSet.rpe,
+            WorkoutSet.rir,
+            WorkoutSet.is_warmup,
+            WorkoutSet.tempo,
+            WorkoutSet.rest_seconds,
+            WorkoutSet.notes.label("set_notes"),
+            WorkoutSet.logged_at,
+        )
+        .select_from(Workout)
+        .outerjoin(WorkoutExercise, WorkoutExercise.workout_id == Workout.id)
+        .outerjoin(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+        .outerjoin(WorkoutSet, WorkoutSet.workout_exercise_id == WorkoutExercise.id)
+    )
+
+
+def _export_statement(request: WorkoutExportRequest):
+    stmt = (
+        workout_rows_statement()
+        .where(Workout.user_id == request.user_id)
+        .order_by(Workout.workout_date, WorkoutExercise.id, WorkoutSet.set_index)
+    )
+    if request.from_date:
+        stmt = stmt.where(Workout.workout_date >= request.from_date)
+    if request.to_date:
+        stmt = stmt.where(Workout.workout_date <= request.to_date)
+    return stmt
+
+
+def load_archived_exercises(session: Session, workout_ids: Collection) -> Dict:
+    """Archived exercise documents keyed by workout id, for those workouts that have one."""
+    if not workout_ids:
+        return {}
+    rows = session.execute(
+        select(WorkoutArchive.workout_id, WorkoutArchive.exercises).where(
+            WorkoutArchive.workout_id.in_(workout_ids)
+        )
+    )
+    return {row.workout_id: row.exercises for row in rows}
+
+
+def _new_workout(row, archived_exercises: List | None) -> Dict:
+    return {
+        "workout_id": str(row.workout_id),
+        "user_id": str(row.user_id),
+        "workout_date": row.workout_date.isoformat(),
+        "change_seq": row.change_seq,
+        "started_at": _isoformat(row.started_at),
+        "ended_at": _isoformat(row.ended_at),
+        "timezone": row.timezone,
+        "title": row.title,
+        "source": row.source,
+        "notes": row.workout_notes,
+        "exercises": [
+            shape_archived_exercise(exercise, SET_PROJECTIONS["full"])
+            for exercise in archived_exercises or []
+        ],
+    }
+
+
+def iter_workouts(
+    session: Session, request: WorkoutExportRequest, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[Dict]:
+    """Yield one nested workout dict at a time from a server-side cursor.
+
+    Rows arrive ordered by workout, so only the workout being assembled is held in
+    memory regardless of how much history the user has. Archive documents are fetched
+    by key once per batch of rows, for the workouts that batch starts.
+    """
+    archives: Dict = {}
+
+    def batches():
+        result = session.execute(
+            _export_statement(request).execution_options(yield_per=batch_size)
+        )
+        for batch in result.partitions():
+            archives.clear()
+            archives.update(load_archived_exercises(session, {row.workout_id for row in batch}))
+            yield from batch
+
+    with session.begin():
+        yield from assemble_workouts(batches(), archives)
+
+
+def assemble_workouts(rows: Iterable, archives: Mapping) -> Iterator[Dict]:
+    """Group rows from ``workout_rows_statement`` into nested workout dicts.
+
+    ``archives`` maps workout ids to archive documents and is looked up as each
+    workout's first row arrives.
+    """
+    workout = None
+    exercise = None
+    for row in rows:
+        if workout is None or workout["workout_id"] != str(row.workout_id):
+            if workout is not None:
+                yield workout
+            workout = _new_workout(row, archives.get(row.workout_id))
+            exercise = None
+        if row.workout_exercise_id is None:
+            continue
+        if exercise is None or exercise["workout_exercise_id"] != str(row.workout_exercise_id):
+            exercise = {
+                "workout_exercise_id": str(row.workout_exercise_id),
+                "exercise_id": str(row.exercise_id),
+                "display_name": row.display_name,
+                "canonical_name": row.canonical_name,
+                "notes": row.exercise_notes,
+                "sets": [],
+            }
+            if row.packed_sets is not None:
+                exercise.update(shape_packed_sets(row.packed_sets, SET_PROJECTIONS["full"]))
+            workout["exercises"].append(exercise)
+        if row.workout_set_id is None:
+            continue
+        exercise["sets"].append(
+            {
+                "workout_set_id": str(row.workout_set_id),
+                "set_index": row.set_index,
+                "reps": row.reps,
+                "weight_kg": row.weight_kg,
+                "weight_original_value": row.weight_original_value,
+                "weight_original_unit": row.weight_original_unit,
+                "rpe": row.rpe,
+                "rir": row.rir,
+                "is_warmup": row.is_warmup,
+                "tempo": row.tempo,
+                "rest_seconds": row.rest_seconds,
+                "notes": row.set_notes,
+                "logged_at": _isoformat(row.logged_at),
+            }
+        )
+    if workout is not None:
+        yield workout
+
+
+def iter_ndjson_chunks(
+    workouts: Iterable[Dict], chunk_bytes: int = EXPORT_CHUNK_BYTES
+) -> Iterator[bytes]:
+    """Encode workouts as NDJSON, coalescing lines into chunks of about ``chunk_bytes``."""
+    buffer = bytearray()
+    for workout in workouts:
+        buffer += json.dumps(workout, separators=(",", ":")).encode()
+        buffer += b"\n"
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header lets the response be gzipped.
+
+    Codings are matched as whole tokens and ``q=0`` rules one out; an explicit
+    ``gzip`` (or its ``x-gzip`` alias) entry takes precedence over ``*``.
+    """
+    weights: Dict[str, float] = {}
+    for entry in accept_encoding.split(","):
+        coding, _, params = entry.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value.strip())
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    for coding in ("gzip", "x-gzip"):
+        if coding in weights:
+            return weights[coding] > 0
+    return weights.get("*", 0.0) > 0
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.db.models import IdempotencyResponse
+from src.db.session import begin_write
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Thread-safe LRU of replayable responses keyed by (user_id, idempotency_key)."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[uuid.UUID, str], tuple[float, Dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: uuid.UUID, key: str) -> Dict | None:
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at < time.monotonic():
+                del self._entries[(user_id, key)]
+                return None
+            self._entries.move_to_end((user_id, key))
+            return response
+
+    def put(self, user_id: uuid.UUID, key: str, response: Dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(user_id, key)] = (time.monotonic() + self.ttl_seconds, response)
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+
+
+def _as_replay(response: Dict) -> Dict:
+    return {**response, "idempotent_replay": True}
+
+
+def cached_response(user_id: uuid.UUID, key: str) -> Dict | None:
+    """Return a replay from the in-process cache without touching the database."""
+    response = response_cache.get(user_id, key)
+    return _as_replay(response) if response is not None else None
+
+
+def remember_response(user_id: uuid.UUID, key: str, response: Dict) -> None:
+    """Cache a committed response; callers must only pass durable results."""
+    if not response.get("idempotent_replay"):
+        response_cache.put(user_id, key, response)
+
+
+def stored_response(session: Session, user_id: uuid.UUID, key: str) -> Dict | None:
+    """Return a replay of the stored original response with one primary-key lookup."""
+    cached = cached_response(user_id, key)
+    if cached is not None:
+        return cached
+    response = session.execute(
+        select(IdempotencyResponse.response).where(
+            IdempotencyResponse.user_id == user_id,
+            IdempotencyResponse.idempotency_key == key,
+            IdempotencyResponse.expires_at > datetime.now(timezone.utc),
+        )
+    ).scalar_one_or_none()
+    if response is None:
+        return None
+    response_cache.put(user_id, key, response)
+    return _as_replay(response)
+
+
+def save_response(session: Session, user_id: uuid.UUID, key: str, response: Dict) -> None:
+    """Persist the original response in the caller's transaction."""
+    now = datetime.now(timezone.utc)
+    session.execute(
+        pg_insert(IdempotencyResponse)
+        .values(
+            user_id=user_id,
+            idempotency_key=key,
+            response=response,
+            created_at=now,
+            expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[IdempotencyResponse.user_id, IdempotencyResponse.idempotency_key]
+        )
+    )
+
+
+def purge_expired_responses(session: Session, batch_size: int = 1000) -> int:
+    """Delete expired stored responses in short batches; returns the number removed."""
+    removed = 0
+    while True:
+        with begin_write(session):
+            expired = (
+                select(IdempotencyResponse.user_id, IdempotencyResponse.idempotency_key)
+                .where(IdempotencyResponse.expires_at <= datetime.now(timezone.utc))
+                .limit(batch_size)
+            )
+            result = session.execute(
+                delete(IdempotencyResponse).where(
+                    tuple_(IdempotencyResponse.user_id, IdempotencyResponse.idempotency_key).in_(
+                        expired
+                    )
+                )
+            )
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            return removed
+
+
+class IdempotencyJanitor:
+    """Background thread that periodically purges expired stored responses."""
+
+    def __init__(self, session_factory, interval_seconds: float = 3600.0):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="idempotency-janitor", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                with self.session_factory() as session:
+                    purge_expired_responses(session)
+            except SQLAlchemyError:
+                logger.exception("idempotency purge failed")
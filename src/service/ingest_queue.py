@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Dict
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+
+from src.db.models import AppUser, IngestQueueItem
+from src.db.session import begin_write, is_sqlite
+from src.db.sharding import USER_WRITE_LOCK, ShardMoved
+from src.domain.payloads import IngestStatusRequest, WorkoutIngestPayload, validate_payload
+from src.service.ingest_workout import _workout_date_from_started, note_committed_writes, write_workout
+
+logger = logging.getLogger(__name__)
+
+# One event per running worker: a shared event cleared by whichever worker wakes
+# first would swallow the wakeup for the rest.
+_wakeups: set[threading.Event] = set()
+_wakeups_lock = threading.Lock()
+
+
+def _wake_workers() -> None:
+    with _wakeups_lock:
+        for wakeup in _wakeups:
+            wakeup.set()
+
+
+def enqueue_workout(session: Session, payload: Dict | WorkoutIngestPayload) -> Dict:
+    """Validate a payload and append it to the durable ingest queue."""
+    if isinstance(payload, WorkoutIngestPayload):
+        data = payload
+    else:
+        data = validate_payload(payload)
+
+    with begin_write(session):
+        if not is_sqlite(session):
+            session.execute(USER_WRITE_LOCK, {"user_id": str(data.user_id)})
+        moved_to = session.execute(
+            select(AppUser.moved_to_shard).where(AppUser.id == data.user_id)
+        ).scalar_one_or_none()
+        if moved_to:
+            raise ShardMoved(data.user_id, moved_to)
+        item = IngestQueueItem(
+            user_id=data.user_id,
+            workout_date=_workout_date_from_started(data.workout.started_at),
+            payload=data.model_dump(mode="json"),
+        )
+        session.add(item)
+        session.flush()
+        ticket = item.ticket
+
+    _wake_workers()
+    return {"ticket": str(ticket), "status": "pending"}
+
+
+def get_ingest_status(session: Session, payload: Dict | IngestStatusRequest) -> Dict:
+    if isinstance(payload, IngestStatusRequest):
+        request = payload
+    else:
+        request = IngestStatusRequest.model_validate(payload)
+
+    with session.begin():
+        item = session.execute(
+            select(IngestQueueItem).where(
+                IngestQueueItem.ticket == request.ticket,
+                IngestQueueItem.user_id == request.user_id,
+            )
+        ).scalar_one_or_none()
+
+        if item is None:
+            return {"ticket": str(request.ticket), "status": "not_found"}
+
+        return {
+            "ticket": str(item.ticket),
+            "status": item.status,
+            "attempts": item.attempts,
+            "result": item.result,
+            "error": item.error,
+            "enqueued_at": item.enqueued_at.isoformat(),
+            "processed_at": item.processed_at.isoformat() if item.processed_at else None,
+        }
+
+
+def _claim_statement(batch_size: int):
+    # An item is claimable only when no earlier item for the same user/day is still
+    # pending. Items being processed stay 'pending' until their batch commits, so a
+    # later item cannot overtake an in-flight one on another worker.
+    earlier = aliased(IngestQueueItem)
+    return (
+        select(IngestQueueItem)
+        .where(
+            IngestQueueItem.status == "pending",
+            ~exists().where(
+                earlier.user_id == IngestQueueItem.user_id,
+                earlier.workout_date == IngestQueueItem.workout_date,
+                earlier.status == "pending",
+                earlier.id < IngestQueueItem.id,
+            ),
+        )
+        .order_by(IngestQueueItem.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True, of=IngestQueueItem)
+    )
+
+
+def requeue_item(engine: Engine, item: IngestQueueItem) -> None:
+    """Copy a queued item, ticket included, as pending into the queue on ``engine``.
+
+    A copy that is already there is left alone, so a batch that is retried after
+    the copy committed does not queue the payload twice.
+    """
+    values = {
+        column.key: getattr(item, column.key)
+        for column in IngestQueueItem.__table__.c
+        if column.key not in ("id", "status", "attempts", "result", "error", "processed_at")
+    }
+    with Session(engine) as session, session.begin():
+        session.execute(
+            pg_insert(IngestQueueItem).values(**values).on_conflict_do_nothing(index_elements=["ticket"])
+        )
+
+
+def process_ingest_batch(
+    session: Session,
+    batch_size: int = 20,
+    max_attempts: int = 5,
+    reroute: Callable[[IngestQueueItem, str], None] | None = None,
+) -> int:
+    """Claim up to ``batch_size`` queued payloads and ingest them in one transaction.
+
+    Each item runs in its own savepoint so a bad payload is recorded as failed without
+    aborting the rest of the batch. An item whose user has moved to another shard is
+    handed to ``reroute`` with the shard name (``requeue_item`` on that shard's engine)
+    and closed here; without ``reroute`` it fails. Returns the number of items claimed.
+    """
+    with begin_write(session):
+        items = session.execute(_claim_statement(batch_size)).scalars().all()
+        for item in items:
+            item.attempts += 1
+            try:
+                with session.begin_nested():
+                    result = write_workout(session, validate_payload(item.payload))
+            except ShardMoved as exc:
+                if reroute is None:
+                    item.status = "failed"
+                    item.error = f"{exc}; resubmit it there"
+                else:
+                    try:
+                        reroute(item, exc.shard)
+                    except SQLAlchemyError as reroute_exc:
+                        item.error = f"{exc}; re-queueing there failed: {reroute_exc}"
+                        if item.attempts >= max_attempts:
+                            item.status = "failed"
+                    else:
+                        # The copy on the new shard carries the ticket from here on.
+                        item.status = "failed"
+                        item.error = f"{exc}; re-queued there under the same ticket"
+            except ValueError as exc:
+                item.status = "failed"
+                item.error = str(exc) or repr(exc)
+            except DBAPIError as exc:
+                item.error = str(exc.orig or exc)
+                if exc.connection_invalidated:
+                    raise
+                if item.attempts >= max_attempts:
+                    item.status = "failed"
+            else:
+                item.status = "done"
+                item.result = result
+                item.error = None
+            if item.status != "pending":
+                item.processed_at = func.now()
+    note_committed_writes(session)
+    return len(items)
+
+
+class IngestWorkerPool:
+    """Background threads that drain the ingest queue."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = 2,
+        batch_size: int = 20,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+        reroute: Callable[[IngestQueueItem, str], None] | None = None,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.reroute = reroute
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._wakeups: list[threading.Event] = []
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            wakeup = threading.Event()
+            with _wakeups_lock:
+                _wakeups.add(wakeup)
+            thread = threading.Thread(
+                target=self._run, args=(wakeup,), name=f"ingest-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+            self._wakeups.append(wakeup)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        for wakeup in self._wakeups:
+            wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with _wakeups_lock:
+            _wakeups.difference_update(self._wakeups)
+        self._threads.clear()
+        self._wakeups.clear()
+
+    def _run(self, wakeup: threading.Event) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.session_factory() as session:
+                    claimed = process_ingest_batch(
+                        session,
+                        batch_size=self.batch_size,
+                        max_attempts=self.max_attempts,
+                        reroute=self.reroute,
+                    )
+            except Exception:
+                # The batch rolled back and its items stay pending; keep the worker
+                # alive so they are claimed again.
+                logger.exception("ingest worker batch failed")
+                claimed = 0
+            if claimed == 0:
+                # Cleared before the next claim, so an enqueue that lands after
+                # the clear is either claimed or sets the event again.
+                wakeup.wait(self.poll_interval)
+                wakeup.clear()
@@ -1,25 +1,126 @@
 from __future__ import annotations
 
+import hashlib
+import os
 import uuid
-from datetime import date, timezone
+from datetime import date, datetime, timezone
+from functools import lru_cache
 from typing import Dict
 
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import bindparam, case, func, null, select, text, update
+from sqlalchemy.dialects.postgresql import UUID, JSONB, aggregate_order_by, array_agg, insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, aliased
 
-from src.db.models import AppUser, Exercise, Workout, WorkoutExercise, WorkoutSet
+from src.db.models import AppUser, Exercise, Workout, WorkoutArchive, WorkoutExercise, WorkoutSet
+from src.db.routing import read_router
+from src.db.session import begin_write, is_sqlite
+from src.db.sharding import ShardMoved, moved_shard
 from src.domain.payloads import (
     ExerciseInput,
     WorkoutByDateRequest,
     WorkoutIngestPayload,
+    WorkoutSetInput,
     validate_payload,
 )
+from src.service import exercise_search
+from src.service.archive_workouts import (
+    PACKED_SET_FIELDS,
+    PACKED_SET_STORED_FIELDS,
+    SET_COLUMNS,
+    json_value,
+    shape_archived_exercise,
+    shape_packed_sets,
+    summarize_sets,
+)
+from src.service.exercise_catalog import CatalogExercise, catalog
+from src.service.idempotency import (
+    cached_response,
+    remember_response,
+    save_response,
+    stored_response,
+)
+
+INGEST_BACKENDS = ("orm", "plpgsql")
+INGEST_BACKEND = os.getenv("INGEST_BACKEND", "orm")
+INGEST_LOCK_MODES = ("row", "advisory")
+INGEST_LOCK_MODE = os.getenv("INGEST_LOCK_MODE", "row")
+# Where newly written sets go: one workout_set row each, or packed into a single
+# document on their workout_exercise row. Reads handle both layouts side by side,
+# so switching only changes how new writes are stored.
+SET_STORAGES = ("rows", "packed")
+SET_STORAGE = os.getenv("SET_STORAGE", "rows")
+
+# Hot statements are built once with named bind parameters so every call shares one
+# SQLAlchemy compiled-cache entry and one SQL string, which psycopg can then keep as a
+# server-side prepared statement (see DB_PREPARED_STATEMENTS in src.db.session).
+_EXERCISE_ID_BY_NAME = select(Exercise.id).where(
+    Exercise.owner_user_id == bindparam("user_id"),
+    Exercise.canonical_name == bindparam("canonical_name"),
+)
+_WORKOUT_ID_BY_KEY = select(Workout.id).where(
+    Workout.user_id == bindparam("user_id"),
+    Workout.idempotency_key == bindparam("idempotency_key"),
+)
+_WORKOUT_BY_DAY = select(Workout).where(
+    Workout.user_id == bindparam("user_id"),
+    Workout.workout_date == bindparam("workout_date"),
+)
+_LOCK_WORKOUT = select(Workout.id).where(Workout.id == bindparam("workout_id")).with_for_update()
+_INSERT_WORKOUT = (
+    pg_insert(Workout)
+    .on_conflict_do_nothing(index_elements=[Workout.user_id, Workout.workout_date])
+    .returning(Workout.id)
+)
+_ADVISORY_XACT_LOCK = select(func.pg_advisory_xact_lock(bindparam("lock_key")))
+# Runs last in the write transaction: it serializes on a per-user lock held until
+# commit, so the shorter it is held the less concurrent writers for a user wait.
+_RECORD_WRITE = select(
+    func.record_workout_write(
+        bindparam("workout_id", type_=UUID), bindparam("exercises"), bindparam("sets")
+    )
+)
+_INGESTED = select(
+    func.ingest_workout_jsonb(bindparam("document", type_=JSONB), type_=JSONB).label("result")
+).cte("ingested")
+# The stored function and the write bookkeeping in one round trip; replays change nothing.
+_INGEST_JSONB = select(
+    _INGESTED.c.result,
+    case(
+        (_INGESTED.c.result["idempotent_replay"].as_boolean(), null()),
+        else_=func.record_workout_write(
+            _INGESTED.c.result["workout_id"].astext.cast(UUID),
+            _INGESTED.c.result["written_workout_exercises"].as_integer(),
+            _INGESTED.c.result["written_sets"].as_integer(),
+        ),
+    ).label("change_seq"),
+)
+# SQLite has neither stored functions nor sequences. The write transaction already
+# holds the database write lock (see begin_write), so the one-row workout_change_seq
+# table is bumped and read back in order without a per-user lock.
+_NEXT_CHANGE_SEQ = text(
+    "UPDATE workout_change_seq SET last_value = last_value + 1 RETURNING last_value"
+)
+_RECORD_WRITE_SQLITE = (
+    update(Workout.__table__)
+    .where(Workout.__table__.c.id == bindparam("workout_id"))
+    .values(
+        change_seq=bindparam("change_seq"),
+        exercise_count=Workout.__table__.c.exercise_count + bindparam("exercises"),
+        set_count=Workout.__table__.c.set_count + bindparam("sets"),
+        # New hot rows on an archived day: the next archiver run folds them in.
+        archived_at=None,
+    )
+)
+# session.info key: user_id -> change_seq of the writes in the open transaction.
+_WRITTEN_CHANGE_SEQS = "written_change_seqs"
 
 
 def _ensure_user(session: Session, user_id: uuid.UUID) -> AppUser:
     user = session.get(AppUser, user_id)
     if user:
+        if user.moved_to_shard:
+            raise ShardMoved(user_id, user.moved_to_shard)
         return user
     user = AppUser(id=user_id)
     session.add(user)
@@ -27,6 +128,24 @@ def _ensure_user(session: Session, user_id: uuid.UUID) -> AppUser:
     return user
 
 
+def _owned_exercise_id(
+    session: Session, user_id: uuid.UUID, canonical_name: str, catalog_match: CatalogExercise | None
+) -> uuid.UUID | None:
+    # The user's own exercise shadows a catalog exercise of the same name, so history
+    # logged before the catalog existed is not split across two ids. An alias counts
+    # as the catalog name it resolves to.
+    names = [canonical_name]
+    if catalog_match and catalog_match.canonical_name != canonical_name:
+        names.append(catalog_match.canonical_name)
+    for name in names:
+        existing_id = session.execute(
+            _EXERCISE_ID_BY_NAME, {"user_id": user_id, "canonical_name": name}
+        ).scalar_one_or_none()
+        if existing_id:
+            return existing_id
+    return None
+
+
 def _resolve_exercise_id(session: Session, user_id: uuid.UUID, exercise: ExerciseInput) -> uuid.UUID:
     canonical_name = exercise.normalized_canonical_name()
     if exercise.exercise_id:
@@ -43,12 +162,17 @@ def _resolve_exercise_id(session: Session, user_id: uuid.UUID, exercise: Exercis
         session.flush()
         return new_exercise.id
 
-    stmt = select(Exercise.id).where(
-        Exercise.owner_user_id == user_id, Exercise.canonical_name == canonical_name
-    )
-    existing_id = session.execute(stmt).scalar_one_or_none()
+    catalog_match = catalog.resolve(canonical_name)
+    existing_id = _owned_exercise_id(session, user_id, canonical_name, catalog_match)
     if existing_id:
         return existing_id
+    if catalog_match:
+        return catalog_match.exercise_id
+
+    if exercise_search.EXERCISE_MATCH_MODE == "fuzzy":
+        match_id = exercise_search.best_exercise_match(session, user_id, canonical_name)
+        if match_id:
+            return match_id
 
     new_exercise = Exercise(
         owner_user_id=user_id,
@@ -64,122 +188,296 @@ def _workout_date_from_started(started_at) -> date:
     return started_at.astimezone(timezone.utc).date()
 
 
-def ingest_workout(session: Session, payload: Dict | WorkoutIngestPayload) -> Dict:
-    if isinstance(payload, WorkoutIngestPayload):
-        data = payload
-    else:
-        data = validate_payload(payload)
-
-    written_workout_exercises = 0
-    written_sets = 0
+def _plpgsql_document(
+    data: WorkoutIngestPayload, matched_ids: Dict[int, uuid.UUID] | None = None
+) -> Dict:
+    # Normalization stays in Python so both backends store identical values; the
+    # stored function only receives already-canonical names and kilogram weights.
+    matched_ids = matched_ids or {}
+    exercises = []
+    for position, exercise in enumerate(data.exercises):
+        exercise_id = exercise.exercise_id or matched_ids.get(position)
+        exercises.append(
+            {
+                "exercise_id": str(exercise_id) if exercise_id else None,
+                "canonical_name": exercise.normalized_canonical_name(),
+                "display_name": exercise.display_name,
+                "notes": exercise.notes,
+                # The stored function packs these as they are, adding the stored fields.
+                "sets": [_set_values(set_data) for set_data in exercise.sets],
+            }
+        )
 
-    with session.begin():
-        _ensure_user(session, data.user_id)
-
-        workout_date = _workout_date_from_started(data.workout.started_at)
-
-        if data.idempotency_key:
-            idempotent_match = session.execute(
-                select(Workout.id).where(
-                    Workout.user_id == data.user_id, Workout.idempotency_key == data.idempotency_key
-                )
-            ).scalar_one_or_none()
-            if idempotent_match:
-                return {
-                    "workout_id": str(idempotent_match),
-                    "written_workout_exercises": 0,
-                    "written_sets": 0,
-                    "idempotent_replay": True,
-                    "appended_to_existing": False,
-                }
-
-        workout_data = {
-            "id": uuid.uuid4(),
-            "user_id": data.user_id,
-            "workout_date": workout_date,
-            "started_at": data.workout.started_at,
-            "ended_at": data.workout.ended_at,
+    return {
+        "user_id": str(data.user_id),
+        "idempotency_key": data.idempotency_key,
+        "workout_date": _workout_date_from_started(data.workout.started_at).isoformat(),
+        "pack_sets": SET_STORAGE == "packed",
+        "workout": {
+            "started_at": data.workout.started_at.isoformat(),
+            "ended_at": data.workout.ended_at.isoformat() if data.workout.ended_at else None,
             "timezone": data.workout.timezone,
             "title": data.workout.title,
             "source": data.workout.source,
             "notes": data.workout.notes,
-            "idempotency_key": data.idempotency_key,
-        }
+        },
+        "exercises": exercises,
+    }
+
 
-        existing_workout = session.execute(
-            select(Workout).where(
-                Workout.user_id == data.user_id,
-                Workout.workout_date == workout_date,
+def _matched_exercise_ids(session: Session, data: WorkoutIngestPayload) -> Dict[int, uuid.UUID]:
+    # The stored function only matches names exactly, so catalog aliases and fuzzy
+    # matches are resolved up front and passed in as exercise ids.
+    fuzzy = exercise_search.EXERCISE_MATCH_MODE == "fuzzy"
+    matches = {}
+    for position, exercise in enumerate(data.exercises):
+        if exercise.exercise_id:
+            continue
+        canonical_name = exercise.normalized_canonical_name()
+        catalog_match = catalog.resolve(canonical_name)
+        if catalog_match:
+            matches[position] = (
+                _owned_exercise_id(session, data.user_id, canonical_name, catalog_match)
+                or catalog_match.exercise_id
             )
+        elif fuzzy:
+            match_id = exercise_search.best_exercise_match(session, data.user_id, canonical_name)
+            if match_id:
+                matches[position] = match_id
+    return matches
+
+
+def _execute_fenced(session: Session, user_id: uuid.UUID, statement, params: Dict):
+    # record_workout_write refuses writes for a user moved to another shard.
+    try:
+        return session.execute(statement, params)
+    except DBAPIError as exc:
+        shard = moved_shard(exc)
+        if shard is None:
+            raise
+        raise ShardMoved(user_id, shard) from exc
+
+
+def _record_write(session: Session, user_id: uuid.UUID, params: Dict) -> None:
+    if is_sqlite(session):
+        change_seq = session.execute(_NEXT_CHANGE_SEQ).scalar_one()
+        session.execute(_RECORD_WRITE_SQLITE, {**params, "change_seq": change_seq})
+    else:
+        change_seq = _execute_fenced(session, user_id, _RECORD_WRITE, params).scalar_one()
+    session.info.setdefault(_WRITTEN_CHANGE_SEQS, {})[user_id] = change_seq
+
+
+def note_committed_writes(session: Session) -> None:
+    """Tell the read router about the writes of the transaction ``session`` just committed."""
+    for user_id, change_seq in session.info.pop(_WRITTEN_CHANGE_SEQS, {}).items():
+        read_router.note_write(user_id, change_seq)
+
+
+def _write_workout_plpgsql(session: Session, data: WorkoutIngestPayload) -> Dict:
+    matched_ids = _matched_exercise_ids(session, data)
+    document = _plpgsql_document(data, matched_ids)
+    row = _execute_fenced(session, data.user_id, _INGEST_JSONB, {"document": document}).one()
+    if row.change_seq is not None:
+        session.info.setdefault(_WRITTEN_CHANGE_SEQS, {})[data.user_id] = row.change_seq
+    return row.result
+
+
+def write_workout(
+    session: Session, data: WorkoutIngestPayload, backend: str | None = None
+) -> Dict:
+    """Persist a validated payload inside the caller's transaction."""
+    backend = backend or INGEST_BACKEND
+    if backend not in INGEST_BACKENDS:
+        raise ValueError(f"Unknown ingest backend: {backend}")
+    if INGEST_LOCK_MODE not in INGEST_LOCK_MODES:
+        raise ValueError(f"Unknown ingest lock mode: {INGEST_LOCK_MODE}")
+    if SET_STORAGE not in SET_STORAGES:
+        raise ValueError(f"Unknown set storage: {SET_STORAGE}")
+    if exercise_search.EXERCISE_MATCH_MODE not in exercise_search.EXERCISE_MATCH_MODES:
+        raise ValueError(f"Unknown exercise match mode: {exercise_search.EXERCISE_MATCH_MODE}")
+
+    if data.idempotency_key:
+        if not is_sqlite(session):
+            # Concurrent sends of one key queue here until the first commits, so the
+            # rest find its stored response below instead of appending again.
+            _lock_idempotency_key(session, data.user_id, data.idempotency_key)
+        replay = stored_response(session, data.user_id, data.idempotency_key)
+        if replay is not None:
+            return replay
+
+    if backend == "plpgsql":
+        if is_sqlite(session):
+            raise ValueError("The plpgsql ingest backend requires PostgreSQL")
+        result = _write_workout_plpgsql(session, data)
+    else:
+        result = _write_workout_orm(session, data)
+
+    if data.idempotency_key and not result["idempotent_replay"]:
+        save_response(session, data.user_id, data.idempotency_key, result)
+    return result
+
+
+def _lock_key(name: str) -> int:
+    # Stable across processes and Python versions, unlike hash().
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _day_lock_key(user_id: uuid.UUID, workout_date: date) -> int:
+    return _lock_key(f"{user_id}:{workout_date.isoformat()}")
+
+
+def _lock_idempotency_key(session: Session, user_id: uuid.UUID, key: str) -> None:
+    session.execute(_ADVISORY_XACT_LOCK, {"lock_key": _lock_key(f"{user_id}:key:{key}")})
+
+
+def _lock_workout_day(session: Session, user_id: uuid.UUID, workout_date: date) -> None:
+    session.execute(_ADVISORY_XACT_LOCK, {"lock_key": _day_lock_key(user_id, workout_date)})
+
+
+def _set_values(set_data: WorkoutSetInput) -> Dict:
+    """The packed set fields that come from the payload, with weights in kilograms."""
+    weight_kg, weight_original_value, weight_original_unit = set_data.weight_values()
+    weights = {
+        "weight_kg": weight_kg,
+        "weight_original_value": weight_original_value,
+        "weight_original_unit": weight_original_unit,
+    }
+    return {
+        name: weights[name] if name in weights else getattr(set_data, name)
+        for name in PACKED_SET_FIELDS
+        if name not in PACKED_SET_STORED_FIELDS
+    }
+
+
+def _packed_set(set_index: int, set_data: WorkoutSetInput, logged_at: str) -> Dict:
+    # The same document archive_workouts packs a workout_set row into.
+    values = {
+        "workout_set_id": str(uuid.uuid4()),
+        "set_index": set_index,
+        "logged_at": logged_at,
+        **_set_values(set_data),
+    }
+    return {name: values[name] for name in PACKED_SET_FIELDS if values[name] is not None}
+
+
+def _write_workout_orm(session: Session, data: WorkoutIngestPayload) -> Dict:
+    written_workout_exercises = 0
+    written_sets = 0
+    row_locks = INGEST_LOCK_MODE == "row"
+    pack_sets = SET_STORAGE == "packed"
+    logged_at = datetime.now(timezone.utc).isoformat()
+
+    workout_date = _workout_date_from_started(data.workout.started_at)
+
+    if not row_locks and not is_sqlite(session):
+        # Serializes writers for this user/day for the rest of the transaction, so the
+        # lookups below cannot race and need no FOR UPDATE re-selects. SQLite already
+        # serializes every writer on the database lock.
+        _lock_workout_day(session, data.user_id, workout_date)
+
+    _ensure_user(session, data.user_id)
+
+    if data.idempotency_key:
+        idempotent_match = session.execute(
+            _WORKOUT_ID_BY_KEY,
+            {"user_id": data.user_id, "idempotency_key": data.idempotency_key},
         ).scalar_one_or_none()
+        if idempotent_match:
+            return {
+                "workout_id": str(idempotent_match),
+                "written_workout_exercises": 0,
+                "written_sets": 0,
+                "idempotent_replay": True,
+                "appended_to_existing": False,
+            }
+
+    workout_data = {
+        "id": uuid.uuid4(),
+        "user_id": data.user_id,
+        "workout_date": workout_date,
+        "started_at": data.workout.started_at,
+        "ended_at": data.workout.ended_at,
+        "timezone": data.workout.timezone,
+        "title": data.workout.title,
+        "source": data.workout.source,
+        "notes": data.workout.notes,
+        "idempotency_key": data.idempotency_key,
+    }
 
-        appended_to_existing = False
-        if existing_workout:
+    day_params = {"user_id": data.user_id, "workout_date": workout_date}
+    existing_workout = session.execute(_WORKOUT_BY_DAY, day_params).scalar_one_or_none()
+
+    appended_to_existing = False
+    if existing_workout:
+        workout_id = existing_workout.id
+        appended_to_existing = True
+        if data.idempotency_key and existing_workout.idempotency_key is None:
+            existing_workout.idempotency_key = data.idempotency_key
+        if row_locks:
+            session.execute(_LOCK_WORKOUT, {"workout_id": workout_id}).scalar_one()
+    else:
+        inserted_row = session.execute(_INSERT_WORKOUT.values(workout_data)).first()
+        if inserted_row:
+            workout_id = inserted_row.id
+            appended_to_existing = False
+            if row_locks:
+                session.execute(_LOCK_WORKOUT, {"workout_id": workout_id}).scalar_one()
+        else:
+            existing_workout = session.execute(_WORKOUT_BY_DAY, day_params).scalar_one()
             workout_id = existing_workout.id
             appended_to_existing = True
             if data.idempotency_key and existing_workout.idempotency_key is None:
                 existing_workout.idempotency_key = data.idempotency_key
-            session.execute(
-                select(Workout.id).where(Workout.id == workout_id).with_for_update()
-            ).scalar_one()
-        else:
-            insert_stmt = (
-                pg_insert(Workout)
-                .values(**workout_data)
-                .on_conflict_do_nothing(index_elements=[Workout.user_id, Workout.workout_date])
-                .returning(Workout.id)
-            )
-            inserted_row = session.execute(insert_stmt).first()
-            if inserted_row:
-                workout_id = inserted_row.id
-                appended_to_existing = False
-                session.execute(
-                    select(Workout.id).where(Workout.id == workout_id).with_for_update()
-                ).scalar_one()
-            else:
-                existing_workout = session.execute(
-                    select(Workout).where(
-                        Workout.user_id == data.user_id,
-                        Workout.workout_date == workout_date,
-                    )
-                ).scalar_one()
-                workout_id = existing_workout.id
-                appended_to_existing = True
-                if data.idempotency_key and existing_workout.idempotency_key is None:
-                    existing_workout.idempotency_key = data.idempotency_key
-                session.execute(
-                    select(Workout.id).where(Workout.id == workout_id).with_for_update()
-                ).scalar_one()
-
-        for exercise in data.exercises:
-            exercise_id = _resolve_exercise_id(session, data.user_id, exercise)
-            workout_exercise = WorkoutExercise(
-                workout_id=workout_id,
-                exercise_id=exercise_id,
-                notes=exercise.notes,
-            )
+            if row_locks:
+                session.execute(_LOCK_WORKOUT, {"workout_id": workout_id}).scalar_one()
+
+    for exercise in data.exercises:
+        exercise_id = _resolve_exercise_id(session, data.user_id, exercise)
+        workout_exercise = WorkoutExercise(
+            workout_id=workout_id,
+            exercise_id=exercise_id,
+            notes=exercise.notes,
+            user_id=data.user_id,
+            workout_date=workout_date,
+        )
+        written_workout_exercises += 1
+        if pack_sets:
+            workout_exercise.packed_sets = [
+                _packed_set(set_index, set_data, logged_at) for set_index, set_data in enumerate(exercise.sets)
+            ]
             session.add(workout_exercise)
-            session.flush()
-            written_workout_exercises += 1
-
-            for set_index, set_data in enumerate(exercise.sets):
-                weight_kg, weight_original_value, weight_original_unit = set_data.weight_values()
-                workout_set = WorkoutSet(
-                    workout_exercise_id=workout_exercise.id,
-                    set_index=set_index,
-                    reps=set_data.reps,
-                    weight_kg=weight_kg,
-                    weight_original_value=weight_original_value,
-                    weight_original_unit=weight_original_unit,
-                    rpe=set_data.rpe,
-                    rir=set_data.rir,
-                    is_warmup=set_data.is_warmup,
-                    tempo=set_data.tempo,
-                    rest_seconds=set_data.rest_seconds,
-                    notes=set_data.notes,
-                )
-                session.add(workout_set)
-                written_sets += 1
+            written_sets += len(exercise.sets)
+            continue
+        session.add(workout_exercise)
+        session.flush()
+
+        for set_index, set_data in enumerate(exercise.sets):
+            weight_kg, weight_original_value, weight_original_unit = set_data.weight_values()
+            workout_set = WorkoutSet(
+                workout_exercise_id=workout_exercise.id,
+                user_id=data.user_id,
+                set_index=set_index,
+                reps=set_data.reps,
+                weight_kg=weight_kg,
+                weight_original_value=weight_original_value,
+                weight_original_unit=weight_original_unit,
+                rpe=set_data.rpe,
+                rir=set_data.rir,
+                is_warmup=set_data.is_warmup,
+                tempo=set_data.tempo,
+                rest_seconds=set_data.rest_seconds,
+                notes=set_data.notes,
+            )
+            session.add(workout_set)
+            written_sets += 1
+
+    session.flush()
+    _record_write(
+        session,
+        data.user_id,
+        {"workout_id": workout_id, "exercises": written_workout_exercises, "sets": written_sets},
+    )
 
     return {
         "workout_id": str(workout_id),
@@ -190,6 +488,130 @@ def ingest_workout(session: Session, payload: Dict | WorkoutIngestPayload) -> Di
     }
 
 
+def ingest_workout(
+    session: Session, payload: Dict | WorkoutIngestPayload, backend: str | None = None
+) -> Dict:
+    if isinstance(payload, WorkoutIngestPayload):
+        data = payload
+    else:
+        data = validate_payload(payload)
+
+    if data.idempotency_key:
+        replay = cached_response(data.user_id, data.idempotency_key)
+        if replay is not None:
+            return replay
+
+    with begin_write(session):
+        result = write_workout(session, data, backend=backend)
+    note_committed_writes(session)
+
+    if data.idempotency_key:
+        remember_response(data.user_id, data.idempotency_key, result)
+    return result
+
+
+@lru_cache(maxsize=128)
+def _exercise_sets_statement(fields: tuple[str, ...]):
+    # Only the requested columns are selected; ordering keys are added separately.
+    return (
+        select(
+            WorkoutSet.workout_exercise_id,
+            *(SET_COLUMNS[name].label(name) for name in fields),
+        )
+        .join(WorkoutExercise, WorkoutExercise.id == WorkoutSet.workout_exercise_id)
+        .where(WorkoutExercise.workout_id == bindparam("workout_id"))
+        .order_by(WorkoutSet.workout_exercise_id, WorkoutSet.set_index)
+    )
+
+
+def _exercise_sets(session: Session, workout_id: uuid.UUID, fields: tuple[str, ...]) -> Dict:
+    sets: Dict[uuid.UUID, list] = {}
+    for row in session.execute(_exercise_sets_statement(fields), {"workout_id": workout_id}):
+        values = row._mapping
+        sets.setdefault(row.workout_exercise_id, []).append(
+            {name: json_value(values[name]) for name in fields}
+        )
+    return sets
+
+
+def _exercise_summaries_statement(top_set_reps):
+    return (
+        select(
+            WorkoutSet.workout_exercise_id,
+            func.count().label("sets"),
+            func.sum(WorkoutSet.reps).label("total_reps"),
+            func.max(WorkoutSet.weight_kg).label("top_set_weight_kg"),
+            top_set_reps.label("top_set_reps"),
+            func.coalesce(func.sum(WorkoutSet.reps * WorkoutSet.weight_kg), 0).label("tonnage_kg"),
+        )
+        .join(WorkoutExercise, WorkoutExercise.id == WorkoutSet.workout_exercise_id)
+        .where(WorkoutExercise.workout_id == bindparam("workout_id"))
+        .group_by(WorkoutSet.workout_exercise_id)
+    )
+
+
+_EXERCISE_SUMMARIES = _exercise_summaries_statement(
+    array_agg(
+        aggregate_order_by(
+            WorkoutSet.reps, WorkoutSet.weight_kg.desc().nulls_last(), WorkoutSet.reps.desc()
+        )
+    )[1]
+)
+# SQLite has no ordered aggregates, so the top set is a correlated lookup per exercise.
+_TOP_SET = aliased(WorkoutSet)
+_EXERCISE_SUMMARIES_SQLITE = _exercise_summaries_statement(
+    select(_TOP_SET.reps)
+    .where(_TOP_SET.workout_exercise_id == WorkoutSet.workout_exercise_id)
+    .order_by(_TOP_SET.weight_kg.desc().nulls_last(), _TOP_SET.reps.desc())
+    .limit(1)
+    .scalar_subquery()
+)
+
+
+def _exercise_summaries(session: Session, workout_id: uuid.UUID) -> Dict:
+    statement = _EXERCISE_SUMMARIES_SQLITE if is_sqlite(session) else _EXERCISE_SUMMARIES
+    return {
+        row.workout_exercise_id: {
+            "sets": row.sets,
+            "total_reps": row.total_reps,
+            "top_set": {"weight_kg": row.top_set_weight_kg, "reps": row.top_set_reps},
+            "tonnage_kg": row.tonnage_kg,
+        }
+        for row in session.execute(statement, {"workout_id": workout_id})
+    }
+
+
+_WORKOUT_HEADER = select(
+    Workout.id,
+    Workout.user_id,
+    Workout.workout_date,
+    Workout.started_at,
+    Workout.ended_at,
+    Workout.timezone,
+    Workout.title,
+    Workout.source,
+    Workout.notes,
+    # A day written to after archival has archived_at cleared until the next archiver
+    # run, so the document itself says whether there are archived exercises.
+    WorkoutArchive.exercises.label("archived_exercises"),
+).outerjoin(WorkoutArchive, WorkoutArchive.workout_id == Workout.id).where(
+    Workout.user_id == bindparam("user_id"),
+    Workout.workout_date == bindparam("workout_date"),
+)
+_WORKOUT_EXERCISE_ROWS = (
+    select(
+        WorkoutExercise.id,
+        WorkoutExercise.exercise_id,
+        WorkoutExercise.notes,
+        WorkoutExercise.packed_sets,
+        Exercise.display_name,
+        Exercise.canonical_name,
+    )
+    .join(Exercise, Exercise.id == WorkoutExercise.exercise_id)
+    .where(WorkoutExercise.workout_id == bindparam("workout_id"))
+)
+
+
 def get_workout_for_day(
     session: Session, payload: Dict | WorkoutByDateRequest
 ) -> Dict:
@@ -201,56 +623,46 @@ def get_workout_for_day(
     workout_date = request.workout_date
 
     with session.begin():
-        workout = (
-            session.execute(
-                select(Workout)
-                .where(
-                    Workout.user_id == request.user_id,
-                    Workout.workout_date == workout_date,
-                )
-                .options(
-                    selectinload(Workout.exercises)
-                    .options(
-                        selectinload(WorkoutExercise.exercise),
-                        selectinload(WorkoutExercise.sets),
-                    )
-                )
-            )
-            .scalars()
-            .first()
-        )
+        workout = session.execute(
+            _WORKOUT_HEADER, {"user_id": request.user_id, "workout_date": workout_date}
+        ).first()
 
         if not workout:
             return {"workout": None}
 
+        workout_exercises = session.execute(
+            _WORKOUT_EXERCISE_ROWS, {"workout_id": workout.id}
+        ).all()
+
+        # Packed exercises carry their sets; only row-stored ones need the sets query.
+        if all(ex.packed_sets is not None for ex in workout_exercises):
+            details = {}
+        elif request.summary:
+            details = _exercise_summaries(session, workout.id)
+        else:
+            details = _exercise_sets(session, workout.id, request.set_fields())
+
         exercises = []
-        for ex in workout.exercises:
+        # Archived days keep their sets in one packed document; anything appended
+        # after archival is still in the hot tables and follows below.
+        exercises.extend(
+            shape_archived_exercise(exercise, request.set_fields(), request.summary)
+            for exercise in workout.archived_exercises or []
+        )
+        for ex in workout_exercises:
             exercise_info = {
                 "workout_exercise_id": str(ex.id),
                 "exercise_id": str(ex.exercise_id),
-                "display_name": ex.exercise.display_name if ex.exercise else None,
-                "canonical_name": ex.exercise.canonical_name if ex.exercise else None,
+                "display_name": ex.display_name,
+                "canonical_name": ex.canonical_name,
                 "notes": ex.notes,
-                "sets": [],
             }
-            for ws in sorted(ex.sets, key=lambda s: s.set_index):
-                exercise_info["sets"].append(
-                    {
-                        "workout_set_id": str(ws.id),
-                        "set_index": ws.set_index,
-                        "reps": ws.reps,
-                        "weight_kg": ws.weight_kg,
-                        "weight_original_value": ws.weight_original_value,
-                        "weight_original_unit": ws.weight_original_unit,
-                        "rpe": ws.rpe,
-                        "rir": ws.rir,
-                        "is_warmup": ws.is_warmup,
-                        "tempo": ws.tempo,
-                        "rest_seconds": ws.rest_seconds,
-                        "notes": ws.notes,
-                        "logged_at": ws.logged_at.isoformat() if ws.logged_at else None,
-                    }
-                )
+            if ex.packed_sets is not None:
+                exercise_info.update(shape_packed_sets(ex.packed_sets, request.set_fields(), request.summary))
+            elif request.summary:
+                exercise_info["summary"] = details.get(ex.id) or summarize_sets([])
+            else:
+                exercise_info["sets"] = details.get(ex.id, [])
             exercises.append(exercise_info)
 
         return {
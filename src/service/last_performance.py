@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import uuid
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List
+
+from sqlalchemy import bindparam, func, or_, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from src.db.models import Exercise, Workout, WorkoutArchive, WorkoutExercise, WorkoutSet
+from src.db.session import is_sqlite
+from src.domain.normalize import normalize_canonical_name
+from src.domain.payloads import LastPerformanceRequest
+from src.service.archive_workouts import (
+    SET_COLUMNS,
+    json_value,
+    shape_archived_exercise,
+    shape_packed_sets,
+)
+from src.service.exercise_catalog import catalog
+
+_EXERCISE_BY_NAME = (
+    select(Exercise)
+    .where(
+        Exercise.canonical_name == bindparam("canonical_name"),
+        or_(Exercise.owner_user_id == bindparam("user_id"), Exercise.owner_user_id.is_(None)),
+    )
+    # The user's own exercise shadows a catalog exercise of the same name.
+    .order_by(Exercise.owner_user_id.is_(None))
+    .limit(1)
+)
+
+# The newest n distinct days, read off ix_workout_exercise_last_performance
+# (user_id, exercise_id, workout_date DESC): the scan stops after n entries however
+# long the user's history is, and the outer range scan re-reads only those days.
+_RECENT_DAYS = (
+    select(WorkoutExercise.workout_date)
+    .where(
+        WorkoutExercise.user_id == bindparam("user_id"),
+        WorkoutExercise.exercise_id == bindparam("exercise_id"),
+    )
+    .distinct()
+    .order_by(WorkoutExercise.workout_date.desc())
+    .limit(bindparam("n"))
+    .subquery()
+)
+_RECENT_EXERCISES = (
+    select(
+        WorkoutExercise.id,
+        WorkoutExercise.workout_id,
+        WorkoutExercise.workout_date,
+        WorkoutExercise.notes,
+        WorkoutExercise.packed_sets,
+    )
+    .where(
+        WorkoutExercise.user_id == bindparam("user_id"),
+        WorkoutExercise.exercise_id == bindparam("exercise_id"),
+        WorkoutExercise.workout_date >= select(func.min(_RECENT_DAYS.c.workout_date)).scalar_subquery(),
+    )
+    .order_by(WorkoutExercise.workout_date.desc())
+)
+
+# Archived days no longer have workout_exercise rows; they are read newest first
+# through ix_workout_user_date and only when the hot rows hold fewer than n days.
+_ARCHIVED_DAYS = (
+    select(WorkoutArchive.workout_id, Workout.workout_date, WorkoutArchive.exercises)
+    .join(Workout, Workout.id == WorkoutArchive.workout_id)
+    .where(Workout.user_id == bindparam("user_id"), Workout.workout_date <= bindparam("before"))
+    .order_by(Workout.workout_date.desc())
+)
+_ARCHIVED_DAYS_PG = _ARCHIVED_DAYS.where(
+    WorkoutArchive.exercises.op("@>")(bindparam("contains", type_=JSONB))
+).limit(bindparam("n"))
+
+
+@lru_cache(maxsize=128)
+def _sets_statement(fields: tuple[str, ...]):
+    return (
+        select(
+            WorkoutSet.workout_exercise_id,
+            *(SET_COLUMNS[name].label(name) for name in fields),
+        )
+        .where(WorkoutSet.workout_exercise_id.in_(bindparam("workout_exercise_ids", expanding=True)))
+        .order_by(WorkoutSet.workout_exercise_id, WorkoutSet.set_index)
+    )
+
+
+def _resolve_exercise(session: Session, request: LastPerformanceRequest) -> Exercise | None:
+    if request.exercise_id is not None:
+        exercise = session.get(Exercise, request.exercise_id)
+        if exercise is None or exercise.owner_user_id not in (None, request.user_id):
+            return None
+        return exercise
+
+    # Same precedence as ingest: the stored name first, then the catalog name an
+    # alias resolves to; either way the user's own exercise wins over the catalog's.
+    names = [normalize_canonical_name(request.exercise)]
+    catalog_match = catalog.resolve(request.exercise)
+    if catalog_match and catalog_match.canonical_name != names[0]:
+        names.append(catalog_match.canonical_name)
+    for name in names:
+        exercise = session.execute(
+            _EXERCISE_BY_NAME, {"user_id": request.user_id, "canonical_name": name}
+        ).scalar_one_or_none()
+        if exercise is not None:
+            return exercise
+    return None
+
+
+def _archived_sessions(
+    session: Session, user_id: uuid.UUID, exercise_id: uuid.UUID, before: date, limit: int
+) -> List[tuple]:
+    params = {"user_id": user_id, "before": before}
+    if is_sqlite(session):
+        # No JSON containment operator: filter the packed documents while streaming.
+        rows = session.execute(_ARCHIVED_DAYS, params)
+    else:
+        params.update(n=limit, contains=[{"exercise_id": str(exercise_id)}])
+        rows = session.execute(_ARCHIVED_DAYS_PG, params)
+
+    found = []
+    for row in rows:
+        matching = [e for e in row.exercises if e["exercise_id"] == str(exercise_id)]
+        if matching:
+            found.append((row.workout_id, row.workout_date, matching))
+            if len(found) == limit:
+                break
+    return found
+
+
+def get_last_performance(session: Session, payload: Dict | LastPerformanceRequest) -> Dict:
+    """Sets of the user's most recent ``n`` sessions of one exercise, newest first."""
+    if isinstance(payload, LastPerformanceRequest):
+        request = payload
+    else:
+        request = LastPerformanceRequest.model_validate(payload)
+    fields = request.set_fields()
+
+    with session.begin():
+        exercise = _resolve_exercise(session, request)
+        if exercise is None:
+            return {"exercise": None, "sessions": []}
+        exercise_info = {
+            "exercise_id": str(exercise.id),
+            "canonical_name": exercise.canonical_name,
+            "display_name": exercise.display_name,
+        }
+        rows = session.execute(
+            _RECENT_EXERCISES,
+            {"user_id": request.user_id, "exercise_id": exercise.id, "n": request.n},
+        ).all()
+        sets: Dict[uuid.UUID, list] = {
+            row.id: shape_packed_sets(row.packed_sets, fields)["sets"] for row in rows if row.packed_sets is not None
+        }
+        row_stored = [row.id for row in rows if row.packed_sets is None]
+        if row_stored:
+            for row in session.execute(_sets_statement(fields), {"workout_exercise_ids": row_stored}):
+                values = row._mapping
+                sets.setdefault(row.workout_exercise_id, []).append(
+                    {name: json_value(values[name]) for name in fields}
+                )
+
+        sessions: Dict[uuid.UUID, Dict] = {}
+        for row in rows:
+            sessions.setdefault(
+                row.workout_id,
+                {"workout_id": str(row.workout_id), "workout_date": row.workout_date, "exercises": []},
+            )["exercises"].append(
+                {
+                    "workout_exercise_id": str(row.id),
+                    **exercise_info,
+                    "notes": row.notes,
+                    "sets": sets.get(row.id, []),
+                }
+            )
+
+        if len(sessions) < request.n:
+            before = min((s["workout_date"] for s in sessions.values()), default=date.max)
+            for workout_id, workout_date, packed in _archived_sessions(
+                session, request.user_id, exercise.id, before, request.n
+            ):
+                entry = sessions.setdefault(
+                    workout_id,
+                    {"workout_id": str(workout_id), "workout_date": workout_date, "exercises": []},
+                )
+                # Packed exercises were logged before anything appended after archival.
+                entry["exercises"][:0] = [shape_archived_exercise(e, fields) for e in packed]
+
+    recent = sorted(sessions.values(), key=lambda s: s["workout_date"], reverse=True)[: request.n]
+    for entry in recent:
+        entry["workout_date"] = entry["workout_date"].isoformat()
+    return {"exercise": exercise_info, "sessions": recent}
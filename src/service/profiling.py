@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import cProfile
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, TypeVar
+
+PROFILE_MODES = ("sample", "cprofile")
+# Fraction of tool calls profiled without being asked to; 0 profiles only on request.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+# The sampler needs the GIL to read a stack, so intervals below the interpreter's
+# switch interval (5 ms) only help while the profiled thread waits on I/O.
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "workout-tracker-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+T = TypeVar("T")
+
+_EXTENSIONS = {"sample": "collapsed", "cprofile": "pstats"}
+_PROFILE_NAME = re.compile(
+    r"^(?P<stamp>\d{8}T\d{12})-(?P<tool>[a-z0-9_]+)-(?P<elapsed_ms>\d+)ms-[0-9a-f]{8}\.(?P<ext>collapsed|pstats)$"
+)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+class StackSampler:
+    """Background thread recording one thread's stack every ``interval`` seconds.
+
+    Stacks are aggregated in the collapsed format flamegraph.pl and speedscope read:
+    one ``root;...;leaf count`` line per distinct stack. Frames at and above
+    ``base`` (the caller's own frame) are left out, so stacks start at the profiled call.
+    """
+
+    def __init__(self, thread_id: int, base, interval: float):
+        self.thread_id = thread_id
+        self.base = base
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.base:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> bytes:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+class ProfileStore:
+    """Directory of profile files, keeping only the newest ``max_files``."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _names(self) -> List[str]:
+        if not self.directory.is_dir():
+            return []
+        # Timestamps lead the name, so reverse name order is newest first.
+        return sorted((p.name for p in self.directory.iterdir() if _PROFILE_NAME.match(p.name)), reverse=True)
+
+    def save(self, tool: str, mode: str, elapsed: float, data: bytes) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{tool}-{int(elapsed * 1000)}ms-{secrets.token_hex(4)}.{_EXTENSIONS[mode]}"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            partial = self.directory / f".{name}.partial"
+            partial.write_bytes(data)
+            partial.replace(self.directory / name)
+            for stale in self._names()[self.max_files :]:
+                (self.directory / stale).unlink(missing_ok=True)
+        return name
+
+    def list(self) -> List[Dict]:
+        entries = []
+        for name in self._names():
+            match = _PROFILE_NAME.match(name)
+            try:
+                size = (self.directory / name).stat().st_size
+            except FileNotFoundError:
+                continue
+            entries.append(
+                {
+                    "name": name,
+                    "tool": match["tool"],
+                    "mode": "sample" if match["ext"] == "collapsed" else "cprofile",
+                    "elapsed_ms": int(match["elapsed_ms"]),
+                    "created_at": datetime.strptime(match["stamp"], "%Y%m%dT%H%M%S%f")
+                    .replace(tzinfo=timezone.utc)
+                    .isoformat(),
+                    "bytes": size,
+                }
+            )
+        return entries
+
+    def path_for(self, name: str) -> Path | None:
+        if not _PROFILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+class ToolProfiler:
+    """Opt-in profiling of single tool calls.
+
+    ``choose_mode`` decides per call, so a call that is not profiled costs one
+    comparison. ``run`` executes the call in the calling thread under the chosen
+    profiler and saves the result to ``store``, also when the call raises.
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore | None = None,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        mode: str = PROFILE_MODE,
+        interval: float = PROFILE_INTERVAL_MS / 1000,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.store = store or ProfileStore()
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+
+    def choose_mode(self, requested: str | None = None) -> str | None:
+        if requested:
+            return requested if requested in PROFILE_MODES else self.mode
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return self.mode
+        return None
+
+    def run(self, mode: str, tool: str, call: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        if mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(call)
+            finally:
+                elapsed = time.perf_counter() - started
+                with tempfile.NamedTemporaryFile(suffix=".pstats") as dump:
+                    pstats.Stats(profile).dump_stats(dump.name)
+                    self.store.save(tool, mode, elapsed, Path(dump.name).read_bytes())
+
+        sampler = StackSampler(threading.get_ident(), sys._getframe(), self.interval)
+        sampler.start()
+        try:
+            return call()
+        finally:
+            sampler.stop()
+            self.store.save(tool, mode, time.perf_counter() - started, sampler.collapsed())
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src.db.models import (
+    AppUser,
+    Exercise,
+    IdempotencyResponse,
+    IngestQueueItem,
+    ShardPlacement,
+    Workout,
+    WorkoutArchive,
+    WorkoutExercise,
+    WorkoutSet,
+)
+from src.db.sharding import SHARD_PLACEMENT_REFRESH_SECONDS, USER_WRITE_LOCK, HashRing, ShardRouter
+
+logger = logging.getLogger(__name__)
+
+_SEQUENCE_LAST_VALUE = text("SELECT last_value FROM workout_change_seq")
+# Keeps change_seq increasing for the user across the move, so sync cursors handed
+# out by the old shard stay valid on the new one.
+_ADVANCE_SEQUENCE = text(
+    "SELECT setval('workout_change_seq', greatest((SELECT last_value FROM workout_change_seq), :floor))"
+)
+
+
+@dataclass
+class MoveResult:
+    user_id: uuid.UUID
+    source: str
+    target: str
+    workouts: int
+    delta_workouts: int
+    seconds: float
+
+
+def _workout_filter(user_id: uuid.UUID, workout_ids: List[uuid.UUID] | None):
+    criteria = [Workout.user_id == user_id]
+    if workout_ids is not None:
+        criteria.append(Workout.id.in_(workout_ids))
+    return criteria
+
+
+def _rows(session: Session, statement) -> List[Dict]:
+    return [dict(row) for row in session.execute(statement).mappings()]
+
+
+def _read_workouts(session: Session, user_id: uuid.UUID, workout_ids: List[uuid.UUID] | None) -> Dict:
+    criteria = _workout_filter(user_id, workout_ids)
+    workout_columns = [column for column in Workout.__table__.c if column.name != "change_seq"]
+    return {
+        "workout": _rows(session, select(*workout_columns).where(*criteria).order_by(Workout.change_seq)),
+        "workout_exercise": _rows(
+            session, select(WorkoutExercise.__table__).join(Workout).where(*criteria)
+        ),
+        "workout_set": _rows(
+            session,
+            select(WorkoutSet.__table__).join(WorkoutExercise).join(Workout).where(*criteria),
+        ),
+        "workout_archive": _rows(
+            session, select(WorkoutArchive.__table__).join(Workout).where(*criteria)
+        ),
+    }
+
+
+def _read_user_rows(session: Session, user_id: uuid.UUID) -> Dict:
+    queue_columns = [column for column in IngestQueueItem.__table__.c if column.name != "id"]
+    return {
+        "exercise": _rows(session, select(Exercise.__table__).where(Exercise.owner_user_id == user_id)),
+        "idempotency_response": _rows(
+            session, select(IdempotencyResponse.__table__).where(IdempotencyResponse.user_id == user_id)
+        ),
+        "ingest_queue": _rows(
+            session, select(*queue_columns).where(IngestQueueItem.user_id == user_id)
+        ),
+    }
+
+
+def _delete_workouts(session: Session, user_id: uuid.UUID, workout_ids: List[uuid.UUID] | None = None) -> None:
+    # Children first in set-based statements; cascades would check one workout at a time.
+    workouts = select(Workout.id).where(*_workout_filter(user_id, workout_ids))
+    exercises = select(WorkoutExercise.id).where(WorkoutExercise.workout_id.in_(workouts))
+    for statement in (
+        delete(WorkoutSet).where(WorkoutSet.workout_exercise_id.in_(exercises)),
+        delete(WorkoutExercise).where(WorkoutExercise.workout_id.in_(workouts)),
+        delete(WorkoutArchive).where(WorkoutArchive.workout_id.in_(workouts)),
+        delete(Workout).where(*_workout_filter(user_id, workout_ids)),
+    ):
+        session.execute(statement, execution_options={"synchronize_session": False})
+
+
+def _delete_user_rows(session: Session, user_id: uuid.UUID) -> None:
+    _delete_workouts(session, user_id)
+    for statement in (
+        delete(IdempotencyResponse).where(IdempotencyResponse.user_id == user_id),
+        delete(IngestQueueItem).where(IngestQueueItem.user_id == user_id),
+        delete(Exercise).where(Exercise.owner_user_id == user_id),
+    ):
+        session.execute(statement, execution_options={"synchronize_session": False})
+
+
+def _write_workouts(session: Session, rows: Dict) -> None:
+    # Workouts go in change_seq order without the column, so the target sequence
+    # numbers them afresh in the same order.
+    for table in (Workout, WorkoutExercise, WorkoutSet, WorkoutArchive):
+        batch = rows[table.__tablename__]
+        if batch:
+            session.execute(insert(table), batch)
+
+
+def _write_user_rows(session: Session, user_id: uuid.UUID, rows: Dict) -> None:
+    if rows["exercise"]:
+        session.execute(pg_insert(Exercise).on_conflict_do_nothing(), rows["exercise"])
+    if rows["idempotency_response"]:
+        session.execute(pg_insert(IdempotencyResponse).on_conflict_do_nothing(), rows["idempotency_response"])
+    session.execute(delete(IngestQueueItem).where(IngestQueueItem.user_id == user_id))
+    if rows["ingest_queue"]:
+        session.execute(insert(IngestQueueItem), rows["ingest_queue"])
+
+
+def _pending_items(session: Session, user_id: uuid.UUID) -> int:
+    return session.execute(
+        select(func.count()).where(IngestQueueItem.user_id == user_id, IngestQueueItem.status == "pending")
+    ).scalar_one()
+
+
+def _place_user(session: Session, user_id: uuid.UUID, moved_to: str | None) -> None:
+    session.execute(
+        pg_insert(AppUser)
+        .values(id=user_id, moved_to_shard=moved_to)
+        .on_conflict_do_update(index_elements=[AppUser.id], set_={"moved_to_shard": moved_to})
+    )
+
+
+def move_user(
+    router: ShardRouter,
+    user_id: uuid.UUID,
+    target: str,
+    grace_seconds: float | None = 2 * SHARD_PLACEMENT_REFRESH_SECONDS,
+) -> MoveResult | None:
+    """Move a user's rows to ``target`` while they keep writing.
+
+    1. Copy everything from a snapshot of the source. The copy stays fenced on the
+       target (``moved_to_shard`` points back at the source) until the cut-over.
+    2. Cut over: on the source, take the per-user write lock, copy the workouts
+       changed since the snapshot (found by ``change_seq``) plus the small per-user
+       tables to the still-fenced target, and fence the source. Only once that has
+       committed is the target unfenced and the placement recorded, so the user is
+       never writable on both shards; if the source commit fails, the source keeps
+       the user and the move can simply be run again.
+    3. After ``grace_seconds``, by when every process has reloaded placements,
+       delete the user's rows from the source, keeping the fenced ``app_user`` row.
+       With ``grace_seconds=None`` this is left to ``purge_moved_user``, so a batch
+       of moves can share one wait.
+
+    Writes that race the cut-over fail on the source with ``ShardMoved`` and are
+    retried on the target by ``ShardRouter.run``; in the moment between the two
+    commits the target is still fenced, and such a retry fails back to the caller.
+    Returns None if already there.
+    """
+    started = time.monotonic()
+    source = router.shard_for(user_id)
+    if source == target:
+        return None
+    if target not in router.engines:
+        raise ValueError(f"Unknown shard {target!r}")
+    source_engine, target_engine = router.engines[source], router.engines[target]
+
+    with Session(source_engine) as source_session, source_session.begin():
+        source_session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        if _pending_items(source_session, user_id):
+            raise ValueError(f"user {user_id} has pending queued workouts; retry once they drain")
+        sequence_floor = source_session.execute(_SEQUENCE_LAST_VALUE).scalar_one()
+        snapshot_seq = source_session.execute(
+            select(func.coalesce(func.max(Workout.change_seq), 0)).where(Workout.user_id == user_id)
+        ).scalar_one()
+        workouts = _read_workouts(source_session, user_id, None)
+        user_rows = _read_user_rows(source_session, user_id)
+
+    with Session(target_engine) as target_session, target_session.begin():
+        _place_user(target_session, user_id, moved_to=source)
+        _delete_user_rows(target_session, user_id)
+        target_session.execute(_ADVANCE_SEQUENCE, {"floor": sequence_floor})
+        _write_user_rows(target_session, user_id, user_rows)
+        _write_workouts(target_session, workouts)
+
+    with Session(source_engine) as source_session, source_session.begin():
+        source_session.execute(USER_WRITE_LOCK, {"user_id": str(user_id)})
+        if _pending_items(source_session, user_id):
+            raise ValueError(f"user {user_id} has pending queued workouts; retry once they drain")
+        sequence_floor = source_session.execute(_SEQUENCE_LAST_VALUE).scalar_one()
+        changed_ids = source_session.execute(
+            select(Workout.id).where(Workout.user_id == user_id, Workout.change_seq > snapshot_seq)
+        ).scalars().all()
+        delta = _read_workouts(source_session, user_id, changed_ids)
+        user_rows = _read_user_rows(source_session, user_id)
+
+        # The target stays fenced: the source is the user's shard until it commits.
+        with Session(target_engine) as target_session, target_session.begin():
+            target_session.execute(_ADVANCE_SEQUENCE, {"floor": sequence_floor})
+            _write_user_rows(target_session, user_id, user_rows)
+            _delete_workouts(target_session, user_id, changed_ids)
+            _write_workouts(target_session, delta)
+        _place_user(source_session, user_id, moved_to=target)
+
+    with Session(target_engine) as target_session, target_session.begin():
+        _place_user(target_session, user_id, moved_to=None)
+
+    with Session(router.directory) as directory, directory.begin():
+        if router.ring.shard_for(user_id) == target:
+            directory.execute(delete(ShardPlacement).where(ShardPlacement.user_id == user_id))
+        else:
+            directory.execute(
+                pg_insert(ShardPlacement)
+                .values(user_id=user_id, shard=target)
+                .on_conflict_do_update(
+                    index_elements=[ShardPlacement.user_id],
+                    set_={"shard": target, "placed_at": func.now()},
+                )
+            )
+    router.note_moved(user_id, target)
+
+    if grace_seconds is not None:
+        time.sleep(grace_seconds)
+        purge_moved_user(router, user_id, source)
+
+    result = MoveResult(
+        user_id, source, target, len(workouts["workout"]), len(changed_ids), time.monotonic() - started
+    )
+    logger.info("moved user %s from %s to %s", user_id, source, target)
+    return result
+
+
+def purge_moved_user(router: ShardRouter, user_id: uuid.UUID, shard: str) -> bool:
+    """Delete a moved user's leftover rows from ``shard``; False if they were not fenced there."""
+    with Session(router.engines[shard]) as session, session.begin():
+        moved_to = session.execute(
+            select(AppUser.moved_to_shard).where(AppUser.id == user_id).with_for_update()
+        ).scalar_one_or_none()
+        if not moved_to:
+            return False
+        _delete_user_rows(session, user_id)
+    return True
+
+
+def plan_rebalance(router: ShardRouter, ring: HashRing) -> List[tuple[uuid.UUID, str, str]]:
+    """(user, current shard, target shard) for every user ``ring`` places elsewhere."""
+    moves = []
+    for shard, shard_engine in router.engines.items():
+        with Session(shard_engine) as session, session.begin():
+            user_ids = session.execute(
+                select(AppUser.id).where(AppUser.moved_to_shard.is_(None))
+            ).scalars().all()
+        for user_id in user_ids:
+            if router.shard_for(user_id) != shard:
+                continue
+            target = ring.shard_for(user_id)
+            if target != shard:
+                moves.append((user_id, shard, target))
+    return moves
+
+
+def prune_placements(router: ShardRouter, user_ids: Iterable[uuid.UUID] | None = None) -> int:
+    """Drop overrides that now agree with the router's ring; returns how many."""
+    with Session(router.directory) as directory, directory.begin():
+        rows = directory.execute(select(ShardPlacement.user_id, ShardPlacement.shard)).all()
+        redundant = [
+            row.user_id
+            for row in rows
+            if router.ring.shard_for(row.user_id) == row.shard
+            and (user_ids is None or row.user_id in set(user_ids))
+        ]
+        if redundant:
+            directory.execute(delete(ShardPlacement).where(ShardPlacement.user_id.in_(redundant)))
+    return len(redundant)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import base64
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from src.db.models import Workout
+from src.domain.payloads import WorkoutCalendarRequest
+
+# Only columns stored in ix_workout_user_date (key + INCLUDE), so Postgres can answer
+# it with an index-only scan and skip the heap for all-visible pages.
+_CALENDAR_DAYS = (
+    select(Workout.workout_date, Workout.exercise_count, Workout.set_count)
+    .where(
+        Workout.user_id == bindparam("user_id"),
+        Workout.workout_date.between(bindparam("from_date"), bindparam("to_date")),
+    )
+    .order_by(Workout.workout_date)
+)
+
+
+def encode_bitmap(days: Iterable[date], start: date, end: date) -> str:
+    """Base64 bitset with bit ``n`` (least significant first) set if ``start + n`` is a day."""
+    bits = bytearray(((end - start).days + 8) // 8)
+    for day in days:
+        offset = (day - start).days
+        bits[offset // 8] |= 1 << (offset % 8)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+def encode_runs(days: Iterable[date], start: date, end: date) -> str:
+    """Comma-separated run lengths alternating rest and training days, starting with rest.
+
+    A range that starts on a training day begins with a zero-length rest run.
+    """
+    runs: List[int] = []
+    cursor = start
+    for day in days:
+        gap = (day - cursor).days
+        if gap or not runs:
+            runs.extend([gap, 1])
+        else:
+            runs[-1] += 1
+        cursor = day + timedelta(days=1)
+    tail = (end - cursor).days + 1
+    if tail:
+        runs.append(tail)
+    return ",".join(str(run) for run in runs)
+
+
+def get_workout_calendar(session: Session, payload: Dict | WorkoutCalendarRequest) -> Dict:
+    if isinstance(payload, WorkoutCalendarRequest):
+        request = payload
+    else:
+        request = WorkoutCalendarRequest.model_validate(payload)
+
+    with session.begin():
+        rows = session.execute(
+            _CALENDAR_DAYS,
+            {"user_id": request.user_id, "from_date": request.from_date, "to_date": request.to_date},
+        ).all()
+
+    result = {
+        "from": request.from_date.isoformat(),
+        "to": request.to_date.isoformat(),
+        "workout_days": len(rows),
+        "total_sets": sum(row.set_count for row in rows),
+        "encoding": request.encoding,
+    }
+    days = [row.workout_date for row in rows]
+    if request.encoding == "bitmap":
+        result["bitmap"] = encode_bitmap(days, request.from_date, request.to_date)
+    elif request.encoding == "runs":
+        result["runs"] = encode_runs(days, request.from_date, request.to_date)
+    else:
+        result["days"] = [
+            {"date": row.workout_date.isoformat(), "exercises": row.exercise_count, "sets": row.set_count}
+            for row in rows
+        ]
+    return result
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.db.session import is_sqlite
+from src.domain.payloads import WorkoutSearchRequest
+
+SNIPPETS_PER_WORKOUT = 3
+# <b>…</b> around matched words; at most two fragments of a long note.
+HEADLINE_OPTIONS = "StartSel=<b>, StopSel=</b>, MaxWords=20, MinWords=6, MaxFragments=2"
+
+# Each branch is matched through a GIN index led by user_id (btree_gin, migration
+# 20250216_0021), so the index returns only this user's matching rows: neither other
+# users' matches nor the user's history are read. workout_set and workout_archive
+# carry a copy of user_id for this. The to_tsvector expressions and the partial
+# index predicates (notes / packed_sets IS NOT NULL) are repeated here verbatim.
+# The filters call websearch_to_tsquery again rather than read query.q: a constant
+# goes into the index condition, while a CTE column is checked row by row.
+# Workouts are ranked by the summed rank of their matches; the comparatively costly
+# ts_headline runs only for the notes of the workouts returned.
+SEARCH_WORKOUTS_SQL = text(
+    """
+    WITH query AS (
+        SELECT websearch_to_tsquery('english', :query) AS q
+    ),
+    matches AS (
+        SELECT w.id AS workout_id, w.workout_date, 'workout' AS source, w.notes AS note,
+               ts_rank(to_tsvector('english', w.notes), query.q) AS rank
+        FROM workout w, query
+        WHERE w.user_id = :user_id
+          AND w.notes IS NOT NULL
+          AND to_tsvector('english', w.notes) @@ websearch_to_tsquery('english', :query)
+        UNION ALL
+        SELECT w.id, w.workout_date, 'exercise', we.notes,
+               ts_rank(to_tsvector('english', we.notes), query.q)
+        FROM workout_exercise we
+        JOIN workout w ON w.id = we.workout_id, query
+        WHERE we.user_id = :user_id
+          AND we.notes IS NOT NULL
+          AND to_tsvector('english', we.notes) @@ websearch_to_tsquery('english', :query)
+        UNION ALL
+        SELECT w.id, w.workout_date, 'set', ws.notes,
+               ts_rank(to_tsvector('english', ws.notes), query.q)
+        FROM workout_set ws
+        JOIN workout_exercise we ON we.id = ws.workout_exercise_id
+        JOIN workout w ON w.id = we.workout_id, query
+        WHERE ws.user_id = :user_id
+          AND ws.notes IS NOT NULL
+          AND to_tsvector('english', ws.notes) @@ websearch_to_tsquery('english', :query)
+        UNION ALL
+        SELECT w.id, w.workout_date, 'set',
+               (
+                   SELECT string_agg(packed.note, ' … ')
+                   FROM jsonb_array_elements_text(jsonb_path_query_array(we.packed_sets, '$[*].notes'))
+                       AS packed(note)
+               ),
+               ts_rank(to_tsvector('english', jsonb_path_query_array(we.packed_sets, '$[*].notes')), query.q)
+        FROM workout_exercise we
+        JOIN workout w ON w.id = we.workout_id, query
+        WHERE we.user_id = :user_id
+          AND we.packed_sets IS NOT NULL
+          AND to_tsvector('english', jsonb_path_query_array(we.packed_sets, '$[*].notes'))
+              @@ websearch_to_tsquery('english', :query)
+        UNION ALL
+        SELECT w.id, w.workout_date, 'archive',
+               (
+                   SELECT string_agg(archived.note, ' … ')
+                   FROM jsonb_array_elements_text(
+                       jsonb_path_query_array(wa.exercises, '$[*].notes')
+                       || jsonb_path_query_array(wa.exercises, '$[*].sets[*].notes')
+                   ) AS archived(note)
+               ),
+               ts_rank(
+                   to_tsvector(
+                       'english',
+                       jsonb_path_query_array(wa.exercises, '$[*].notes')
+                       || jsonb_path_query_array(wa.exercises, '$[*].sets[*].notes')
+                   ),
+                   query.q
+               )
+        FROM workout_archive wa
+        JOIN workout w ON w.id = wa.workout_id, query
+        WHERE wa.user_id = :user_id
+          AND to_tsvector(
+                  'english',
+                  jsonb_path_query_array(wa.exercises, '$[*].notes')
+                  || jsonb_path_query_array(wa.exercises, '$[*].sets[*].notes')
+              ) @@ websearch_to_tsquery('english', :query)
+    ),
+    ranked AS (
+        SELECT workout_id, workout_date, sum(rank) AS rank
+        FROM matches
+        GROUP BY workout_id, workout_date
+        ORDER BY rank DESC, workout_date DESC
+        LIMIT :limit
+    )
+    SELECT
+        ranked.workout_id,
+        ranked.workout_date,
+        ranked.rank,
+        w.title,
+        matches.source,
+        ts_headline('english', matches.note, query.q, :headline_options) AS snippet
+    FROM ranked
+    JOIN workout w ON w.id = ranked.workout_id
+    JOIN matches ON matches.workout_id = ranked.workout_id,
+    query
+    ORDER BY ranked.rank DESC, ranked.workout_date DESC, matches.rank DESC
+    """
+)
+
+
+def search_workouts(session: Session, payload: Dict | WorkoutSearchRequest) -> Dict:
+    """Rank the user's workouts by full-text matches in workout, exercise and set notes."""
+    if isinstance(payload, WorkoutSearchRequest):
+        request = payload
+    else:
+        request = WorkoutSearchRequest.model_validate(payload)
+
+    with session.begin():
+        if is_sqlite(session):
+            raise ValueError("Notes search requires PostgreSQL full-text search")
+        rows = session.execute(
+            SEARCH_WORKOUTS_SQL,
+            {
+                "user_id": request.user_id,
+                "query": request.query,
+                "limit": request.limit,
+                "headline_options": HEADLINE_OPTIONS,
+            },
+        ).all()
+
+    workouts: Dict[str, Dict] = {}
+    for row in rows:
+        workout = workouts.setdefault(
+            str(row.workout_id),
+            {
+                "workout_id": str(row.workout_id),
+                "workout_date": row.workout_date.isoformat(),
+                "title": row.title,
+                "rank": round(float(row.rank), 4),
+                "snippets": [],
+            },
+        )
+        if len(workout["snippets"]) < SNIPPETS_PER_WORKOUT:
+            workout["snippets"].append({"source": row.source, "snippet": row.snippet})
+    return {"query": request.query, "workouts": list(workouts.values())}
@@ -5,7 +5,7 @@ import sys
 import pytest
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
@@ -13,6 +13,25 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from src.db.models import Base
+from src.db.session import create_database_engine
+from src.service.ingest_workout import ingest_workout
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "postgres: uses PostgreSQL-only features; skipped on the SQLite backend"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if not os.getenv("DATABASE_URL", "").startswith("sqlite"):
+        return
+    skip = pytest.mark.skip(reason="PostgreSQL-only feature")
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        # The plpgsql ingest backend is a stored function, so its parametrizations go too.
+        if "postgres" in item.keywords or (callspec and "plpgsql" in callspec.params.values()):
+            item.add_marker(skip)
 
 
 @pytest.fixture(scope="session")
@@ -25,10 +44,13 @@ def database_url():
 
 @pytest.fixture(scope="session")
 def engine(database_url):
-    engine = create_engine(database_url, future=True)
+    engine = create_database_engine(database_url)
     Base.metadata.drop_all(bind=engine)
     with engine.begin() as connection:
         connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        if engine.dialect.name == "sqlite":
+            # Stands in for the sequence there; drop_all only knows mapped tables.
+            connection.execute(text("DROP TABLE IF EXISTS workout_change_seq"))
 
     alembic_cfg = Config(str(pathlib.Path(__file__).resolve().parent.parent / "alembic.ini"))
     alembic_cfg.set_main_option("sqlalchemy.url", database_url)
@@ -49,3 +71,38 @@ def db_session(engine):
     session.close()
     transaction.rollback()
     connection.close()
+
+
+def workout_payload(
+    user_id,
+    workout_date: str = "2024-09-01",
+    *,
+    exercise: str = "Squat",
+    sets: list[dict] | None = None,
+    exercises: list[dict] | None = None,
+    idempotency_key: str | None = None,
+    **workout,
+) -> dict:
+    """An add_workout_entry payload for one day.
+
+    By default it logs one set of ``exercise``; ``sets`` replaces its sets and
+    ``exercises`` replaces the whole list. Other keywords are workout fields.
+    """
+    if exercises is None:
+        exercises = [{"display_name": exercise, "sets": sets or [{"reps": 5}]}]
+    return {
+        "user_id": str(user_id),
+        "idempotency_key": idempotency_key,
+        "workout": {"started_at": f"{workout_date}T10:00:00Z", **workout},
+        "exercises": exercises,
+    }
+
+
+@pytest.fixture
+def ingest_day():
+    """Ingest ``workout_payload(user_id, workout_date, **overrides)`` with the given backend."""
+
+    def ingest(session, user_id, workout_date: str = "2024-09-01", *, backend: str | None = None, **overrides):
+        return ingest_workout(session, workout_payload(user_id, workout_date, **overrides), backend=backend)
+
+    return ingest
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from mcp.server.auth.provider import AccessToken
+from mcp.server.fastmcp.exceptions import ToolError
+from starlette.requests import ClientDisconnect, Request
+
+from src import mcp_server
+from src.service.admission import AdmissionController, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(clock, **limits):
+    options = {
+        "rate_per_second": 1,
+        "burst": 2,
+        "max_in_flight": 0,
+        "principal_max_in_flight": 0,
+        "busy_retry_after": 0.5,
+    }
+    options.update(limits)
+    return AdmissionController(clock=clock, **options)
+
+
+def admit_once(admission, principal):
+    with admission.admit(principal):
+        pass
+
+
+def test_token_bucket_rejects_with_retry_after_until_refilled():
+    clock = FakeClock()
+    admission = controller(clock)
+    admit_once(admission, "a")
+    admit_once(admission, "a")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit_once(admission, "a")
+    assert rejected.value.retry_after == pytest.approx(1.0)
+    admit_once(admission, "b")
+
+    clock.now += 0.75
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit_once(admission, "a")
+    assert rejected.value.retry_after == pytest.approx(0.25)
+
+    clock.now += 0.25
+    admit_once(admission, "a")
+
+
+def test_in_flight_caps_reject_without_spending_tokens():
+    clock = FakeClock()
+    admission = controller(clock, rate_per_second=0, max_in_flight=2, principal_max_in_flight=1)
+
+    admission.acquire("a")
+    with pytest.raises(AdmissionRejected, match="too many concurrent requests"):
+        admission.acquire("a")
+    admission.acquire("b")
+    with pytest.raises(AdmissionRejected, match="server busy") as rejected:
+        admission.acquire("c")
+    assert rejected.value.retry_after == 0.5
+
+    admission.release("a")
+    admission.acquire("c")
+    assert admission.in_flight == 2
+
+
+def test_idle_principals_are_evicted_with_full_buckets():
+    clock = FakeClock()
+    admission = controller(clock)
+    admit_once(admission, "idle")
+    admission.acquire("busy")
+
+    clock.now += 2
+    admit_once(admission, "fresh")
+
+    assert len(admission) == 2
+    admission.release("busy")
+
+
+def test_long_running_principal_does_not_block_eviction_behind_it():
+    clock = FakeClock()
+    admission = controller(clock)
+    admission.acquire("busy")
+    admit_once(admission, "idle")
+
+    clock.now += 2
+    admit_once(admission, "fresh")
+
+    assert len(admission) == 2
+    admission.release("busy")
+    clock.now += 2
+    admit_once(admission, "fresh")
+    assert len(admission) == 1
+
+
+def test_caps_only_controller_keeps_busy_principals_out_of_the_idle_walk():
+    clock = FakeClock()
+    admission = controller(clock, rate_per_second=0, principal_max_in_flight=1)
+    for n in range(3):
+        admission.acquire(f"busy-{n}")
+
+    admit_once(admission, "idle")
+
+    # Eviction only ever walks idle principals, however many calls are in flight.
+    assert list(admission._principals) == ["idle"]
+    assert len(admission) == 4
+    with pytest.raises(AdmissionRejected, match="too many concurrent requests"):
+        admission.acquire("busy-0")
+    for n in range(3):
+        admission.release(f"busy-{n}")
+    admit_once(admission, "fresh")
+    assert len(admission) == 1
+
+
+def test_tool_calls_are_rejected_with_retry_hint(monkeypatch):
+    admission = controller(FakeClock(), rate_per_second=1, burst=1)
+    monkeypatch.setattr(mcp_server, "admission", admission)
+    admission.acquire("anonymous")
+
+    with pytest.raises(ToolError, match="Too many requests: rate limit exceeded; retry after 1.0s"):
+        asyncio.run(
+            mcp_server.mcp.call_tool(
+                "get_ingest_status",
+                {"payload": {"user_id": str(uuid.uuid4()), "ticket": str(uuid.uuid4())}},
+            )
+        )
+
+
+def test_admitted_tool_runs_and_releases_its_slot(engine, monkeypatch):
+    admission = controller(FakeClock(), max_in_flight=1)
+    monkeypatch.setattr(mcp_server, "admission", admission)
+
+    (content,) = asyncio.run(
+        mcp_server.mcp.call_tool(
+            "search_exercises", {"payload": {"user_id": str(uuid.uuid4()), "query": "zercher"}}
+        )
+    )
+
+    assert json.loads(content.text)["exercises"] == []
+    assert admission.in_flight == 0
+
+
+def test_export_releases_its_slot_when_client_leaves_before_the_first_chunk(monkeypatch):
+    admission = controller(FakeClock(), principal_max_in_flight=1)
+    monkeypatch.setattr(mcp_server, "admission", admission)
+
+    async def authenticate(request):
+        return AccessToken(token="key", client_id="api-key", scopes=[], subject="api-key:test")
+
+    iterated = []
+
+    def iter_workouts(session, export_request):
+        iterated.append(export_request)
+        yield from ()
+
+    monkeypatch.setattr(mcp_server, "authenticate_request", authenticate)
+    monkeypatch.setattr(mcp_server, "iter_workouts", iter_workouts)
+    scope = {
+        "type": "http",
+        "asgi": {"spec_version": "2.4"},
+        "method": "GET",
+        "path": "/export/workouts",
+        "query_string": f"user_id={uuid.uuid4()}".encode(),
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def export_to_departed_client():
+        response = await mcp_server.export_workouts(Request(scope, receive))
+        assert admission.in_flight == 1
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+
+    asyncio.run(export_to_departed_client())
+
+    assert iterated == []
+    assert admission.in_flight == 0
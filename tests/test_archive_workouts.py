@@ -0,0 +1,135 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from src.db.models import Workout, WorkoutArchive, WorkoutExercise, WorkoutSet
+from src.domain.payloads import SET_PROJECTIONS, WorkoutExportRequest
+from src.service import ingest_workout as ingest_module
+from src.service.archive_workouts import archive_workouts, shape_archived_exercise
+from src.service.export_workouts import iter_workouts
+from src.service.ingest_workout import get_workout_for_day
+
+
+LEG_DAY = {
+    "title": "Legs",
+    "exercises": [
+        {
+            "display_name": "Front Squat",
+            "notes": "belt",
+            "sets": [
+                {"reps": 5, "weight": {"value": 100, "unit": "kg"}, "rpe": 8},
+                {"reps": 3, "weight": {"value": 110, "unit": "kg"}, "tempo": "20X0"},
+            ],
+        },
+        {"display_name": "Nordic Curl", "sets": [{"reps": 6}]},
+    ],
+}
+
+
+def read_day(session, user_id: uuid.UUID, workout_date: str, **options):
+    return get_workout_for_day(
+        session, {"user_id": str(user_id), "workout_date": workout_date, **options}
+    )
+
+
+def by_exercise(result):
+    return sorted(result["workout"]["exercises"], key=lambda ex: ex["workout_exercise_id"])
+
+
+def test_archived_day_reads_like_hot_day(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-10", **LEG_DAY)
+    ingest_day(db_session, user_id, "2024-06-10", **LEG_DAY)
+    shapes = [{}, {"projection": "compact"}, {"fields": ["reps", "tempo"]}, {"summary": True}]
+    before = [read_day(db_session, user_id, "2024-01-10", **shape) for shape in shapes]
+
+    assert archive_workouts(db_session, date(2024, 3, 1)) >= 1
+
+    hot_rows = db_session.execute(
+        select(func.count())
+        .select_from(WorkoutExercise)
+        .join(Workout)
+        .where(Workout.user_id == user_id, Workout.workout_date == date(2024, 1, 10))
+    ).scalar_one()
+    db_session.commit()
+    assert hot_rows == 0
+
+    for shape, expected in zip(shapes, before):
+        after = read_day(db_session, user_id, "2024-01-10", **shape)
+        assert by_exercise(after) == by_exercise(expected)
+        assert {k: v for k, v in after["workout"].items() if k != "exercises"} == {
+            k: v for k, v in expected["workout"].items() if k != "exercises"
+        }
+
+    recent = read_day(db_session, user_id, "2024-06-10")
+    assert len(recent["workout"]["exercises"]) == 2
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_append_to_archived_day_is_merged_on_read(db_session, ingest_day, backend):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-10", **LEG_DAY)
+    archive_workouts(db_session, date(2024, 3, 1))
+
+    result = ingest_day(db_session, user_id, "2024-01-10", backend=backend, **LEG_DAY)
+    assert result["appended_to_existing"] is True
+
+    merged = read_day(db_session, user_id, "2024-01-10")
+    workout = merged["workout"]
+    assert len(workout["exercises"]) == 4
+    assert sum(len(ex["sets"]) for ex in workout["exercises"]) == 6
+
+    # The next archiver run folds the appended rows into the existing packed document.
+    assert archive_workouts(db_session, date(2024, 3, 1)) == 1
+    packed = db_session.execute(
+        select(WorkoutArchive.exercises).join(Workout).where(Workout.user_id == user_id)
+    ).scalar_one()
+    hot_rows = db_session.execute(
+        select(func.count()).select_from(WorkoutExercise).join(Workout).where(Workout.user_id == user_id)
+    ).scalar_one()
+    db_session.commit()
+    assert len(packed) == 4
+    assert hot_rows == 0
+    assert by_exercise(read_day(db_session, user_id, "2024-01-10")) == by_exercise(merged)
+
+
+def test_exercise_without_sets_summarizes_to_zero(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-12", exercises=[{"display_name": "Plank", "sets": [{"reps": 1}]}])
+    db_session.execute(delete(WorkoutSet).where(WorkoutSet.user_id == user_id))
+    db_session.commit()
+    empty = {"sets": 0, "total_reps": 0, "top_set": {"weight_kg": None, "reps": None}, "tonnage_kg": 0}
+
+    (hot,) = read_day(db_session, user_id, "2024-01-12", summary=True)["workout"]["exercises"]
+    assert hot["summary"] == empty
+    archived = shape_archived_exercise({**hot, "sets": []}, SET_PROJECTIONS["full"], summary=True)
+    assert archived == hot
+
+def test_export_includes_archived_days(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-10", **LEG_DAY)
+    ingest_day(db_session, user_id, "2024-06-10", **LEG_DAY)
+    archive_workouts(db_session, date(2024, 3, 1))
+
+    workouts = list(iter_workouts(db_session, WorkoutExportRequest(user_id=user_id)))
+
+    assert [w["workout_date"] for w in workouts] == ["2024-01-10", "2024-06-10"]
+    assert [len(w["exercises"]) for w in workouts] == [2, 2]
+    assert workouts[0]["exercises"][0]["sets"][0]["workout_set_id"]
+
+
+def test_archived_timestamps_match_hot_formatting():
+    packed = {
+        "workout_exercise_id": "we",
+        "exercise_id": "ex",
+        "display_name": "Row",
+        "canonical_name": "row",
+        "notes": None,
+        "sets": [{"set_index": 0, "reps": 5, "logged_at": "2024-01-10T10:00:00.56005+00:00"}],
+    }
+
+    shaped = shape_archived_exercise(packed, ("reps", "logged_at"))
+
+    assert shaped["sets"] == [{"reps": 5, "logged_at": "2024-01-10T10:00:00.560050+00:00"}]
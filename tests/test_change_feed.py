@@ -0,0 +1,62 @@
+import uuid
+from datetime import date
+
+import pytest
+
+from src.service import ingest_workout as ingest_module
+from src.service.archive_workouts import archive_workouts
+from src.service.change_feed import get_changes_since
+
+
+def changes(session, user_id: uuid.UUID, cursor: int = 0, limit: int = 100):
+    return get_changes_since(session, {"user_id": str(user_id), "cursor": cursor, "limit": limit})
+
+
+def test_changes_page_through_history_by_cursor(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    for day in ("2024-09-01", "2024-09-02", "2024-09-03"):
+        ingest_day(db_session, user_id, day)
+    ingest_day(db_session, uuid.uuid4(), "2024-09-02")
+
+    first = changes(db_session, user_id, limit=2)
+    assert [w["workout_date"] for w in first["changes"]] == ["2024-09-01", "2024-09-02"]
+    assert first["has_more"] is True
+
+    second = changes(db_session, user_id, cursor=first["cursor"], limit=2)
+    assert [w["workout_date"] for w in second["changes"]] == ["2024-09-03"]
+    assert second["has_more"] is False
+
+    caught_up = changes(db_session, user_id, cursor=second["cursor"])
+    assert caught_up == {"changes": [], "cursor": second["cursor"], "has_more": False}
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_append_moves_workout_to_end_of_feed(db_session, ingest_day, backend):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-01", backend=backend)
+    ingest_day(db_session, user_id, "2024-09-02", backend=backend, idempotency_key="a")
+    cursor = changes(db_session, user_id)["cursor"]
+
+    ingest_day(db_session, user_id, "2024-09-01", backend=backend, sets=[{"reps": 3}])
+    # A replayed request writes nothing, so it must not show up as a change.
+    ingest_day(db_session, user_id, "2024-09-02", backend=backend, idempotency_key="a")
+
+    delta = changes(db_session, user_id, cursor=cursor)
+    assert [w["workout_date"] for w in delta["changes"]] == ["2024-09-01"]
+    assert sorted(
+        [s["reps"] for s in ex["sets"]] for ex in delta["changes"][0]["exercises"]
+    ) == [[3], [5]]
+    assert delta["cursor"] > cursor
+
+
+def test_archived_workouts_are_returned_whole(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-05", sets=[{"reps": 5}] * 2)
+    archive_workouts(db_session, before=date(2024, 2, 1))
+    cursor = changes(db_session, user_id)["cursor"]
+
+    ingest_day(db_session, user_id, "2024-01-05", sets=[{"reps": 1}])
+
+    (workout,) = changes(db_session, user_id, cursor=cursor)["changes"]
+    # Archived exercises come first, then those appended since.
+    assert [[s["reps"] for s in ex["sets"]] for ex in workout["exercises"]] == [[5, 5], [1]]
@@ -0,0 +1,106 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from src.db.models import Exercise, ExerciseAlias
+from src.service import ingest_workout as ingest_module
+from src.service import last_performance as last_performance_module
+from src.service.exercise_catalog import AliasResolver
+from src.service.ingest_workout import get_workout_for_day, ingest_workout
+from src.service.last_performance import get_last_performance
+
+
+@pytest.fixture
+def loaded_catalog(db_session, monkeypatch):
+    resolver = AliasResolver()
+    assert resolver.load(db_session)
+    monkeypatch.setattr(ingest_module, "catalog", resolver)
+    monkeypatch.setattr(last_performance_module, "catalog", resolver)
+    return resolver
+
+
+def test_aliases_resolve_to_catalog_exercises(loaded_catalog):
+    bench = loaded_catalog.resolve("Bench Press")
+
+    assert bench is not None and bench.muscle_group == "chest"
+    assert loaded_catalog.resolve("BP") == bench
+    assert loaded_catalog.resolve("Bench press (barbell)") == bench
+    assert loaded_catalog.resolve("flat bench") == bench
+    assert loaded_catalog.resolve("underwater basket weaving") is None
+
+
+def test_reload_picks_up_catalog_changes_atomically(db_session, loaded_catalog):
+    before = loaded_catalog.fingerprint
+    assert loaded_catalog.load(db_session) is False
+
+    squat = loaded_catalog.resolve("squat")
+    db_session.add(ExerciseAlias(alias="high bar squat", exercise_id=squat.exercise_id))
+    db_session.flush()
+    db_session.commit()
+
+    assert loaded_catalog.load(db_session) is True
+    assert loaded_catalog.fingerprint != before
+    assert loaded_catalog.resolve("High-bar squat") == squat
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_ingest_maps_aliases_to_catalog_ids(db_session, loaded_catalog, backend):
+    user_id = uuid.uuid4()
+    ingest_workout(
+        db_session,
+        {
+            "user_id": str(user_id),
+            "workout": {"started_at": "2024-09-01T10:00:00Z"},
+            "exercises": [
+                {"display_name": "OHP", "sets": [{"reps": 5}]},
+                {"display_name": "Cable Fly", "sets": [{"reps": 12}]},
+            ],
+        },
+        backend=backend,
+    )
+
+    workout = get_workout_for_day(db_session, {"user_id": str(user_id), "workout_date": "2024-09-01"})
+    exercises = {ex["canonical_name"]: ex for ex in workout["workout"]["exercises"]}
+    assert exercises["overhead press"]["exercise_id"] == str(loaded_catalog.resolve("ohp").exercise_id)
+    assert "cable fly" in exercises
+
+    own = db_session.execute(
+        select(func.count()).select_from(Exercise).where(Exercise.owner_user_id == user_id)
+    ).scalar_one()
+    assert own == 1
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_own_exercise_shadows_catalog_exercise_of_same_name(db_session, monkeypatch, backend):
+    user_id = uuid.uuid4()
+
+    def ingest(day: str, name: str):
+        ingest_workout(
+            db_session,
+            {
+                "user_id": str(user_id),
+                "workout": {"started_at": f"{day}T10:00:00Z"},
+                "exercises": [{"display_name": name, "sets": [{"reps": 5}]}],
+            },
+            backend=backend,
+        )
+
+    # Logged before the catalog was loaded: the user owns "bench press".
+    monkeypatch.setattr(ingest_module, "catalog", AliasResolver())
+    ingest("2024-09-01", "Bench Press")
+    own_id = db_session.execute(
+        select(Exercise.id).where(Exercise.owner_user_id == user_id)
+    ).scalar_one()
+    db_session.commit()
+
+    resolver = AliasResolver()
+    assert resolver.load(db_session)
+    monkeypatch.setattr(ingest_module, "catalog", resolver)
+    monkeypatch.setattr(last_performance_module, "catalog", resolver)
+    ingest("2024-09-03", "Bench Press")
+    ingest("2024-09-05", "BP")
+
+    last = get_last_performance(db_session, {"user_id": str(user_id), "exercise": "bp", "n": 5})
+    assert last["exercise"]["exercise_id"] == str(own_id)
+    assert [s["workout_date"] for s in last["sessions"]] == ["2024-09-05", "2024-09-03", "2024-09-01"]
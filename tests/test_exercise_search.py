@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from src.db.models import Exercise
+from src.domain.normalize import trigram_similarity
+from src.service import exercise_search
+from src.service import ingest_workout as ingest_module
+from src.service.exercise_search import search_exercises
+
+
+def test_trigram_similarity_matches_pg_trgm():
+    # Reference value from the pg_trgm documentation.
+    assert trigram_similarity("word", "two words") == pytest.approx(0.363636, abs=1e-6)
+    assert trigram_similarity("Bench Press", "bench press") == 1.0
+    assert trigram_similarity("squat", "") == 0.0
+
+
+def test_search_ranks_closest_exercise_first(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(
+        db_session,
+        user_id,
+        exercises=[
+            {"display_name": name, "sets": [{"reps": 5}]}
+            for name in ("Bench Press", "Incline Bench Press", "Back Squat")
+        ],
+    )
+    ingest_day(db_session, uuid.uuid4(), exercise="Bench Press")
+
+    result = search_exercises(db_session, {"user_id": str(user_id), "query": "bench pres"})
+
+    names = [match["canonical_name"] for match in result["exercises"]]
+    assert names == ["bench press", "incline bench press"]
+    assert result["exercises"][0]["scope"] == "user"
+    assert result["exercises"][0]["similarity"] > result["exercises"][1]["similarity"]
+
+
+def test_search_includes_global_catalog_exercises(db_session):
+    result = search_exercises(db_session, {"user_id": str(uuid.uuid4()), "query": "deadlift"})
+
+    top = result["exercises"][0]
+    assert (top["canonical_name"], top["scope"], top["muscle_group"]) == ("deadlift", "global", "back")
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_fuzzy_match_mode_reuses_similar_exercise(db_session, ingest_day, monkeypatch, backend):
+    monkeypatch.setattr(exercise_search, "EXERCISE_MATCH_MODE", "fuzzy")
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-01", exercise="Bench Press")
+
+    ingest_day(
+        db_session,
+        user_id,
+        "2024-09-02",
+        backend=backend,
+        exercises=[
+            {"display_name": "Bench press (barbell)", "sets": [{"reps": 5}]},
+            {"display_name": "Deadlift", "sets": [{"reps": 3}]},
+        ],
+    )
+
+    names = db_session.execute(
+        select(Exercise.canonical_name).where(Exercise.owner_user_id == user_id).order_by(Exercise.canonical_name)
+    ).scalars().all()
+    assert names == ["bench press", "deadlift"]
+
+
+def test_exact_match_mode_keeps_variants_separate(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-01", exercise="Bench Press")
+    ingest_day(db_session, user_id, "2024-09-02", exercise="Bench press (barbell)")
+
+    count = db_session.execute(
+        select(func.count()).select_from(Exercise).where(Exercise.owner_user_id == user_id)
+    ).scalar_one()
+    assert count == 2
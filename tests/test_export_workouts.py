@@ -0,0 +1,95 @@
+import gzip
+import json
+import uuid
+from datetime import date
+
+import pytest
+from starlette.testclient import TestClient
+
+from src.domain.payloads import WorkoutExportRequest
+from src.mcp_server import mcp
+from src.service.archive_workouts import archive_workouts
+from src.service.export_workouts import accepts_gzip, gzip_chunks, iter_ndjson_chunks, iter_workouts
+
+
+def test_export_streams_workouts_in_date_range(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-01")
+    ingest_day(db_session, user_id, "2024-09-03", sets=[{"reps": 5}, {"reps": 3}])
+    ingest_day(db_session, user_id, "2024-09-05", sets=[{"reps": 1}])
+    ingest_day(db_session, uuid.uuid4(), "2024-09-03", sets=[{"reps": 8}])
+
+    request = WorkoutExportRequest.model_validate(
+        {"user_id": str(user_id), "from": "2024-09-02", "to": "2024-09-05"}
+    )
+    workouts = list(iter_workouts(db_session, request, batch_size=1))
+
+    assert [w["workout_date"] for w in workouts] == ["2024-09-03", "2024-09-05"]
+    assert [s["reps"] for s in workouts[0]["exercises"][0]["sets"]] == [5, 3]
+    assert workouts[0]["exercises"][0]["display_name"] == "Squat"
+
+
+def test_export_attaches_archive_documents_per_batch(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-05", sets=[{"reps": 5}, {"reps": 4}])
+    ingest_day(db_session, user_id, "2024-01-06", sets=[{"reps": 3}])
+    archive_workouts(db_session, before=date(2024, 2, 1))
+    ingest_day(db_session, user_id, "2024-01-06", sets=[{"reps": 2}])
+    ingest_day(db_session, user_id, "2024-09-01", sets=[{"reps": 1}])
+
+    request = WorkoutExportRequest.model_validate({"user_id": str(user_id)})
+    for batch_size in (1, 2, 500):
+        workouts = list(iter_workouts(db_session, request, batch_size=batch_size))
+        assert [[[s["reps"] for s in ex["sets"]] for ex in w["exercises"]] for w in workouts] == [
+            [[5, 4]],
+            [[3], [2]],
+            [[1]],
+        ]
+
+
+def test_ndjson_chunks_round_trip_through_gzip():
+    workouts = [{"workout_date": f"2024-09-{day:02d}", "exercises": []} for day in range(1, 21)]
+
+    chunks = list(iter_ndjson_chunks(workouts, chunk_bytes=128))
+    assert len(chunks) > 1
+
+    body = gzip.decompress(b"".join(gzip_chunks(iter(chunks))))
+    lines = body.decode().splitlines()
+    assert [json.loads(line) for line in lines] == workouts
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("gzip", True),
+        ("deflate, GZIP;q=0.5", True),
+        ("br;q=1.0, gzip; q=0.001", True),
+        ("x-gzip", True),
+        ("*", True),
+        ("", False),
+        ("gzip;q=0", False),
+        ("gzip;q=0.000, br", False),
+        ("x-gzip-ish, br", False),
+        ("*;q=0", False),
+        ("gzip;q=0, *", False),
+        ("identity;q=0, *;q=0.1", True),
+        ("gzip;q=nonsense", False),
+    ],
+)
+def test_accepts_gzip_honours_q_values(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_export_request_rejects_inverted_range():
+    with pytest.raises(ValueError):
+        WorkoutExportRequest.model_validate(
+            {"user_id": str(uuid.uuid4()), "from": "2024-09-05", "to": "2024-09-01"}
+        )
+
+
+def test_export_route_requires_bearer_token():
+    with TestClient(mcp.streamable_http_app()) as client:
+        response = client.get("/export/workouts", params={"user_id": str(uuid.uuid4())})
+
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"].startswith("Bearer")
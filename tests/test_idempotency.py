@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, select
+
+from src.db.models import IdempotencyResponse, WorkoutSet
+from src.service.idempotency import purge_expired_responses
+from src.service.ingest_workout import ingest_workout
+
+
+def build_payload(user_id: uuid.UUID, idempotency_key: str, started_at: str):
+    return {
+        "user_id": str(user_id),
+        "idempotency_key": idempotency_key,
+        "workout": {"started_at": started_at},
+        "exercises": [{"display_name": "Squat", "sets": [{"reps": 5}, {"reps": 5}, {"reps": 5}]}],
+    }
+
+
+def test_replay_of_append_returns_original_counts(db_session):
+    user_id = uuid.uuid4()
+    ingest_workout(db_session, build_payload(user_id, "first", "2024-09-12T07:00:00Z"))
+    appended = ingest_workout(db_session, build_payload(user_id, "second", "2024-09-12T09:00:00Z"))
+
+    replay = ingest_workout(db_session, build_payload(user_id, "second", "2024-09-12T09:00:00Z"))
+
+    assert replay["idempotent_replay"] is True
+    assert replay["appended_to_existing"] is True
+    assert replay["written_sets"] == appended["written_sets"] == 3
+    sets = db_session.execute(select(func.count()).select_from(WorkoutSet)).scalar_one()
+    assert sets == 6
+
+
+def test_cached_replay_issues_no_queries(db_session):
+    user_id = uuid.uuid4()
+    payload = build_payload(user_id, "cached", "2024-09-13T07:00:00Z")
+    ingest_workout(db_session, payload)
+
+    statements = []
+    connection = db_session.bind
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(connection, "before_cursor_execute", listener)
+    try:
+        replay = ingest_workout(db_session, payload)
+    finally:
+        event.remove(connection, "before_cursor_execute", listener)
+
+    assert replay["idempotent_replay"] is True
+    assert statements == []
+
+
+def test_purge_removes_only_expired_responses(db_session):
+    user_id = uuid.uuid4()
+    ingest_workout(db_session, build_payload(user_id, "fresh", "2024-09-14T07:00:00Z"))
+    ingest_workout(db_session, build_payload(user_id, "stale", "2024-09-15T07:00:00Z"))
+    with db_session.begin():
+        stale = db_session.get(IdempotencyResponse, (user_id, "stale"))
+        stale.expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    assert purge_expired_responses(db_session) >= 1
+
+    remaining = db_session.execute(
+        select(IdempotencyResponse.idempotency_key).where(IdempotencyResponse.user_id == user_id)
+    ).scalars().all()
+    assert remaining == ["fresh"]
@@ -0,0 +1,114 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from src.db.models import AppUser, Workout, WorkoutExercise, WorkoutSet
+from src.service import ingest_workout as ingest_module
+from src.service.ingest_workout import ingest_workout
+
+WRITERS = 8
+INGESTS_PER_WRITER = 10
+
+
+def build_payload(user_id: uuid.UUID, idempotency_key: str, started_at: str):
+    return {
+        "user_id": str(user_id),
+        "idempotency_key": idempotency_key,
+        "workout": {"started_at": started_at},
+        "exercises": [
+            {"display_name": "Bench Press", "sets": [{"reps": 5}, {"reps": 5}]}
+        ],
+    }
+
+
+@pytest.fixture
+def committed_users(engine):
+    user_ids: list[uuid.UUID] = []
+    yield user_ids
+    with Session(engine) as session, session.begin():
+        session.execute(delete(AppUser).where(AppUser.id.in_(user_ids)))
+
+
+@pytest.mark.parametrize("lock_mode", ingest_module.INGEST_LOCK_MODES)
+def test_concurrent_same_day_appends_lose_no_sets(engine, committed_users, monkeypatch, lock_mode):
+    monkeypatch.setattr(ingest_module, "INGEST_LOCK_MODE", lock_mode)
+    user_id = uuid.uuid4()
+    committed_users.append(user_id)
+    started_at = "2024-09-10T07:00:00Z"
+
+    # Create the user and exercise up front so only the per-day workout row is contended.
+    with Session(engine) as session:
+        ingest_workout(session, build_payload(user_id, "seed", started_at))
+
+    def writer(index: int) -> list[dict]:
+        results = []
+        with Session(engine) as session:
+            for attempt in range(INGESTS_PER_WRITER):
+                key = f"writer-{index}-{attempt}"
+                results.append(ingest_workout(session, build_payload(user_id, key, started_at)))
+        return results
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        results = [r for batch in pool.map(writer, range(WRITERS)) for r in batch]
+
+    assert all(result["appended_to_existing"] for result in results)
+    assert len({result["workout_id"] for result in results}) == 1
+
+    with Session(engine) as session:
+        workouts = session.execute(
+            select(func.count()).select_from(Workout).where(Workout.user_id == user_id)
+        ).scalar_one()
+        sets = session.execute(
+            select(func.count())
+            .select_from(WorkoutSet)
+            .join(WorkoutExercise)
+            .join(Workout)
+            .where(Workout.user_id == user_id)
+        ).scalar_one()
+
+    assert workouts == 1
+    assert sets == 2 * (WRITERS * INGESTS_PER_WRITER + 1)
+
+
+def test_advisory_lock_serializes_duplicate_idempotency_keys(engine, committed_users, monkeypatch):
+    monkeypatch.setattr(ingest_module, "INGEST_LOCK_MODE", "advisory")
+    user_id = uuid.uuid4()
+    committed_users.append(user_id)
+    payload = build_payload(user_id, "retry-storm", "2024-09-11T07:00:00Z")
+    with Session(engine) as session:
+        ingest_workout(session, build_payload(user_id, "seed", "2024-09-10T06:00:00Z"))
+
+    def writer(_: int) -> dict:
+        with Session(engine) as session:
+            return ingest_workout(session, payload)
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        results = list(pool.map(writer, range(WRITERS)))
+
+    assert sum(1 for result in results if not result["idempotent_replay"]) == 1
+    assert len({result["workout_id"] for result in results}) == 1
+
+
+@pytest.mark.parametrize("lock_mode", ingest_module.INGEST_LOCK_MODES)
+def test_concurrent_appends_with_one_key_write_once(engine, committed_users, monkeypatch, lock_mode):
+    monkeypatch.setattr(ingest_module, "INGEST_LOCK_MODE", lock_mode)
+    user_id = uuid.uuid4()
+    committed_users.append(user_id)
+    started_at = "2024-09-12T07:00:00Z"
+    # The day already exists, so the shared key only ever names an append.
+    with Session(engine) as session:
+        ingest_workout(session, build_payload(user_id, "seed", started_at))
+    payload = build_payload(user_id, "append-retry-storm", started_at)
+
+    def writer(_: int) -> dict:
+        with Session(engine) as session:
+            return ingest_workout(session, payload)
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        results = list(pool.map(writer, range(WRITERS)))
+
+    assert sum(1 for result in results if not result["idempotent_replay"]) == 1
+    assert {result["written_sets"] for result in results} == {2}
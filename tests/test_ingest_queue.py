@@ -0,0 +1,170 @@
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from src.db.models import AppUser, IngestQueueItem, WorkoutSet
+from src.service.ingest_queue import IngestWorkerPool, enqueue_workout, get_ingest_status, process_ingest_batch
+
+
+def build_payload(user_id: uuid.UUID, idempotency_key: str, reps: int = 5):
+    return {
+        "user_id": str(user_id),
+        "idempotency_key": idempotency_key,
+        "workout": {"started_at": "2024-09-07T10:00:00Z"},
+        "exercises": [{"display_name": "Row", "sets": [{"reps": reps}]}],
+    }
+
+
+def test_enqueue_returns_ticket_without_writing_workout(db_session):
+    user_id = uuid.uuid4()
+
+    ticket = enqueue_workout(db_session, build_payload(user_id, "queued-1"))
+
+    assert ticket["status"] == "pending"
+    status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": ticket["ticket"]})
+    assert status["status"] == "pending"
+    assert status["result"] is None
+    sets = db_session.execute(select(func.count()).select_from(WorkoutSet)).scalar_one()
+    assert sets == 0
+
+
+def test_worker_batch_preserves_per_day_order(db_session):
+    user_id = uuid.uuid4()
+    first = enqueue_workout(db_session, build_payload(user_id, "queued-a", reps=5))
+    second = enqueue_workout(db_session, build_payload(user_id, "queued-b", reps=3))
+
+    assert process_ingest_batch(db_session, batch_size=10) == 1
+    first_status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": first["ticket"]})
+    second_status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": second["ticket"]})
+    assert first_status["status"] == "done"
+    assert first_status["result"]["appended_to_existing"] is False
+    assert second_status["status"] == "pending"
+
+    assert process_ingest_batch(db_session, batch_size=10) == 1
+    second_status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": second["ticket"]})
+    assert second_status["status"] == "done"
+    assert second_status["result"]["appended_to_existing"] is True
+    assert second_status["result"]["workout_id"] == first_status["result"]["workout_id"]
+
+
+def test_invalid_queued_payload_is_marked_failed(db_session):
+    user_id = uuid.uuid4()
+    ticket = enqueue_workout(db_session, build_payload(user_id, "queued-bad"))
+    with db_session.begin():
+        item = db_session.execute(
+            select(IngestQueueItem).where(IngestQueueItem.ticket == uuid.UUID(ticket["ticket"]))
+        ).scalar_one()
+        item.payload = {**item.payload, "exercises": []}
+
+    process_ingest_batch(db_session, batch_size=10)
+
+    status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": ticket["ticket"]})
+    assert status["status"] == "failed"
+    assert "exercises" in status["error"]
+
+
+def test_unknown_ticket_is_not_found(db_session):
+    status = get_ingest_status(
+        db_session, {"user_id": str(uuid.uuid4()), "ticket": str(uuid.uuid4())}
+    )
+    assert status["status"] == "not_found"
+
+
+def test_item_for_moved_user_is_rerouted_without_failing_the_batch(db_session):
+    moved_user, other_user = uuid.uuid4(), uuid.uuid4()
+    moved = enqueue_workout(db_session, build_payload(moved_user, "queued-moved"))
+    other = enqueue_workout(db_session, build_payload(other_user, "queued-other"))
+    # The user was fenced after the enqueue, as when a move cuts over meanwhile.
+    with db_session.begin():
+        db_session.add(AppUser(id=moved_user, moved_to_shard="b"))
+    rerouted = []
+
+    claimed = process_ingest_batch(
+        db_session, batch_size=10, reroute=lambda item, shard: rerouted.append((str(item.ticket), shard))
+    )
+
+    assert claimed == 2
+    assert rerouted == [(moved["ticket"], "b")]
+    moved_status = get_ingest_status(db_session, {"user_id": str(moved_user), "ticket": moved["ticket"]})
+    assert moved_status["status"] == "failed"
+    assert "moved to shard b" in moved_status["error"]
+    other_status = get_ingest_status(db_session, {"user_id": str(other_user), "ticket": other["ticket"]})
+    assert other_status["status"] == "done"
+
+
+def test_item_for_moved_user_fails_without_a_reroute(db_session):
+    user_id = uuid.uuid4()
+    ticket = enqueue_workout(db_session, build_payload(user_id, "queued-moved"))
+    with db_session.begin():
+        db_session.add(AppUser(id=user_id, moved_to_shard="b"))
+
+    process_ingest_batch(db_session, batch_size=10)
+
+    status = get_ingest_status(db_session, {"user_id": str(user_id), "ticket": ticket["ticket"]})
+    assert status["status"] == "failed"
+    assert "resubmit" in status["error"]
+
+
+def test_worker_survives_unexpected_errors(engine):
+    user_id = uuid.uuid4()
+    with Session(engine) as session:
+        ticket = enqueue_workout(session, build_payload(user_id, "queued-worker"))["ticket"]
+    calls = []
+
+    def session_factory():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            raise RuntimeError("transient failure outside the database")
+        return Session(engine)
+
+    pool = IngestWorkerPool(session_factory, workers=1, poll_interval=0.01)
+    pool.start()
+    try:
+        deadline = time.monotonic() + 10
+        status = "pending"
+        while status == "pending" and time.monotonic() < deadline:
+            time.sleep(0.02)
+            with Session(engine) as session:
+                status = get_ingest_status(session, {"user_id": str(user_id), "ticket": ticket})["status"]
+    finally:
+        pool.stop(timeout=5)
+        with Session(engine) as session, session.begin():
+            session.execute(delete(IngestQueueItem).where(IngestQueueItem.user_id == user_id))
+            session.execute(delete(AppUser).where(AppUser.id == user_id))
+
+    assert status == "done"
+    assert len(calls) >= 2
+
+
+def test_enqueue_wakes_every_idle_worker(engine):
+    user_id = uuid.uuid4()
+    calls = []
+
+    def session_factory():
+        calls.append(threading.current_thread().name)
+        return Session(engine)
+
+    def wait_for_both_workers():
+        deadline = time.monotonic() + 5
+        while len(set(calls)) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return set(calls)
+
+    # The poll interval outlasts the test, so only a wakeup gets a worker claiming again.
+    pool = IngestWorkerPool(session_factory, workers=2, poll_interval=60)
+    pool.start()
+    try:
+        assert len(wait_for_both_workers()) == 2
+        time.sleep(0.05)
+        calls.clear()
+        with Session(engine) as session:
+            enqueue_workout(session, build_payload(user_id, "wake-all"))
+        assert len(wait_for_both_workers()) == 2
+    finally:
+        pool.stop(timeout=5)
+        with Session(engine) as session, session.begin():
+            session.execute(delete(IngestQueueItem).where(IngestQueueItem.user_id == user_id))
+            session.execute(delete(AppUser).where(AppUser.id == user_id))
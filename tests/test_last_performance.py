@@ -0,0 +1,96 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from src.service.archive_workouts import archive_workouts
+from src.service.last_performance import _RECENT_EXERCISES, get_last_performance
+
+
+def squat_and_plank(weight: float, name: str = "Back Squat") -> list[dict]:
+    return [
+        {"display_name": name, "sets": [{"reps": 5, "weight": {"value": weight, "unit": "kg"}}] * 2},
+        {"display_name": "Plank", "sets": [{"reps": 1}]},
+    ]
+
+
+def last(session, user_id: uuid.UUID, **options):
+    return get_last_performance(session, {"user_id": str(user_id), **options})
+
+
+def test_returns_the_last_n_sessions_newest_first(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    for day, weight in [("2024-04-01", 100), ("2024-04-03", 105), ("2024-04-05", 110), ("2024-04-08", 112.5)]:
+        ingest_day(db_session, user_id, day, exercises=squat_and_plank(weight))
+    ingest_day(db_session, uuid.uuid4(), "2024-04-09", exercises=squat_and_plank(60))
+
+    result = last(db_session, user_id, exercise="  back SQUAT ", n=3, fields=["reps", "weight_kg"])
+
+    assert result["exercise"]["canonical_name"] == "back squat"
+    assert [s["workout_date"] for s in result["sessions"]] == ["2024-04-08", "2024-04-05", "2024-04-03"]
+    assert result["sessions"][0]["exercises"][0]["sets"] == [{"reps": 5, "weight_kg": 112.5}] * 2
+
+    by_id = last(db_session, user_id, exercise_id=result["exercise"]["exercise_id"], n=10)
+    assert [s["workout_date"] for s in by_id["sessions"]] == ["2024-04-08", "2024-04-05", "2024-04-03", "2024-04-01"]
+
+
+def test_archived_sessions_fill_up_the_history(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-02", exercises=squat_and_plank(90))
+    ingest_day(db_session, user_id, "2024-01-09", exercises=squat_and_plank(95, name="Front Squat"))
+    ingest_day(db_session, user_id, "2024-01-16", exercises=squat_and_plank(97.5))
+    archive_workouts(db_session, date(2024, 2, 1))
+    ingest_day(db_session, user_id, "2024-03-01", exercises=squat_and_plank(100))
+
+    result = last(db_session, user_id, exercise="back squat", n=3, projection="minimal")
+
+    assert [s["workout_date"] for s in result["sessions"]] == ["2024-03-01", "2024-01-16", "2024-01-02"]
+    assert result["sessions"][1]["exercises"][0]["sets"] == [{"reps": 5, "weight_kg": 97.5}] * 2
+
+
+def test_unknown_or_foreign_exercise_finds_nothing(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-04-01", exercises=squat_and_plank(100))
+    own_exercise = last(db_session, user_id, exercise="back squat")["exercise"]["exercise_id"]
+
+    assert last(db_session, user_id, exercise="Zercher Squat") == {"exercise": None, "sessions": []}
+    assert last(db_session, uuid.uuid4(), exercise_id=own_exercise) == {"exercise": None, "sessions": []}
+    with pytest.raises(ValueError, match="exactly one"):
+        last(db_session, user_id)
+
+
+@pytest.mark.postgres
+def test_recent_sessions_are_a_top_n_index_scan(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-04-01", exercises=squat_and_plank(100))
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    compiled = _RECENT_EXERCISES.compile(dialect=db_session.get_bind().dialect)
+    params = compiled.construct_params({"user_id": user_id, "exercise_id": uuid.uuid4(), "n": 3})
+    plan = db_session.connection().exec_driver_sql(f"EXPLAIN {compiled}", params).scalars().all()
+    db_session.commit()
+
+    assert any("Index Only Scan using ix_workout_exercise_last_performance" in line for line in plan)
+    assert any("Limit" in line for line in plan)
+    assert not any("Sort" in line for line in plan)
+
+
+@pytest.mark.postgres
+def test_rows_from_writers_without_the_recency_columns_are_filled_in(db_session, ingest_day):
+    # What an instance on the release before 20250105_0015 inserts mid-deploy.
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-04-01", exercises=squat_and_plank(100))
+    workout_id, exercise_id = db_session.execute(
+        text("SELECT workout_id, exercise_id FROM workout_exercise WHERE user_id = :user_id LIMIT 1"),
+        {"user_id": user_id},
+    ).one()
+
+    filled = db_session.execute(
+        text(
+            "INSERT INTO workout_exercise (id, workout_id, exercise_id) "
+            "VALUES (:id, :workout_id, :exercise_id) RETURNING user_id, workout_date"
+        ),
+        {"id": uuid.uuid4(), "workout_id": workout_id, "exercise_id": exercise_id},
+    ).one()
+
+    assert tuple(filled) == (user_id, date(2024, 4, 1))
@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.db.online_migrations import (
+    add_constraint_not_valid,
+    backfill_in_batches,
+    create_index_concurrently,
+    execute_with_lock_retries,
+    set_not_null,
+    validate_constraint,
+)
+
+pytestmark = pytest.mark.postgres
+
+TABLE = "online_migration_fixture"
+
+
+@pytest.fixture
+def autocommit(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        connection.execute(
+            text(
+                f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, source integer NOT NULL, copied integer)"
+            )
+        )
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (id, source) SELECT n, n % 7 FROM generate_series(1, 1000) n")
+        )
+        yield connection
+        connection.execute(text(f"DROP TABLE {TABLE}"))
+        connection.execute(text("DELETE FROM online_migration_progress WHERE name LIKE 'test:%'"))
+
+
+def backfill(connection, **options):
+    return backfill_in_batches(
+        connection,
+        TABLE,
+        set_sql="copied = source",
+        where_sql="copied IS NULL",
+        name="test:copy",
+        key_type="bigint",
+        batch_size=100,
+        max_batch_size=100,
+        pause_seconds=0,
+        progress=lambda progress: None,
+        **options,
+    )
+
+
+def remaining(connection) -> int:
+    return connection.execute(text(f"SELECT count(*) FROM {TABLE} WHERE copied IS NULL")).scalar_one()
+
+
+def test_backfill_resumes_from_checkpoint(autocommit):
+    first = backfill(autocommit, max_batches=3)
+    assert (first.rows_done, first.last_key, first.completed) == (300, "300", False)
+    assert remaining(autocommit) == 700
+
+    resumed = backfill(autocommit)
+    assert resumed.completed
+    assert resumed.rows_done == 1000
+    assert resumed.batches == 7
+    assert remaining(autocommit) == 0
+
+    again = backfill(autocommit)
+    assert again.completed and again.batches == 0
+
+
+def test_invalid_concurrent_index_is_rebuilt(autocommit):
+    with pytest.raises(IntegrityError):
+        create_index_concurrently(autocommit, "ix_online_fixture_source", TABLE, "source", unique=True)
+    assert autocommit.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = 'ix_online_fixture_source'::regclass")
+    ).scalar_one() is False
+
+    autocommit.execute(text(f"UPDATE {TABLE} SET source = id"))
+    create_index_concurrently(autocommit, "ix_online_fixture_source", TABLE, "source", unique=True)
+
+    assert autocommit.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = 'ix_online_fixture_source'::regclass")
+    ).scalar_one() is True
+
+
+def test_constraints_are_added_then_validated(autocommit):
+    add_constraint_not_valid(autocommit, TABLE, "ck_online_fixture_source", "CHECK (source < 7)")
+    validate_constraint(autocommit, TABLE, "ck_online_fixture_source")
+    backfill(autocommit)
+    set_not_null(autocommit, TABLE, "copied")
+
+    nullable = autocommit.execute(
+        text(
+            "SELECT is_nullable FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name = 'copied'"
+        ),
+        {"table": TABLE},
+    ).scalar_one()
+    assert nullable == "NO"
+    assert autocommit.execute(
+        text(f"SELECT count(*) FROM pg_constraint WHERE conname = '{TABLE}_copied_not_null'")
+    ).scalar_one() == 0
+
+
+def test_ddl_gives_up_on_locks_instead_of_queueing(engine, autocommit):
+    with engine.connect() as reader:
+        reader.execute(text(f"SELECT count(*) FROM {TABLE}"))
+        with pytest.raises(OperationalError):
+            execute_with_lock_retries(
+                autocommit, f"ALTER TABLE {TABLE} ADD COLUMN extra integer", retries=1, timeout="50ms"
+            )
+        reader.rollback()
+
+    execute_with_lock_retries(autocommit, f"ALTER TABLE {TABLE} ADD COLUMN extra integer")
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import pstats
+import time
+import uuid
+
+import pytest
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from src import mcp_server
+from src.service.profiling import ProfileStore, ToolProfiler
+
+
+def busy_wait(seconds: float) -> str:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return "done"
+
+
+def test_store_keeps_only_the_newest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=2)
+    names = [store.save("get_workout_for_day", "sample", 0.012, f"a;b {i}\n".encode()) for i in range(3)]
+
+    listed = store.list()
+
+    assert [entry["name"] for entry in listed] == names[:0:-1]
+    assert listed[0]["tool"] == "get_workout_for_day"
+    assert listed[0]["elapsed_ms"] == 12
+    assert store.path_for(names[0]) is None
+    assert store.path_for("../../etc/passwd") is None
+
+
+def test_sampler_records_collapsed_stacks_of_the_call(tmp_path):
+    profiler = ToolProfiler(ProfileStore(str(tmp_path)), interval=0.001)
+
+    assert profiler.run("sample", "busy", lambda: busy_wait(0.1)) == "done"
+
+    (entry,) = profiler.store.list()
+    stacks = profiler.store.path_for(entry["name"]).read_text().splitlines()
+    assert stacks
+    top_stack, count = stacks[0].rsplit(" ", 1)
+    assert top_stack.split(";")[0].endswith("<lambda>")
+    assert "test_profiling:busy_wait" in top_stack
+    assert int(count) > 0
+
+
+def test_cprofile_mode_saves_stats_even_when_the_call_fails(tmp_path):
+    profiler = ToolProfiler(ProfileStore(str(tmp_path)))
+
+    def failing():
+        busy_wait(0.01)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        profiler.run("cprofile", "failing", failing)
+
+    (entry,) = profiler.store.list()
+    stats = pstats.Stats(str(profiler.store.path_for(entry["name"])))
+    assert any(function == "busy_wait" for _, _, function in stats.stats)
+
+
+def test_sampled_tool_calls_are_profiled(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(mcp_server, "profiler", ToolProfiler(ProfileStore(str(tmp_path)), sample_rate=1))
+    asyncio.run(
+        mcp_server.mcp.call_tool(
+            "search_exercises", {"payload": {"user_id": str(uuid.uuid4()), "query": "zercher"}}
+        )
+    )
+
+    assert [entry["tool"] for entry in mcp_server.profiler.store.list()] == ["search_exercises"]
+
+
+def test_admin_routes_list_and_download_profiles(tmp_path, monkeypatch):
+    profiler = ToolProfiler(ProfileStore(str(tmp_path)))
+    name = profiler.store.save("get_workout_for_day", "sample", 0.2, b"a;b 3\n")
+    monkeypatch.setattr(mcp_server, "profiler", profiler)
+    monkeypatch.setattr(mcp_server.token_verifier, "api_keys", {"admin-key", "user-key"})
+    digest = hashlib.sha256(b"admin-key").hexdigest()[:16]
+    monkeypatch.setattr(mcp_server, "ADMIN_PRINCIPALS", {f"api-key:{digest}"})
+
+    # Without the lifespan: these routes do not need the MCP session manager.
+    client = TestClient(mcp_server.mcp.streamable_http_app())
+    assert client.get("/admin/profiles").status_code == 401
+    user = client.get("/admin/profiles", headers={"Authorization": "Bearer user-key"})
+    assert user.status_code == 403
+
+    admin = {"Authorization": "Bearer admin-key"}
+    listing = client.get("/admin/profiles", headers=admin).json()
+    download = client.get(f"/admin/profiles/{name}", headers=admin)
+    missing = client.get("/admin/profiles/nope.collapsed", headers=admin)
+
+    assert [entry["name"] for entry in listing["profiles"]] == [name]
+    assert download.status_code == 200
+    assert download.text == "a;b 3\n"
+    assert missing.status_code == 404
+
+
+def test_profile_header_is_honoured_for_admins_only(monkeypatch):
+    monkeypatch.setattr(mcp_server, "ADMIN_PRINCIPALS", {"ops@example.com"})
+    request = Request({"type": "http", "headers": [(b"x-profile", b"cprofile")]})
+
+    assert mcp_server.requested_profile_mode(request, "ops@example.com") == "cprofile"
+    assert mcp_server.requested_profile_mode(request, "someone@example.com") is None
+    assert ToolProfiler(ProfileStore(), mode="sample").choose_mode("1") == "sample"
+    assert ToolProfiler(ProfileStore(), sample_rate=0).choose_mode(None) is None
@@ -0,0 +1,276 @@
+"""Plan regression tests: every statement the services issue must reach large tables
+through an index.
+
+The module loads a synthetic history, runs each service entry point once while
+recording the SQL it sends, and then asks Postgres for the plan of every recorded
+statement. Statements inside the plpgsql ingest function are not visible here; its
+queries mirror the ORM backend's.
+"""
+
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.domain.payloads import WorkoutExportRequest
+from src.service.archive_workouts import archive_workouts
+from src.service.change_feed import get_changes_since
+from src.service.exercise_search import search_exercises
+from src.service.export_workouts import iter_workouts
+from src.service.idempotency import purge_expired_responses
+from src.service.ingest_queue import enqueue_workout, get_ingest_status, process_ingest_batch
+from src.service.ingest_workout import get_workout_for_day, ingest_workout
+from src.service.last_performance import get_last_performance
+from src.service.workout_calendar import get_workout_calendar
+from src.service.workout_search import search_workouts
+
+pytestmark = pytest.mark.postgres
+
+USERS = 100
+DAYS = 30
+EXERCISES = 4
+SETS = 4
+# Global catalog exercises on top of the shipped ones: enough that search_exercises
+# narrows candidates through the trigram index rather than reading the catalog.
+CATALOG = 500
+START = date(2024, 1, 1)
+# Tables estimated below this many rows may be read whole; a sequential scan is the
+# cheapest plan for them.
+LARGE_TABLE_ROWS = 1000
+
+GENERATE_SQL = [
+    "CREATE TEMP TABLE plan_user ON COMMIT DROP AS "
+    "SELECT gen_random_uuid() AS id FROM generate_series(1, :users)",
+    "INSERT INTO app_user (id) SELECT id FROM plan_user",
+    "INSERT INTO exercise (id, owner_user_id, canonical_name, display_name) "
+    "SELECT gen_random_uuid(), u.id, 'synthetic ' || e, 'Synthetic ' || e "
+    "FROM plan_user u, generate_series(1, :exercises) e",
+    "INSERT INTO exercise (id, canonical_name, display_name) "
+    "SELECT gen_random_uuid(), 'catalog movement ' || c, 'Catalog movement ' || c "
+    "FROM generate_series(1, :catalog) c",
+    "INSERT INTO workout (id, user_id, workout_date, started_at, title, idempotency_key, "
+    "exercise_count, set_count) "
+    "SELECT gen_random_uuid(), u.id, CAST(:start AS date) + d, CAST(:start AS date) + d, "
+    "'synthetic', 'plan-' || d, :exercises, :exercises * :sets "
+    "FROM plan_user u, generate_series(0, :days - 1) d",
+    "INSERT INTO workout_exercise (id, workout_id, exercise_id, user_id, workout_date) "
+    "SELECT gen_random_uuid(), w.id, ex.id, w.user_id, w.workout_date FROM plan_user u "
+    "JOIN workout w ON w.user_id = u.id JOIN exercise ex ON ex.owner_user_id = u.id",
+    "INSERT INTO workout_set (id, workout_exercise_id, user_id, set_index, reps, weight_kg, rpe) "
+    "SELECT gen_random_uuid(), we.id, we.user_id, s, 5 + s, 60 + 2.5 * s, 7 FROM plan_user u "
+    "JOIN workout_exercise we ON we.user_id = u.id, generate_series(0, :sets - 1) s",
+    "INSERT INTO idempotency_response (user_id, idempotency_key, response, expires_at) "
+    "SELECT w.user_id, w.idempotency_key, '{}'::jsonb, now() + interval '1 day' "
+    "FROM workout w JOIN plan_user u ON u.id = w.user_id",
+    "INSERT INTO ingest_queue (ticket, user_id, workout_date, payload, status, attempts, processed_at) "
+    "SELECT gen_random_uuid(), w.user_id, w.workout_date, '{}'::jsonb, 'done', 1, w.started_at "
+    "FROM workout w JOIN plan_user u ON u.id = w.user_id",
+]
+
+LARGE_TABLES_SQL = text(
+    "SELECT relname FROM pg_class "
+    "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace AND reltuples >= :rows"
+)
+
+# Foreign keys whose columns are not the leading columns of some index: deleting or
+# updating a referenced row then scans the referencing table.
+UNINDEXED_FOREIGN_KEYS_SQL = text(
+    """
+    SELECT c.conrelid::regclass::text AS table_name, c.conname
+    FROM pg_constraint c
+    WHERE c.contype = 'f'
+      AND c.connamespace = 'public'::regnamespace
+      AND NOT EXISTS (
+          SELECT 1
+          FROM pg_index i
+          WHERE i.indrelid = c.conrelid
+            AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] @> c.conkey
+            AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] <@ c.conkey
+      )
+    ORDER BY 1, 2
+    """
+)
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# Indexes each step's plans must keep using; losing one is a plan regression even
+# when the replacement is not a sequential scan.
+EXPECTED_INDEXES = {
+    "get_workout_for_day": {"ix_workout_user_date", "ix_workout_exercise_workout"},
+    "get_workout_for_day summary": {"ix_workout_exercise_workout"},
+    "get_last_performance": {"ix_workout_exercise_last_performance"},
+    "get_workout_calendar": {"ix_workout_user_date"},
+    "search_exercises": {"ix_exercise_canonical_name_trgm"},
+    # The archive branch is not listed: nothing is archived yet when the workload searches.
+    "search_workouts": {
+        "ix_workout_user_notes_search",
+        "ix_workout_exercise_user_notes_search",
+        "ix_workout_set_user_notes_search",
+        "ix_workout_exercise_user_packed_notes",
+    },
+    "get_changes_since": {"ix_workout_user_change_seq", "ix_workout_exercise_workout"},
+    "export_workouts": {"ix_workout_exercise_workout"},
+    "get_ingest_status": {"uq_ingest_queue_ticket"},
+    "archive_workouts": {"ix_workout_unarchived_date", "ix_workout_exercise_workout"},
+}
+
+
+def ingest_payload(user_id: uuid.UUID, day: date, **extra) -> dict:
+    return {
+        "user_id": str(user_id),
+        "workout": {"started_at": f"{day.isoformat()}T07:00:00Z", "notes": "felt strong"},
+        "exercises": [
+            {"display_name": "Synthetic 1", "sets": [{"reps": 5, "weight": {"value": 100, "unit": "kg"}}] * 3},
+            {"display_name": "Plank", "sets": [{"reps": 1, "notes": "60 seconds"}]},
+        ],
+        **extra,
+    }
+
+
+def run_workload(session: Session, user_id: uuid.UUID, step):
+    """Call every service entry point once; ``step`` labels the statements that follow."""
+    last_day = START + timedelta(days=DAYS - 1)
+    new_day = START + timedelta(days=DAYS)
+
+    step("ingest_workout")
+    ingest_workout(session, ingest_payload(user_id, new_day, idempotency_key="plan-new"))
+    step("ingest_workout append")
+    ingest_workout(session, ingest_payload(user_id, last_day))
+    step("ingest_workout plpgsql")
+    ingest_workout(session, ingest_payload(user_id, new_day + timedelta(days=1)), backend="plpgsql")
+
+    step("get_workout_for_day")
+    get_workout_for_day(session, {"user_id": str(user_id), "workout_date": last_day.isoformat()})
+    step("get_workout_for_day summary")
+    get_workout_for_day(
+        session, {"user_id": str(user_id), "workout_date": last_day.isoformat(), "summary": True}
+    )
+    step("get_last_performance")
+    get_last_performance(session, {"user_id": str(user_id), "exercise": "synthetic 2", "n": 5})
+    step("get_workout_calendar")
+    # A week view: a slice of the user's days, not the whole history.
+    get_workout_calendar(
+        session,
+        {"user_id": str(user_id), "from": (last_day - timedelta(days=6)).isoformat(), "to": new_day.isoformat()},
+    )
+    step("search_exercises")
+    search_exercises(session, {"user_id": str(user_id), "query": "synthetic"})
+    step("search_workouts")
+    search_workouts(session, {"user_id": str(user_id), "query": "strong"})
+    step("get_changes_since")
+    get_changes_since(session, {"user_id": str(user_id), "cursor": 0, "limit": 5})
+    step("export_workouts")
+    request = WorkoutExportRequest.model_validate(
+        {"user_id": str(user_id), "from": (last_day - timedelta(days=6)).isoformat()}
+    )
+    list(iter_workouts(session, request))
+
+    step("enqueue_workout")
+    ticket = enqueue_workout(session, ingest_payload(user_id, new_day + timedelta(days=2)))["ticket"]
+    step("process_ingest_batch")
+    process_ingest_batch(session)
+    step("get_ingest_status")
+    get_ingest_status(session, {"user_id": str(user_id), "ticket": ticket})
+
+    step("purge_expired_responses")
+    purge_expired_responses(session)
+    step("archive_workouts")
+    # A small batch keeps it the sliver of the table a production batch is.
+    archive_workouts(session, START + timedelta(days=1), batch_size=5)
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def workload_plans(engine):
+    """``(large_tables, [(step, statement, plan), ...], unindexed_foreign_keys)``."""
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, future=True)
+    params = {
+        "users": USERS,
+        "days": DAYS,
+        "exercises": EXERCISES,
+        "sets": SETS,
+        "catalog": CATALOG,
+        "start": START,
+    }
+    for statement in GENERATE_SQL:
+        connection.execute(text(statement), params)
+    user_id = connection.execute(text("SELECT id FROM plan_user LIMIT 1")).scalar_one()
+    # Statistics read by the planner; sampled from this transaction's own rows.
+    connection.execute(text("ANALYZE"))
+
+    recorded = []
+    current = {"step": None}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINABLE):
+            # executemany passes a list; batched "insertmanyvalues" INSERTs pass one dict.
+            first = parameters[0] if isinstance(parameters, (list, tuple)) and parameters else parameters
+            recorded.append((current["step"], statement, first))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        run_workload(session, user_id, lambda name: current.update(step=name))
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+    driver = connection.exec_driver_sql
+    plans = [
+        (step, statement, driver(f"EXPLAIN (FORMAT JSON) {statement}", parameters or {}).scalar_one()[0])
+        for step, statement, parameters in recorded
+    ]
+    large_tables = set(connection.execute(LARGE_TABLES_SQL, {"rows": LARGE_TABLE_ROWS}).scalars())
+    unindexed = connection.execute(UNINDEXED_FOREIGN_KEYS_SQL).all()
+
+    yield large_tables, plans, unindexed
+
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+def test_hot_tables_count_as_large(workload_plans):
+    large_tables, plans, _ = workload_plans
+
+    assert {"workout", "workout_exercise", "workout_set", "idempotency_response", "ingest_queue"} <= large_tables
+    assert {step for step, _, _ in plans} >= set(EXPECTED_INDEXES)
+
+
+def test_no_sequential_scans_on_large_tables(workload_plans):
+    large_tables, plans, _ = workload_plans
+
+    scans = [
+        f"{step}: Seq Scan on {node['Relation Name']}\n    {' '.join(statement.split())[:200]}"
+        for step, statement, plan in plans
+        for node in plan_nodes(plan["Plan"])
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in large_tables
+    ]
+
+    assert not scans, "\n".join(scans)
+
+
+def test_hot_paths_keep_their_indexes(workload_plans):
+    _, plans, _ = workload_plans
+    used = {}
+    for step, _, plan in plans:
+        used.setdefault(step, set()).update(
+            node["Index Name"] for node in plan_nodes(plan["Plan"]) if "Index Name" in node
+        )
+
+    missing = {step: indexes - used.get(step, set()) for step, indexes in EXPECTED_INDEXES.items()}
+
+    assert not {step: indexes for step, indexes in missing.items() if indexes}
+
+
+def test_every_foreign_key_is_indexed(workload_plans):
+    _, _, unindexed = workload_plans
+
+    assert [tuple(row) for row in unindexed] == []
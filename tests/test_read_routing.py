@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import Session
+
+from src.db.models import AppUser
+from src.db.routing import ReadRouter, replica_lag_from_status
+from src.service import ingest_workout as ingest_module
+from src.service.ingest_workout import get_workout_for_day, ingest_workout
+
+# Replica lag comes from Postgres' WAL replay functions.
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def replica_engine(database_url):
+    # Without a real standby the primary database doubles as the "replica": the
+    # router only cares which engine it hands out and what the lag probe reports.
+    replica = create_engine(database_url, future=True)
+    yield replica
+    replica.dispose()
+
+
+def test_reads_use_replica_when_healthy(engine, replica_engine):
+    router = ReadRouter(engine, replica_engine)
+
+    assert router.replica_lag() == 0
+    assert router.engine_for(uuid.uuid4()) is replica_engine
+
+
+def test_writer_reads_from_primary_until_replica_replays_write(engine, replica_engine, monkeypatch):
+    # The write goes straight to the database, as one from another worker process or
+    # the ingest queue would: the router only learns of it through app_user.
+    router = ReadRouter(engine, replica_engine)
+    writer, other = uuid.uuid4(), uuid.uuid4()
+    try:
+        with Session(engine) as session:
+            ingest_workout(
+                session,
+                {
+                    "user_id": str(writer),
+                    "workout": {"started_at": "2024-09-01T10:00:00Z"},
+                    "exercises": [{"display_name": "Row", "sets": [{"reps": 10}]}],
+                },
+            )
+        assert router.last_change_seq(engine, writer) is not None
+
+        primary_seq = router.last_change_seq
+        # A replica that has not replayed the write yet still has the old value.
+        monkeypatch.setattr(
+            router,
+            "last_change_seq",
+            lambda target, user_id: None if target is replica_engine else primary_seq(target, user_id),
+        )
+        assert router.engine_for(writer) is engine
+        assert router.engine_for(other) is replica_engine
+
+        monkeypatch.undo()
+        assert router.engine_for(writer) is replica_engine
+    finally:
+        with Session(engine) as session, session.begin():
+            session.execute(delete(AppUser).where(AppUser.id == writer))
+
+
+def test_users_last_write_seq_is_read_from_primary_once_per_ttl(engine, replica_engine, monkeypatch):
+    router = ReadRouter(engine, replica_engine, write_seq_ttl=60)
+    user_id = uuid.uuid4()
+    lookups = []
+    last_change_seq = router.last_change_seq
+
+    def counting(target, user_id):
+        lookups.append(target)
+        return last_change_seq(target, user_id)
+
+    monkeypatch.setattr(router, "last_change_seq", counting)
+    for _ in range(3):
+        assert router.engine_for(user_id) is replica_engine
+
+    assert lookups == [engine]
+
+
+def test_write_committed_here_is_routed_without_asking_primary(engine, replica_engine, monkeypatch):
+    router = ReadRouter(engine, replica_engine, write_seq_ttl=60)
+    monkeypatch.setattr(ingest_module, "read_router", router)
+    user_id = uuid.uuid4()
+    try:
+        with Session(engine) as session:
+            ingest_workout(
+                session,
+                {
+                    "user_id": str(user_id),
+                    "workout": {"started_at": "2024-09-01T10:00:00Z"},
+                    "exercises": [{"display_name": "Row", "sets": [{"reps": 10}]}],
+                },
+            )
+        replayed = {"seq": None}
+        lookups = []
+
+        def lookup(target, user_id):
+            lookups.append(target)
+            return replayed["seq"]
+
+        monkeypatch.setattr(router, "last_change_seq", lookup)
+        assert router.engine_for(user_id) is engine
+
+        # The replica catches up; from then on it is used without asking either server.
+        with Session(engine) as session:
+            replayed["seq"] = session.get(AppUser, user_id).last_change_seq
+        assert router.engine_for(user_id) is replica_engine
+        assert router.engine_for(user_id) is replica_engine
+        assert lookups == [replica_engine, replica_engine]
+    finally:
+        with Session(engine) as session, session.begin():
+            session.execute(delete(AppUser).where(AppUser.id == user_id))
+
+
+def test_replica_with_stopped_wal_receiver_falls_back_to_primary(engine, replica_engine, monkeypatch):
+    router = ReadRouter(engine, replica_engine)
+    # In recovery and fully replayed, but nothing is streaming from the primary.
+    status = SimpleNamespace(
+        in_recovery=True,
+        receiver_status=None,
+        receiver_silence=None,
+        replayed_all_received=True,
+        replay_age=300.0,
+    )
+    monkeypatch.setattr(router, "replica_status", lambda: status)
+
+    assert router.replica_lag() is None
+    assert router.engine_for(uuid.uuid4()) is engine
+
+
+def test_silent_wal_receiver_falls_back_to_primary():
+    streaming = SimpleNamespace(
+        in_recovery=True,
+        receiver_status="streaming",
+        receiver_silence=1.0,
+        replayed_all_received=True,
+        replay_age=300.0,
+    )
+
+    assert replica_lag_from_status(streaming, max_receiver_silence=60) == 0
+    streaming.receiver_silence = 120.0
+    assert replica_lag_from_status(streaming, max_receiver_silence=60) is None
+
+
+def test_unreachable_replica_falls_back_to_primary(engine):
+    unreachable = create_engine(
+        "postgresql+psycopg://postgres@/workout_tracker?host=/nonexistent",
+        connect_args={"connect_timeout": 1},
+    )
+    router = ReadRouter(engine, unreachable, health_interval=60)
+
+    assert router.engine_for(uuid.uuid4()) is engine
+    assert router.replica_lag() is None
+    unreachable.dispose()
+
+
+def test_lagging_replica_falls_back_to_primary(engine, replica_engine, monkeypatch):
+    router = ReadRouter(engine, replica_engine, max_lag_seconds=1)
+    monkeypatch.setattr(router, "replica_lag", lambda: 5.0)
+
+    assert router.engine_for(uuid.uuid4()) is engine
+
+
+def test_failed_replica_is_skipped_until_next_health_sample(engine, replica_engine):
+    router = ReadRouter(engine, replica_engine, health_interval=60)
+    assert router.engine_for(uuid.uuid4()) is replica_engine
+
+    router.mark_replica_failed()
+
+    assert router.engine_for(uuid.uuid4()) is engine
+
+
+@pytest.mark.skipif(
+    not os.getenv("REPLICA_DATABASE_URL"),
+    reason="REPLICA_DATABASE_URL must point at a streaming standby of DATABASE_URL",
+)
+def test_streaming_replica_serves_writes_once_replayed(engine):
+    replica = create_engine(os.environ["REPLICA_DATABASE_URL"], future=True)
+    router = ReadRouter(engine, replica)
+    user_id = uuid.uuid4()
+    request = {"user_id": str(user_id), "workout_date": "2024-09-01"}
+    try:
+        with Session(engine) as session:
+            ingest_workout(
+                session,
+                {
+                    "user_id": str(user_id),
+                    "workout": {"started_at": "2024-09-01T10:00:00Z"},
+                    "exercises": [{"display_name": "Row", "sets": [{"reps": 10}]}],
+                },
+            )
+
+        # Whichever engine is picked right after the write already has it.
+        with Session(router.engine_for(user_id)) as session:
+            assert get_workout_for_day(session, request)["workout"] is not None
+
+        deadline = time.monotonic() + 5
+        while router.engine_for(user_id) is not replica:
+            assert time.monotonic() < deadline, "replica never replayed the write"
+            time.sleep(0.1)
+        with Session(replica) as session:
+            assert get_workout_for_day(session, request)["workout"] is not None
+    finally:
+        with Session(engine) as session, session.begin():
+            session.execute(delete(AppUser).where(AppUser.id == user_id))
+        replica.dispose()
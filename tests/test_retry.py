@@ -0,0 +1,69 @@
+import uuid
+
+import psycopg.errors
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+from src.db.models import Exercise
+from src.db.retry import is_retryable, run_with_retries
+
+
+def failing(error_class, times: int):
+    calls = []
+
+    def work():
+        calls.append(1)
+        if len(calls) <= times:
+            raise OperationalError("UPDATE ...", {}, error_class("conflict"))
+        return len(calls)
+
+    return work
+
+
+def test_deadlocks_and_serialization_failures_are_retried():
+    retried = []
+
+    assert run_with_retries(failing(psycopg.errors.DeadlockDetected, 1), base_delay=0, on_retry=retried.append) == 2
+    assert run_with_retries(failing(psycopg.errors.SerializationFailure, 2), attempts=3, base_delay=0) == 3
+    assert len(retried) == 1
+
+
+def test_retries_are_bounded():
+    with pytest.raises(OperationalError):
+        run_with_retries(failing(psycopg.errors.DeadlockDetected, 3), attempts=3, base_delay=0)
+
+
+def test_other_errors_are_raised_at_once():
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise ProgrammingError("SELECT ...", {}, psycopg.errors.UndefinedTable("missing"))
+
+    with pytest.raises(ProgrammingError):
+        run_with_retries(work, base_delay=0)
+    assert len(calls) == 1
+
+
+def insert_exercise(session, exercise_id: uuid.UUID, canonical_name: str) -> None:
+    with session.begin_nested():
+        session.execute(
+            Exercise.__table__.insert(),
+            {"id": exercise_id, "canonical_name": canonical_name, "display_name": canonical_name},
+        )
+
+
+@pytest.mark.postgres
+def test_only_get_or_create_unique_violations_are_retryable(db_session):
+    exercise_id, name = uuid.uuid4(), f"race-{uuid.uuid4()}"
+    insert_exercise(db_session, exercise_id, name)
+
+    with pytest.raises(IntegrityError) as duplicate_name:
+        insert_exercise(db_session, uuid.uuid4(), name)
+    with pytest.raises(IntegrityError) as duplicate_id:
+        insert_exercise(db_session, exercise_id, f"other-{name}")
+
+    # A racing writer created the same exercise; a retry finds it. A reused primary
+    # key is a bug that a retry would only repeat.
+    assert is_retryable(duplicate_name.value)
+    assert not is_retryable(duplicate_id.value)
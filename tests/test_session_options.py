@@ -0,0 +1,22 @@
+from src.db.session import DB_PREPARE_THRESHOLD, connect_args, pool_options
+from src.service.ingest_workout import _exercise_sets_statement
+
+POSTGRES_URL = "postgresql+psycopg://postgres@localhost:5432/workout_tracker"
+
+
+def test_pool_options_split_budget_across_workers():
+    assert pool_options(0, 4) == {}
+    assert pool_options(40, 4) == {"pool_size": 10, "max_overflow": 0}
+
+
+def test_prepared_statements_can_be_disabled_for_poolers():
+    assert connect_args(POSTGRES_URL) == {"prepare_threshold": DB_PREPARE_THRESHOLD}
+    assert connect_args(POSTGRES_URL, prepared_statements=False) == {"prepare_threshold": None}
+    assert connect_args("sqlite:///workouts.db") == {}
+
+
+def test_projection_statements_are_built_once_per_shape():
+    first = _exercise_sets_statement(("reps", "weight_kg"))
+
+    assert _exercise_sets_statement(("reps", "weight_kg")) is first
+    assert _exercise_sets_statement(("reps",)) is not first
@@ -0,0 +1,155 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select, text
+
+from src.db.models import WorkoutExercise, WorkoutSet
+from src.domain.payloads import WorkoutExportRequest
+from src.service import ingest_workout as ingest_module
+from src.service.archive_workouts import archive_workouts
+from src.service.export_workouts import iter_workouts
+from src.service.ingest_workout import get_workout_for_day
+from src.service.last_performance import get_last_performance
+from src.service.workout_search import search_workouts
+
+# Fields that differ between two writes of the same payload.
+IDENTITIES = {"workout_id", "workout_exercise_id", "exercise_id", "user_id", "workout_set_id", "logged_at"}
+
+
+DEADLIFT_DAY = [
+    {
+        "display_name": "Deadlift",
+        "sets": [
+            {"reps": 5, "weight": {"value": 102.5, "unit": "kg"}, "rpe": 7.5},
+            {"reps": 3, "weight": {"value": 160, "unit": "kg"}, "notes": "hook grip slipped"},
+            {"reps": 8, "weight": {"value": 120, "unit": "kg"}, "is_warmup": False, "rest_seconds": 90},
+        ],
+    },
+    {"display_name": "Hanging Leg Raise", "sets": [{"reps": 12}]},
+]
+
+
+def store_sets(monkeypatch, storage: str) -> None:
+    monkeypatch.setattr(ingest_module, "SET_STORAGE", storage)
+
+
+def read_day(session, user_id: uuid.UUID, workout_date: str, **options):
+    return get_workout_for_day(session, {"user_id": str(user_id), "workout_date": workout_date, **options})
+
+
+def by_exercise(result):
+    return sorted(result["workout"]["exercises"], key=lambda ex: ex["workout_exercise_id"])
+
+
+def without_identities(value):
+    if isinstance(value, dict):
+        return {key: without_identities(item) for key, item in value.items() if key not in IDENTITIES}
+    if isinstance(value, list):
+        return [without_identities(item) for item in value]
+    return value
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_packed_sets_read_like_rows(db_session, ingest_day, monkeypatch, backend):
+    rows_user, packed_user = uuid.uuid4(), uuid.uuid4()
+    store_sets(monkeypatch, "rows")
+    ingest_day(db_session, rows_user, "2024-10-01", backend=backend, exercises=DEADLIFT_DAY)
+    store_sets(monkeypatch, "packed")
+    result = ingest_day(db_session, packed_user, "2024-10-01", backend=backend, exercises=DEADLIFT_DAY)
+
+    assert result["written_sets"] == 4
+    stored = db_session.execute(
+        select(WorkoutExercise.packed_sets).where(WorkoutExercise.user_id == packed_user)
+    ).scalars().all()
+    assert sorted(len(packed) for packed in stored) == [1, 3]
+    assert db_session.execute(
+        select(func.count()).select_from(WorkoutSet).join(WorkoutExercise).where(WorkoutExercise.user_id == packed_user)
+    ).scalar_one() == 0
+    db_session.commit()
+
+    for options in ({"projection": "full"}, {"projection": "compact"}, {"fields": ["reps", "notes"]}, {"summary": True}):
+        expected = read_day(db_session, rows_user, "2024-10-01", **options)
+        assert without_identities(read_day(db_session, packed_user, "2024-10-01", **options)) == without_identities(
+            expected
+        )
+    full = read_day(db_session, packed_user, "2024-10-01")["workout"]["exercises"][0]["sets"]
+    assert all(uuid.UUID(s["workout_set_id"]) and s["logged_at"] for s in full)
+
+
+def test_layouts_mix_within_a_day_and_across_reads(db_session, ingest_day, monkeypatch):
+    user_id = uuid.uuid4()
+    store_sets(monkeypatch, "rows")
+    ingest_day(db_session, user_id, "2024-10-01", exercises=DEADLIFT_DAY)
+    store_sets(monkeypatch, "packed")
+    ingest_day(db_session, user_id, "2024-10-03", exercises=DEADLIFT_DAY)
+    store_sets(monkeypatch, "rows")
+    ingest_day(db_session, user_id, "2024-10-03", exercises=DEADLIFT_DAY)
+
+    day = read_day(db_session, user_id, "2024-10-03", fields=["reps"])["workout"]["exercises"]
+    assert sorted(len(e["sets"]) for e in day) == [1, 1, 3, 3]
+
+    last = get_last_performance(
+        db_session, {"user_id": str(user_id), "exercise": "deadlift", "n": 2, "fields": ["reps", "weight_kg"]}
+    )
+    assert [s["workout_date"] for s in last["sessions"]] == ["2024-10-03", "2024-10-01"]
+    packed, rows = (e["sets"] for e in last["sessions"][0]["exercises"])
+    assert packed == rows == last["sessions"][1]["exercises"][0]["sets"]
+    assert [s["reps"] for s in packed] == [5, 3, 8]
+
+    (exported,) = iter_workouts(
+        db_session, WorkoutExportRequest.model_validate({"user_id": str(user_id), "from": "2024-10-02"})
+    )
+    exercises = sorted(without_identities(exported["exercises"]), key=lambda ex: ex["display_name"])
+    assert exercises[0] == exercises[1] and exercises[2] == exercises[3]
+    assert [len(ex["sets"]) for ex in exercises] == [3, 3, 1, 1]
+
+
+def test_archiving_keeps_packed_sets(db_session, ingest_day, monkeypatch):
+    user_id = uuid.uuid4()
+    store_sets(monkeypatch, "packed")
+    ingest_day(db_session, user_id, "2024-01-05", exercises=DEADLIFT_DAY)
+    before = read_day(db_session, user_id, "2024-01-05")
+
+    assert archive_workouts(db_session, date(2024, 2, 1)) >= 1
+
+    assert by_exercise(read_day(db_session, user_id, "2024-01-05")) == by_exercise(before)
+
+
+@pytest.mark.postgres
+def test_search_matches_packed_set_notes(db_session, ingest_day, monkeypatch):
+    user_id = uuid.uuid4()
+    store_sets(monkeypatch, "packed")
+    ingest_day(db_session, user_id, "2024-10-01", exercises=DEADLIFT_DAY)
+
+    (match,) = search_workouts(db_session, {"user_id": str(user_id), "query": "hook grip"})["workouts"]
+
+    assert match["workout_date"] == "2024-10-01"
+    assert match["snippets"][0]["source"] == "set"
+    assert "<b>hook</b> <b>grip</b>" in match["snippets"][0]["snippet"]
+
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db_session.execute(
+        text(
+            "EXPLAIN SELECT 1 FROM workout_exercise WHERE user_id = :user_id AND packed_sets IS NOT NULL "
+            "AND to_tsvector('english', jsonb_path_query_array(packed_sets, '$[*].notes')) "
+            "@@ websearch_to_tsquery('english', 'hook')"
+        ),
+        {"user_id": user_id},
+    ).scalars().all()
+    db_session.commit()
+    assert any("ix_workout_exercise_user_packed_notes" in line for line in plan)
+
+
+def test_unknown_set_storage_is_rejected(db_session, monkeypatch):
+    monkeypatch.setattr(ingest_module, "SET_STORAGE", "columnar")
+    payload = ingest_module.validate_payload(
+        {
+            "user_id": str(uuid.uuid4()),
+            "workout": {"started_at": "2024-10-01T10:00:00Z"},
+            "exercises": [{"display_name": "Deadlift", "sets": [{"reps": 5}]}],
+        }
+    )
+
+    with pytest.raises(ValueError, match="Unknown set storage"):
+        ingest_module.write_workout(db_session, payload)
@@ -0,0 +1,241 @@
+import pathlib
+import uuid
+from datetime import date
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, delete, event, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from src.db.models import AppUser, IngestQueueItem, ShardPlacement, Workout
+from src.db.sharding import HashRing, ShardMoved, ShardRouter, parse_shard_urls
+from src.service.change_feed import get_changes_since
+from src.service.ingest_queue import enqueue_workout, get_ingest_status, process_ingest_batch, requeue_item
+from src.service.ingest_workout import INGEST_BACKENDS, get_workout_for_day, ingest_workout
+from src.service import shard_rebalance
+from src.service.shard_rebalance import _delete_user_rows, move_user, plan_rebalance
+
+pytestmark = pytest.mark.postgres
+
+
+def payload(user_id: uuid.UUID, workout_date: str, reps: list[int], key: str | None = None) -> dict:
+    return {
+        "user_id": str(user_id),
+        "idempotency_key": key,
+        "workout": {"started_at": f"{workout_date}T07:00:00Z"},
+        "exercises": [
+            {"display_name": "Front Squat", "sets": [{"reps": r} for r in reps]}
+        ],
+    }
+
+
+def test_adding_a_shard_moves_only_its_share_of_users():
+    users = [uuid.uuid4() for _ in range(4000)]
+    before = HashRing(["s0", "s1", "s2"])
+    after = HashRing(["s0", "s1", "s2", "s3"])
+
+    moved = [user for user in users if before.shard_for(user) != after.shard_for(user)]
+
+    assert all(after.shard_for(user) == "s3" for user in moved)
+    assert 0.18 < len(moved) / len(users) < 0.32
+    counts = {shard: 0 for shard in after.shards}
+    for user in users:
+        counts[after.shard_for(user)] += 1
+    assert min(counts.values()) > 0.15 * len(users)
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls(" a=postgresql://h/a , b=postgresql://h/b ") == {
+        "a": "postgresql://h/a",
+        "b": "postgresql://h/b",
+    }
+    assert parse_shard_urls("") == {}
+    with pytest.raises(ValueError):
+        parse_shard_urls("postgresql://h/a")
+
+
+def test_router_rejects_ring_shards_without_urls(engine):
+    with pytest.raises(ValueError):
+        ShardRouter({"a": engine}, HashRing(["a", "b"]))
+
+
+@pytest.fixture(scope="module")
+def second_shard(engine, database_url):
+    url = make_url(database_url)
+    name = f"{url.database}_shard2"
+    admin = engine.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        with admin.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+            connection.execute(text(f'CREATE DATABASE "{name}"'))
+    except DBAPIError as exc:
+        pytest.skip(f"cannot create a second shard database: {exc.orig}")
+    shard_url = url.set(database=name).render_as_string(hide_password=False)
+    alembic_cfg = Config(str(pathlib.Path(__file__).resolve().parent.parent / "alembic.ini"))
+    # env.py takes the URL from DATABASE_URL, as when migrating each shard by hand.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("DATABASE_URL", shard_url)
+        command.upgrade(alembic_cfg, "head")
+
+    shard_engine = create_engine(shard_url, future=True)
+    yield shard_engine
+    shard_engine.dispose()
+    with admin.connect() as connection:
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture
+def two_shards(engine, second_shard):
+    # Every user starts on "a"; "b" is configured but not on the ring yet.
+    router = ShardRouter({"a": engine, "b": second_shard}, HashRing(["a"]))
+    user_ids: list[uuid.UUID] = []
+    yield router, user_ids
+    for shard_engine in (engine, second_shard):
+        with Session(shard_engine) as session, session.begin():
+            for user_id in user_ids:
+                _delete_user_rows(session, user_id)
+            session.execute(delete(AppUser).where(AppUser.id.in_(user_ids)))
+            session.execute(delete(ShardPlacement).where(ShardPlacement.user_id.in_(user_ids)))
+
+
+def test_move_user_copies_rows_and_keeps_sync_cursor_valid(two_shards):
+    router, user_ids = two_shards
+    user_id = uuid.uuid4()
+    user_ids.append(user_id)
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-01", [5, 5], "k1")))
+    with Session(router.engines["a"]) as session:
+        cursor = get_changes_since(session, {"user_id": str(user_id)})["cursor"]
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-02", [3])))
+    with Session(router.engines["a"]) as session:
+        before = get_workout_for_day(session, {"user_id": str(user_id), "workout_date": "2024-10-01"})
+
+    result = move_user(router, user_id, "b", grace_seconds=0)
+
+    assert (result.source, result.target, result.workouts) == ("a", "b", 2)
+    assert router.shard_for(user_id) == "b"
+    with Session(router.engines["b"]) as session:
+        after = get_workout_for_day(session, {"user_id": str(user_id), "workout_date": "2024-10-01"})
+        changes = get_changes_since(session, {"user_id": str(user_id), "cursor": cursor})
+        replay = ingest_workout(session, payload(user_id, "2024-10-01", [5, 5], "k1"))
+    assert after == before
+    # A cursor issued by the old shard still picks up the workout written after it.
+    assert "2024-10-02" in [change["workout_date"] for change in changes["changes"]]
+    assert replay["idempotent_replay"] is True
+
+    with Session(router.engines["a"]) as session:
+        assert session.execute(select(Workout.id).where(Workout.user_id == user_id)).first() is None
+        assert session.get(AppUser, user_id).moved_to_shard == "b"
+        assert session.get(ShardPlacement, user_id).shard == "b"
+
+
+def test_failed_cut_over_leaves_the_user_on_the_source(two_shards, monkeypatch):
+    router, user_ids = two_shards
+    user_id = uuid.uuid4()
+    user_ids.append(user_id)
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-01", [5])))
+    place_user = shard_rebalance._place_user
+    fence = {"placed": False}
+
+    def place_and_note(session, user_id, moved_to):
+        place_user(session, user_id, moved_to)
+        fence["placed"] = fence["placed"] or moved_to == "b"
+
+    def lose_source_commit(connection):
+        if fence["placed"]:
+            raise RuntimeError("source commit lost")
+
+    monkeypatch.setattr(shard_rebalance, "_place_user", place_and_note)
+    event.listen(router.engines["a"], "commit", lose_source_commit)
+    try:
+        with pytest.raises(RuntimeError):
+            move_user(router, user_id, "b", grace_seconds=0)
+    finally:
+        event.remove(router.engines["a"], "commit", lose_source_commit)
+
+    # The copy on the target is still fenced, and writes keep going to the source.
+    with Session(router.engines["b"]) as session:
+        assert session.get(AppUser, user_id).moved_to_shard == "a"
+    with Session(router.engines["b"]) as session:
+        with pytest.raises(ShardMoved):
+            ingest_workout(session, payload(user_id, "2024-10-02", [3]))
+    assert router.shard_for(user_id) == "a"
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-02", [3])))
+
+    monkeypatch.setattr(shard_rebalance, "_place_user", place_user)
+    assert move_user(router, user_id, "b", grace_seconds=0).workouts == 2
+
+
+@pytest.mark.parametrize("backend", INGEST_BACKENDS)
+def test_writes_to_the_old_shard_are_fenced_and_followed(two_shards, backend):
+    router, user_ids = two_shards
+    user_id = uuid.uuid4()
+    user_ids.append(user_id)
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-01", [5])))
+    move_user(router, user_id, "b", grace_seconds=0)
+
+    with Session(router.engines["a"]) as session:
+        with pytest.raises(ShardMoved) as moved:
+            ingest_workout(session, payload(user_id, "2024-10-03", [1]), backend=backend)
+        with pytest.raises(ShardMoved):
+            enqueue_workout(session, payload(user_id, "2024-10-03", [1]))
+    assert moved.value.shard == "b"
+
+    # A router that has not loaded the new placement follows the fence.
+    stale = ShardRouter(router.engines, router.ring)
+    result = stale.run(
+        user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-03", [1]), backend=backend)
+    )
+    assert stale.shard_for(user_id) == "b"
+    with Session(router.engines["b"]) as session:
+        assert session.get(Workout, uuid.UUID(result["workout_id"])) is not None
+
+
+def test_queued_item_for_moved_user_is_requeued_on_the_new_shard(two_shards):
+    router, user_ids = two_shards
+    user_id, other_id = uuid.uuid4(), uuid.uuid4()
+    user_ids.extend([user_id, other_id])
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-01", [5])))
+    move_user(router, user_id, "b", grace_seconds=0)
+    with Session(router.engines["a"]) as session:
+        other = enqueue_workout(session, payload(other_id, "2024-10-02", [4]))
+        # Left behind on the old shard, as by an enqueue that raced the cut-over.
+        with session.begin():
+            stranded = IngestQueueItem(
+                user_id=user_id, workout_date=date(2024, 10, 2), payload=payload(user_id, "2024-10-02", [3])
+            )
+            session.add(stranded)
+            session.flush()
+            ticket = str(stranded.ticket)
+
+        process_ingest_batch(
+            session, reroute=lambda item, shard: requeue_item(router.engines[shard], item)
+        )
+        assert get_ingest_status(session, {"user_id": str(other_id), "ticket": other["ticket"]})["status"] == "done"
+
+    with Session(router.engines["b"]) as session:
+        assert get_ingest_status(session, {"user_id": str(user_id), "ticket": ticket})["status"] == "pending"
+        assert process_ingest_batch(session) == 1
+        status = get_ingest_status(session, {"user_id": str(user_id), "ticket": ticket})
+    assert status["status"] == "done"
+    assert status["result"]["written_sets"] == 1
+
+
+def test_plan_and_placement_reload(two_shards):
+    router, user_ids = two_shards
+    user_id = uuid.uuid4()
+    user_ids.append(user_id)
+    router.run(user_id, lambda session: ingest_workout(session, payload(user_id, "2024-10-01", [5])))
+
+    moves = plan_rebalance(router, HashRing(["b"]))
+    assert (user_id, "a", "b") in moves
+
+    move_user(router, user_id, "b", grace_seconds=0)
+    fresh = ShardRouter(router.engines, router.ring)
+    assert fresh.shard_for(user_id) == "a"
+    assert fresh.load_placements() is True
+    assert fresh.shard_for(user_id) == "b"
+    assert fresh.load_placements() is False
+    assert (user_id, "a", "b") not in plan_rebalance(router, HashRing(["b"]))
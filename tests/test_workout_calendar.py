@@ -0,0 +1,82 @@
+import base64
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from src.service import ingest_workout as ingest_module
+from src.service.archive_workouts import archive_workouts
+from src.service.workout_calendar import encode_bitmap, encode_runs, get_workout_calendar
+
+
+def row_and_curl(row_sets: int) -> list[dict]:
+    return [
+        {"display_name": "Row", "sets": [{"reps": 8}] * row_sets},
+        {"display_name": "Curl", "sets": [{"reps": 12}]},
+    ]
+
+
+def calendar(session, user_id: uuid.UUID, start: str, end: str, encoding: str = "days"):
+    return get_workout_calendar(
+        session, {"user_id": str(user_id), "from": start, "to": end, "encoding": encoding}
+    )
+
+
+@pytest.mark.parametrize("backend", ingest_module.INGEST_BACKENDS)
+def test_calendar_counts_follow_appends_and_archiving(db_session, ingest_day, backend):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-03-01", backend=backend, exercises=row_and_curl(3))
+    ingest_day(db_session, user_id, "2024-03-04", backend=backend, exercises=row_and_curl(2))
+    ingest_day(db_session, user_id, "2024-03-04", backend=backend, exercises=row_and_curl(1))
+    ingest_day(db_session, user_id, "2024-04-01", backend=backend, exercises=row_and_curl(1))
+    archive_workouts(db_session, before=date(2024, 3, 2))
+
+    result = calendar(db_session, user_id, "2024-03-01", "2024-03-31")
+
+    assert result["days"] == [
+        {"date": "2024-03-01", "exercises": 2, "sets": 4},
+        {"date": "2024-03-04", "exercises": 4, "sets": 5},
+    ]
+    assert result["workout_days"] == 2
+    assert result["total_sets"] == 9
+
+
+@pytest.mark.postgres
+def test_calendar_is_an_index_only_scan(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-03-01", exercises=row_and_curl(1))
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = db_session.execute(
+        text(
+            "EXPLAIN SELECT workout_date, exercise_count, set_count FROM workout "
+            "WHERE user_id = :user_id AND workout_date BETWEEN '2020-01-01' AND '2024-12-31' "
+            "ORDER BY workout_date"
+        ),
+        {"user_id": user_id},
+    ).scalars().all()
+    db_session.commit()
+
+    assert "Index Only Scan using ix_workout_user_date" in plan[0]
+
+
+def test_compact_encodings_round_trip():
+    start, end = date(2024, 1, 1), date(2024, 1, 12)
+    days = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5), date(2024, 1, 12)]
+
+    assert encode_runs(days, start, end) == "0,2,2,1,6,1"
+    assert encode_runs([], start, end) == "12"
+    assert encode_runs([date(2024, 1, 3)], start, end) == "2,1,9"
+
+    bits = base64.b64decode(encode_bitmap(days, start, end))
+    assert len(bits) == 2
+    assert [bool(bits[n // 8] >> (n % 8) & 1) for n in range(12)] == [
+        True, True, False, False, True, False, False, False, False, False, False, True
+    ]
+
+
+def test_calendar_rejects_overlong_range():
+    with pytest.raises(ValueError):
+        get_workout_calendar(
+            None, {"user_id": str(uuid.uuid4()), "from": "2010-01-01", "to": "2024-12-31"}
+        )
@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from src.service.ingest_workout import get_workout_for_day
+
+
+BENCH_PRESS_SETS = [
+    {"reps": 10, "weight": {"value": 40, "unit": "kg"}, "is_warmup": True},
+    {"reps": 5, "weight": {"value": 80, "unit": "kg"}, "tempo": "31X0"},
+    {"reps": 8, "weight": {"value": 80, "unit": "kg"}, "notes": "grinder"},
+]
+
+
+def test_compact_projection_returns_only_named_fields(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-20", exercise="Bench Press", sets=BENCH_PRESS_SETS)
+
+    result = get_workout_for_day(
+        db_session, {"user_id": str(user_id), "workout_date": "2024-09-20", "projection": "compact"}
+    )
+
+    sets = result["workout"]["exercises"][0]["sets"]
+    assert [s["set_index"] for s in sets] == [0, 1, 2]
+    assert set(sets[0]) == {"set_index", "reps", "weight_kg", "rpe", "rir", "is_warmup"}
+
+
+def test_explicit_fields_are_the_only_selected_columns(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-20", exercise="Bench Press", sets=BENCH_PRESS_SETS)
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    connection = db_session.bind
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        result = get_workout_for_day(
+            db_session,
+            {"user_id": str(user_id), "workout_date": "2024-09-20", "fields": ["reps", "tempo"]},
+        )
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    sets = result["workout"]["exercises"][0]["sets"]
+    assert sets[1] == {"reps": 5, "tempo": "31X0"}
+    set_query = next(s for s in statements if "FROM workout_set" in s)
+    assert "logged_at" not in set_query
+    assert "weight_original_value" not in set_query
+
+
+def test_summary_mode_returns_per_exercise_aggregates(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-09-20", exercise="Bench Press", sets=BENCH_PRESS_SETS)
+
+    result = get_workout_for_day(
+        db_session, {"user_id": str(user_id), "workout_date": "2024-09-20", "summary": True}
+    )
+
+    exercise = result["workout"]["exercises"][0]
+    assert "sets" not in exercise
+    assert exercise["summary"] == {
+        "sets": 3,
+        "total_reps": 23,
+        "top_set": {"weight_kg": 80.0, "reps": 8},
+        "tonnage_kg": pytest.approx(10 * 40 + 5 * 80 + 8 * 80),
+    }
+
+
+def test_unknown_field_is_rejected(db_session):
+    with pytest.raises(ValueError):
+        get_workout_for_day(
+            db_session,
+            {"user_id": str(uuid.uuid4()), "workout_date": "2024-09-20", "fields": ["password"]},
+        )
@@ -0,0 +1,73 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from src.service.archive_workouts import archive_workouts
+from src.service.workout_search import search_workouts
+
+pytestmark = pytest.mark.postgres
+
+
+def search(session, user_id: uuid.UUID, query: str, **options):
+    return search_workouts(session, {"user_id": str(user_id), "query": query, **options})
+
+
+def test_search_ranks_workouts_and_highlights_matches(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-05-01", notes="Felt strong today")
+    ingest_day(
+        db_session,
+        user_id,
+        "2024-05-03",
+        exercises=[
+            {
+                "display_name": "Overhead Press",
+                "notes": "left shoulder twinge",
+                "sets": [{"reps": 5, "notes": "shoulder clicked"}, {"reps": 5}],
+            }
+        ],
+    )
+    ingest_day(db_session, user_id, "2024-05-05", notes="slept badly")
+    ingest_day(db_session, uuid.uuid4(), "2024-05-03", notes="shoulder pain")
+
+    result = search(db_session, user_id, "shoulders")
+
+    assert [workout["workout_date"] for workout in result["workouts"]] == ["2024-05-03"]
+    snippets = result["workouts"][0]["snippets"]
+    assert {snippet["source"] for snippet in snippets} == {"exercise", "set"}
+    assert all("<b>shoulder</b>" in snippet["snippet"] for snippet in snippets)
+
+    phrase = search(db_session, user_id, '"felt strong" -shoulder')
+    assert [workout["workout_date"] for workout in phrase["workouts"]] == ["2024-05-01"]
+    assert search(db_session, user_id, "deadlift")["workouts"] == []
+
+
+def test_search_finds_notes_of_archived_days(db_session, ingest_day):
+    user_id = uuid.uuid4()
+    ingest_day(db_session, user_id, "2024-01-10", sets=[{"reps": 5, "notes": "elbow ache on the last rep"}])
+    archive_workouts(db_session, date(2024, 3, 1))
+
+    result = search(db_session, user_id, "elbow")
+
+    assert [workout["workout_date"] for workout in result["workouts"]] == ["2024-01-10"]
+    assert result["workouts"][0]["snippets"][0]["source"] == "archive"
+    assert "<b>elbow</b>" in result["workouts"][0]["snippets"][0]["snippet"]
+
+
+def test_search_uses_the_user_scoped_gin_indexes(db_session):
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    for table in ("workout", "workout_exercise", "workout_set"):
+        plan = db_session.execute(
+            text(
+                f"EXPLAIN SELECT 1 FROM {table} "
+                "WHERE user_id = :user_id AND notes IS NOT NULL "
+                "AND to_tsvector('english', notes) @@ websearch_to_tsquery('english', 'shoulder')"
+            ),
+            {"user_id": uuid.uuid4()},
+        ).scalars().all()
+        (condition,) = [line for line in plan if "Index Cond" in line]
+        assert any(f"ix_{table}_user_notes_search" in line for line in plan)
+        assert "user_id =" in condition and "@@" in condition
+    db_session.commit()